@@ -0,0 +1,241 @@
+# Azure DevOps Boards sync pipeline
+#
+# WIQL query -> fetch work items in chunks of ADO_BATCH_SIZE -> map fields in one
+# pass -> write every chunk with a single INSERT ... ON CONFLICT (ado_id) DO UPDATE
+# inside one transaction. The work item tracking client is passed in, so any object
+# exposing query_by_wiql / get_work_items (e.g. a local fake) can drive the pipeline.
+#
+# The ADO SDK is synchronous (msrest/requests), so every client call runs on a
+# dedicated bounded thread pool with a per-call timeout instead of the event loop.
+#
+# Incremental syncs pass the last System.ChangedDate watermark: the WIQL query only
+# returns items changed since then, and items whose System.Rev matches the stored
+# ado_rev are dropped before the write.
+#
+# The SDK itself (azure.devops, msrest, requests) is imported by _connect on the
+# first sync, not at startup: most processes never sync.
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+# Threads available for ADO client work, shared by all syncs
+ADO_MAX_WORKERS = int(os.getenv("ADO_MAX_WORKERS", "4"))
+# Seconds before a single ADO call is abandoned
+ADO_CALL_TIMEOUT = float(os.getenv("ADO_CALL_TIMEOUT", "60"))
+
+_executor = ThreadPoolExecutor(max_workers=ADO_MAX_WORKERS, thread_name_prefix="ado")
+
+# azure_config id -> work item tracking client (handshake and resource area discovery done)
+_client_cache = {}
+_client_lock = asyncio.Lock()
+
+# get_work_items accepts at most 200 ids per call
+ADO_BATCH_SIZE = 200
+
+# Only the fields we map are requested instead of expand='All'
+ADO_FIELDS = [
+    "System.Id",
+    "System.Title",
+    "System.State",
+    "System.WorkItemType",
+    "System.AssignedTo",
+    "System.ChangedDate",
+    "Microsoft.VSTS.Scheduling.StartDate",
+    "Microsoft.VSTS.Scheduling.FinishDate",
+    "Microsoft.VSTS.Scheduling.OriginalEstimate",
+    "Microsoft.VSTS.Scheduling.CompletedWork",
+]
+
+# Columns refreshed from ADO when the work item already exists (project_id is kept)
+UPSERT_COLUMNS = [
+    "title",
+    "status",
+    "assigned_to",
+    "start_date",
+    "end_date",
+    "estimated_hours",
+    "actual_hours",
+    "type",
+    "ado_rev",
+]
+
+
+async def run_ado_call(fn, *args, timeout=None, **kwargs):
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+    return await asyncio.wait_for(future, timeout or ADO_CALL_TIMEOUT)
+
+
+def _connect(organization_url, personal_access_token):
+    from azure.devops.connection import Connection
+    from msrest.authentication import BasicAuthentication
+
+    credentials = BasicAuthentication('', personal_access_token)
+    connection = Connection(base_url=organization_url, creds=credentials)
+    wit_client = connection.clients.get_work_item_tracking_client()
+    # Let requests give up with us, so a timed out call does not keep a worker busy
+    wit_client.config.connection.timeout = ADO_CALL_TIMEOUT
+    return wit_client
+
+
+async def get_wit_client(config):
+    async with _client_lock:
+        wit_client = _client_cache.get(config["id"])
+        if wit_client is None:
+            wit_client = await run_ado_call(_connect, config["organization_url"], config["personal_access_token"])
+            _client_cache[config["id"]] = wit_client
+        return wit_client
+
+
+def clear_client_cache():
+    _client_cache.clear()
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+def chunked(values, size=ADO_BATCH_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def parse_ado_date(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).date()
+
+
+def parse_ado_datetime(value):
+    # Naive UTC, matching the TIMESTAMP columns
+    if not value:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def wiql_datetime(value):
+    # ADO stores ChangedDate with millisecond precision
+    return value.strftime("%Y-%m-%dT%H:%M:%S.") + "%03dZ" % (value.microsecond // 1000)
+
+
+def map_work_item(wi, project_id):
+    fields = wi.fields or {}
+    assigned_to = fields.get("System.AssignedTo") or {}
+    if isinstance(assigned_to, dict):
+        assigned_to = assigned_to.get("uniqueName", "")
+    return {
+        "project_id": project_id,
+        "title": fields.get("System.Title", ""),
+        "status": fields.get("System.State", "new"),
+        "assigned_to": assigned_to,
+        "start_date": parse_ado_date(fields.get("Microsoft.VSTS.Scheduling.StartDate")),
+        "end_date": parse_ado_date(fields.get("Microsoft.VSTS.Scheduling.FinishDate")),
+        "estimated_hours": fields.get("Microsoft.VSTS.Scheduling.OriginalEstimate") or 0.0,
+        "actual_hours": fields.get("Microsoft.VSTS.Scheduling.CompletedWork") or 0.0,
+        "ado_id": str(wi.id),
+        "ado_rev": getattr(wi, "rev", None),
+        "type": fields.get("System.WorkItemType", "task"),
+    }
+
+
+def build_upsert(table, rows):
+    stmt = pg_insert(table).values(rows)
+    update_set = {name: stmt.excluded[name] for name in UPSERT_COLUMNS}
+    update_set["updated_at"] = func.now()
+    return stmt.on_conflict_do_update(index_elements=[table.c.ado_id], set_=update_set)
+
+
+async def stored_revisions(database, work_items_table, ado_ids):
+    query = select([work_items_table.c.ado_id, work_items_table.c.ado_rev]).where(
+        work_items_table.c.ado_id.in_(ado_ids)
+    )
+    return {row["ado_id"]: row["ado_rev"] for row in await database.fetch_all(query)}
+
+
+def _report(progress, **fields):
+    if progress is not None:
+        progress.update(**fields)
+
+
+async def sync_work_items(database, wit_client, wiql_query, work_items_table, resolve_project_id,
+                          watermark=None, batch_size=ADO_BATCH_SIZE, progress=None):
+    # resolve_project_id is awaited once, and only when there is something to write.
+    # With a watermark only the delta is queried and unchanged revisions are skipped;
+    # without one (first or full resync) every matching item is rewritten.
+    # progress, when given, is told the current phase and item counts (see sync_jobs).
+    timings = {"wiql": 0.0, "fetch": 0.0, "map": 0.0, "write": 0.0}
+    result = {"synced_count": 0, "skipped_count": 0, "watermark": watermark, "timings": timings}
+
+    _report(progress, phase="wiql")
+    started = time.perf_counter()
+    if watermark:
+        # >= rather than >: items sharing the watermark instant are re-read and
+        # then dropped by the revision check instead of being missed
+        wiql_query += "  AND [System.ChangedDate] >= '" + wiql_datetime(watermark) + "'"
+    query_result = await run_ado_call(wit_client.query_by_wiql, {"query": wiql_query}, time_precision=True)
+    work_item_ids = [item.id for item in (query_result.work_items or [])]
+    timings["wiql"] = time.perf_counter() - started
+
+    _report(progress, phase="fetch", items_total=len(work_item_ids))
+    started = time.perf_counter()
+    # Chunks are fetched concurrently; the executor bounds how many run at once
+    batches = await asyncio.gather(*[
+        run_ado_call(wit_client.get_work_items, ids=ids, fields=ADO_FIELDS, error_policy="omit")
+        for ids in chunked(work_item_ids, batch_size)
+    ])
+    # error_policy='omit' returns None for items deleted since the WIQL query
+    fetched = [[wi for wi in batch if wi is not None] for batch in batches]
+    timings["fetch"] = time.perf_counter() - started
+
+    if not any(fetched):
+        return result
+
+    project_id = await resolve_project_id()
+
+    _report(progress, phase="map")
+    started = time.perf_counter()
+    known_revisions = {}
+    if watermark:
+        known_revisions = await stored_revisions(
+            database, work_items_table, [str(wi.id) for batch in fetched for wi in batch]
+        )
+    chunks = []
+    for batch in fetched:
+        # ON CONFLICT cannot touch the same row twice in one statement
+        rows = {}
+        for wi in batch:
+            changed = parse_ado_datetime((wi.fields or {}).get("System.ChangedDate"))
+            if changed and (result["watermark"] is None or changed > result["watermark"]):
+                result["watermark"] = changed
+            ado_id = str(wi.id)
+            if ado_id in known_revisions and known_revisions[ado_id] == getattr(wi, "rev", None):
+                result["skipped_count"] += 1
+                continue
+            rows[ado_id] = map_work_item(wi, project_id)
+        if rows:
+            chunks.append(list(rows.values()))
+    timings["map"] = time.perf_counter() - started
+
+    _report(progress, phase="write", items_processed=result["skipped_count"])
+    started = time.perf_counter()
+    async with database.transaction():
+        for rows in chunks:
+            await database.execute(build_upsert(work_items_table, rows))
+            result["synced_count"] += len(rows)
+            _report(progress, items_processed=result["skipped_count"] + result["synced_count"])
+    timings["write"] = time.perf_counter() - started
+
+    return result
@@ -0,0 +1,156 @@
+# Batch create/update/delete for work items and backlogs
+#
+# POST /api/work-items:batch and /api/backlogs:batch take a list of operations
+# and apply them with one statement per kind: one DELETE, one INSERT, and one
+# UPDATE per set of changed fields with the new values passed as arrays. A bulk
+# edit of hundreds of items is one request and a few statements, not one each.
+#
+# Updates are partial: only the fields sent are written. Every operation gets a
+# result, in request order. Operations that fail validation (unknown id, missing
+# field, null in a required field, unknown project) are skipped and the others
+# applied; with atomic set, any failure fails the batch and nothing is applied.
+# Call apply_batch inside a transaction; the items are locked until it commits.
+
+from typing import NamedTuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from exports import missing_references, sql_type, validation_message
+
+# Operations per request
+MAX_BATCH_OPERATIONS = 1000
+
+
+class BatchResult(NamedTuple):
+    results: list
+    # Rows as written; updated are (previous row, row) pairs, deleted the previous rows
+    created: list
+    updated: list
+    deleted: list
+
+
+async def _update(database, table, changes, defaults):
+    # changes: {id: {field: value}}, all changing the same fields; defaults are
+    # set on every row (e.g. updated_at)
+    names = list(next(iter(changes.values())))
+    columns = [table.c.id] + [table.c[name] for name in names]
+    assignments = [f'"{name}" = u."{name}"' for name in names] + [
+        f'"{name}" = CAST(:default_{name} AS {sql_type(table.c[name])})' for name in defaults
+    ]
+    query = f"""
+        UPDATE {table.name} t SET {", ".join(assignments)}
+        FROM unnest({", ".join(f"CAST(:{column.name}_values AS {sql_type(column)}[])" for column in columns)})
+            AS u({", ".join(f'"{column.name}"' for column in columns)})
+        WHERE t.id = u.id
+        RETURNING {", ".join(f't."{column.name}"' for column in table.columns)}
+    """
+    params = {"id_values": list(changes)}
+    params.update({f"{name}_values": [fields[name] for fields in changes.values()] for name in names})
+    params.update({f"default_{name}": value for name, value in defaults.items()})
+    return await database.fetch_all(query, params)
+
+
+async def apply_batch(database, table, model, operations, atomic=False, foreign_keys=None,
+                      create_defaults=None, update_defaults=None, not_found="Item not found"):
+    # operations have op ("create", "update" or "delete"), id and data, a model
+    # whose fields are all optional; creates are validated with model, and updates
+    # may not null a field that model does not allow to be None.
+    # foreign_keys maps a field to the column it must exist in, as in import_rows.
+    foreign_keys = foreign_keys or {}
+    create_defaults = create_defaults or {}
+    update_defaults = update_defaults or {}
+    nullable = {
+        name for name, field in model.model_fields.items() if not field.is_required() and field.default is None
+    }
+    results = [{"index": index, "op": operation.op, "id": operation.id} for index, operation in enumerate(operations)]
+    errors = {}
+
+    targets = set()
+    for index, operation in enumerate(operations):
+        if operation.op == "create":
+            if operation.id is not None:
+                errors[index] = "id is assigned on create"
+        elif operation.id is None:
+            errors[index] = f"id is required to {operation.op}"
+        elif operation.id in targets:
+            errors[index] = f"More than one operation on id {operation.id}"
+        else:
+            targets.add(operation.id)
+
+    existing = {}
+    if targets:
+        query = table.select().where(table.c.id.in_(targets)).with_for_update()
+        existing = {row["id"]: row for row in await database.fetch_all(query)}
+
+    # index -> the fields to write
+    values = {}
+    for index, operation in enumerate(operations):
+        if index in errors:
+            continue
+        if operation.op != "create" and operation.id not in existing:
+            errors[index] = not_found
+        elif operation.op == "create":
+            try:
+                values[index] = model(**operation.data.dict(exclude_unset=True)).dict()
+            except ValidationError as exc:
+                errors[index] = validation_message(exc)
+        elif operation.op == "update":
+            fields = operation.data.dict(exclude_unset=True)
+            nulls = [name for name, value in fields.items() if value is None and name not in nullable]
+            if nulls:
+                errors[index] = "; ".join(f"{name}: may not be null" for name in nulls)
+            else:
+                values[index] = fields
+
+    missing = await missing_references(database, list(values.items()), foreign_keys)
+    for index, fields in list(values.items()):
+        bad = [field for field, ids in missing.items() if fields.get(field) in ids]
+        if bad:
+            errors[index] = "; ".join(f"{field}: {fields[field]} does not exist" for field in bad)
+            del values[index]
+
+    for index, message in errors.items():
+        results[index].update(status="error", error=message)
+    if errors and atomic:
+        for result in results:
+            result.setdefault("status", "skipped")
+        raise HTTPException(status_code=409, detail={
+            "message": f"{len(errors)} of {len(operations)} operations failed; nothing was applied",
+            "results": results,
+        })
+
+    ok = [index for index in range(len(operations)) if index not in errors]
+    deletes = [index for index in ok if operations[index].op == "delete"]
+    creates = [index for index in ok if operations[index].op == "create"]
+    updates = [index for index in ok if operations[index].op == "update"]
+
+    deleted = []
+    if deletes:
+        ids = [operations[index].id for index in deletes]
+        await database.execute(table.delete().where(table.c.id.in_(ids)))
+        deleted = [existing[item_id] for item_id in ids]
+        for index in deletes:
+            results[index]["status"] = "ok"
+
+    groups = {}
+    for index in updates:
+        if values[index]:
+            groups.setdefault(tuple(sorted(values[index])), {})[operations[index].id] = values[index]
+    rows = {}
+    for changes in groups.values():
+        rows.update((row["id"], row) for row in await _update(database, table, changes, update_defaults))
+    updated = [(existing[item_id], row) for item_id, row in rows.items()]
+    for index in updates:
+        # Nothing sent: reported with the item as it is
+        row = rows.get(operations[index].id, existing[operations[index].id])
+        results[index].update(status="ok", item=dict(row._mapping))
+
+    created = []
+    if creates:
+        query = table.insert().values([{**values[index], **create_defaults} for index in creates]).returning(*table.c)
+        # Rows come back in VALUES order
+        created = await database.fetch_all(query)
+        for index, row in zip(creates, created):
+            results[index].update(id=row["id"], status="ok", item=dict(row._mapping))
+
+    return BatchResult(results, created, updated, deleted)
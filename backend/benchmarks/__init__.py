@@ -0,0 +1,2 @@
+# Benchmarks for the API, run from backend/ against DATABASE_URL, e.g.
+#   python -m benchmarks.login
@@ -0,0 +1,82 @@
+# In-process load driver
+#
+# Runs a scenario (an async callable making one request) a fixed number of times
+# at a given concurrency and records each call's latency, status and the number of
+# database statements it ran. Statements are counted by wrapping the query methods
+# of databases' Connection; the count is kept in a context variable, so it follows
+# each call into the tasks it spawns and concurrent calls do not mix.
+
+import asyncio
+import contextvars
+import functools
+import time
+
+import httpx
+from databases.core import Connection
+
+QUERY_METHODS = ["fetch_all", "fetch_one", "fetch_val", "execute", "execute_many"]
+
+_queries = contextvars.ContextVar("benchmark_queries", default=None)
+
+
+def _count():
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def _counted(method):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        _count()
+        return await method(*args, **kwargs)
+    wrapper.counted = True
+    return wrapper
+
+
+def _counted_iterate(method):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        _count()
+        async for row in method(*args, **kwargs):
+            yield row
+    wrapper.counted = True
+    return wrapper
+
+
+def count_queries():
+    # Idempotent; only affects statements run inside drive()
+    for name in QUERY_METHODS:
+        method = getattr(Connection, name)
+        if not getattr(method, "counted", False):
+            setattr(Connection, name, _counted(method))
+    if not getattr(Connection.iterate, "counted", False):
+        Connection.iterate = _counted_iterate(Connection.iterate)
+
+
+def app_client(app):
+    # The app is called in the caller's task, so the query counter reaches it
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None)
+
+
+async def drive(call, requests, concurrency):
+    # call: coroutine function returning an HTTP status (or any label) per request
+    samples = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for n in remaining:
+            counter = [0]
+            _queries.set(counter)
+            started = time.perf_counter()
+            try:
+                status = await call(n)
+            except Exception as exc:
+                status = type(exc).__name__
+            samples.append((time.perf_counter() - started, status, counter[0]))
+
+    count_queries()
+    started = time.perf_counter()
+    # Each worker is its own task, so each has its own counter
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return {"samples": samples, "elapsed": time.perf_counter() - started}
@@ -0,0 +1,55 @@
+# Stand-in for the Azure DevOps work item tracking client
+#
+# Answers the two calls ado_sync makes (query_by_wiql, get_work_items) from an
+# in-memory set of work items, with an optional delay per call to stand in for
+# the network. Install it with install(config_id, client) so ado_sync's client
+# cache hands it out instead of connecting.
+
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import ado_sync
+
+# Far above any id the generator creates, so synced rows are easy to tell apart
+FIRST_ADO_ID = 10_000_000
+
+
+class FakeWorkItemClient:
+    def __init__(self, count, assignee, latency=0.0, first_id=FIRST_ADO_ID):
+        self.latency = latency
+        self.calls = 0
+        changed = datetime.utcnow() - timedelta(days=1)
+        self.items = {
+            first_id + n: {
+                "System.Id": first_id + n,
+                "System.Title": f"ADO item {first_id + n}",
+                "System.State": ["New", "Active", "Committed", "Done"][n % 4],
+                "System.WorkItemType": ["Task", "Bug", "Feature", "Product Backlog Item"][n % 4],
+                "System.AssignedTo": {"uniqueName": assignee},
+                "System.ChangedDate": (changed + timedelta(seconds=n)).isoformat() + "Z",
+                "Microsoft.VSTS.Scheduling.StartDate": "2024-01-01T00:00:00Z",
+                "Microsoft.VSTS.Scheduling.FinishDate": "2024-01-15T00:00:00Z",
+                "Microsoft.VSTS.Scheduling.OriginalEstimate": float(n % 16),
+                "Microsoft.VSTS.Scheduling.CompletedWork": float(n % 8),
+            }
+            for n in range(count)
+        }
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            # Called on ado_sync's thread pool, like the real SDK
+            time.sleep(self.latency)
+
+    def query_by_wiql(self, wiql, time_precision=None, **kwargs):
+        self._call()
+        return SimpleNamespace(work_items=[SimpleNamespace(id=item_id) for item_id in self.items])
+
+    def get_work_items(self, ids, fields=None, error_policy=None, **kwargs):
+        self._call()
+        return [SimpleNamespace(id=item_id, rev=1, fields=dict(self.items[item_id])) for item_id in ids]
+
+
+def install(config_id, client):
+    ado_sync._client_cache[config_id] = client
@@ -0,0 +1,236 @@
+# Synthetic data generator
+#
+# Fills the database at DATABASE_URL with a seeded, repeatable data set at
+# benchmark volumes: users (some with an ADO client mapping), projects, work items
+# assigned to them by email or client id, backlogs and task progress spread over
+# the last year, plus an azure_config row for the ADO sync benchmark.
+#
+#   python -m benchmarks.generate --users 500 --progress 1000000
+#   python -m benchmarks.generate --reset ...   # empty the tables first
+#
+# Rows are written with COPY in batches, so the rollup triggers run once per batch.
+# Postgres only; point DATABASE_URL at a throwaway database, never production.
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import main
+import passwords
+from search import is_postgres
+
+# Every generated user logs in with this password
+BENCHMARK_PASSWORD = "benchmark-password"
+BENCHMARK_EMAIL_DOMAIN = "bench.example.com"
+# Generated ADO client ids, mapped to users in user_client_id_map
+CLIENT_ID_DOMAIN = "client.bench.example.com"
+# Rows per COPY
+COPY_BATCH_SIZE = 50000
+HISTORY_DAYS = 365
+
+RESET_TABLES = [
+    "sync_jobs", "azure_sync_state", "azure_config", "task_progress", "task_progress_archives", "backlogs",
+    "work_items", "projects", "user_client_id_map", "user_daily_utilization", "users",
+]
+
+WORDS = [
+    "migration", "login", "dashboard", "report", "export", "import", "billing", "invoice",
+    "search", "cache", "timeout", "latency", "sync", "azure", "pipeline", "deploy",
+    "payment", "refund", "profile", "settings", "permission", "audit", "backup", "restore",
+    "notification", "email", "upload", "download", "api", "schema", "index", "query",
+    "mobile", "layout", "chart", "filter", "pagination", "session", "token", "webhook",
+]
+VERBS = ["Fix", "Add", "Update", "Refactor", "Investigate", "Remove", "Speed up", "Document", "Test", "Review"]
+TYPES = ["task", "bug", "feature", "backlog"]
+PRIORITIES = ["low", "medium", "high", "critical"]
+STATUSES = ["new", "active", "in_progress", "Committed", "completed", "Done"]
+SIZES = ["XS", "S", "M", "L", "XL"]
+PROJECT_STATUSES = ["active", "active", "active", "on_hold", "completed"]
+
+
+def user_email(n):
+    return f"user{n}@{BENCHMARK_EMAIL_DOMAIN}"
+
+
+def client_id(n):
+    return f"user{n}@{CLIENT_ID_DOMAIN}"
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def title(rng):
+    return f"{rng.choice(VERBS)} {sentence(rng, rng.randint(2, 5))}"
+
+
+async def copy_rows(database, table, columns, rows):
+    async with database.connection() as connection:
+        await connection.raw_connection.copy_records_to_table(table, records=rows, columns=columns)
+
+
+async def copy_batches(database, table, columns, rows, label):
+    # rows is an iterator; written COPY_BATCH_SIZE at a time
+    written = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == COPY_BATCH_SIZE:
+            await copy_rows(database, table, columns, batch)
+            written += len(batch)
+            batch = []
+            print(f"  {label}: {written}")
+    if batch or not written:
+        await copy_rows(database, table, columns, batch)
+        written += len(batch)
+        print(f"  {label}: {written}")
+    return written
+
+
+async def generate(database, users=500, mapped_ratio=0.5, projects=50, work_items=50000, backlogs=10000,
+                   progress=1000000, seed=42, reset=False):
+    if not is_postgres(database):
+        raise SystemExit("The generator writes with COPY and needs Postgres")
+    rng = random.Random(seed)
+    today = date.today()
+    start = today - timedelta(days=HISTORY_DAYS)
+    started = time.perf_counter()
+
+    if reset:
+        print("Emptying " + ", ".join(RESET_TABLES))
+        await database.execute("TRUNCATE " + ", ".join(RESET_TABLES) + " RESTART IDENTITY CASCADE")
+
+    # One bcrypt hash shared by every user keeps generation fast
+    password_hash = passwords.pwd_context.hash(BENCHMARK_PASSWORD)
+    first_user = (await database.fetch_val("SELECT COALESCE(MAX(id), 0) FROM users")) + 1
+    user_numbers = range(first_user, first_user + users)
+    roles = ["admin"] * 1 + ["lead"] * 4 + ["developer"] * 15
+    await copy_batches(database, "users", ["email", "name", "password_hash", "role"], (
+        (user_email(n), f"Benchmark User {n}", password_hash, rng.choice(roles)) for n in user_numbers
+    ), "users")
+    user_ids = {row["email"]: row["id"] for row in await database.fetch_all(
+        "SELECT id, email FROM users WHERE email LIKE :pattern", {"pattern": f"%@{BENCHMARK_EMAIL_DOMAIN}"}
+    )}
+
+    # user_client_id_map.id has no default
+    first_map = (await database.fetch_val("SELECT COALESCE(MAX(id), 0) FROM user_client_id_map")) + 1
+    mapped = [n for n in user_numbers if rng.random() < mapped_ratio]
+    await copy_batches(database, "user_client_id_map", ["id", "user_id", "client_user_id", "active"], (
+        (first_map + i, user_ids[user_email(n)], client_id(n), True) for i, n in enumerate(mapped)
+    ), "client mappings")
+
+    project_rows = []
+    for n in range(projects):
+        project_start = start + timedelta(days=rng.randint(0, HISTORY_DAYS // 2))
+        project_rows.append((
+            f"Benchmark {rng.choice(WORDS).title()} {n + 1}", sentence(rng, 12), project_start,
+            project_start + timedelta(days=rng.randint(60, 365)), rng.choice(PROJECT_STATUSES),
+        ))
+    first_project = (await database.fetch_val("SELECT COALESCE(MAX(id), 0) FROM projects")) + 1
+    await copy_batches(database, "projects", ["name", "description", "start_date", "end_date", "status"],
+                       project_rows, "projects")
+    project_ids = [row[0] for row in await database.fetch_all(
+        "SELECT id FROM projects WHERE id >= :first ORDER BY id", {"first": first_project}
+    )]
+
+    # Assignees: the user's email, or their client id when they have one
+    mapped_set = set(mapped)
+    assignees = []
+    for n in user_numbers:
+        assignees.append(user_email(n))
+        if n in mapped_set:
+            assignees.append(client_id(n))
+
+    def work_item_rows():
+        now = datetime.utcnow()
+        for _ in range(work_items):
+            item_start = start + timedelta(days=rng.randint(0, HISTORY_DAYS))
+            estimated = rng.choice([1, 2, 4, 8, 16, 24, 40])
+            updated = now - timedelta(minutes=rng.randint(0, HISTORY_DAYS * 24 * 60))
+            yield (
+                rng.choice(project_ids), title(rng), sentence(rng, rng.randint(8, 30)), rng.choice(TYPES),
+                rng.choice(PRIORITIES), rng.choice(STATUSES), rng.choice(assignees), item_start,
+                item_start + timedelta(days=rng.randint(1, 30)), float(estimated), 0.0, rng.choice(SIZES),
+                updated, updated,
+            )
+
+    first_item = (await database.fetch_val("SELECT COALESCE(MAX(id), 0) FROM work_items")) + 1
+    await copy_batches(database, "work_items", [
+        "project_id", "title", "description", "type", "priority", "status", "assigned_to", "start_date",
+        "end_date", "estimated_hours", "actual_hours", "t_shirt_size", "created_at", "updated_at",
+    ], work_item_rows(), "work items")
+    items = [(row["id"], row["assigned_to"], row["start_date"]) for row in await database.fetch_all(
+        "SELECT id, assigned_to, start_date FROM work_items WHERE id >= :first ORDER BY id", {"first": first_item}
+    )]
+
+    await copy_batches(database, "backlogs", ["project_id", "title", "description", "priority", "status", "created_by"], (
+        (rng.choice(project_ids), title(rng), sentence(rng, rng.randint(8, 30)), rng.randint(0, 100),
+         rng.choice(STATUSES[:3]), user_email(rng.choice(user_numbers)))
+        for _ in range(backlogs)
+    ), "backlogs")
+
+    def progress_rows():
+        for _ in range(progress):
+            item_id, assignee, item_start = rng.choice(items)
+            # Hours are logged by the user, under their email even for client id items
+            email = assignee.replace(CLIENT_ID_DOMAIN, BENCHMARK_EMAIL_DOMAIN)
+            day = min(today, item_start + timedelta(days=rng.randint(0, 30)))
+            yield (item_id, email, float(rng.choice([0.5, 1, 1.5, 2, 3, 4, 6, 8])),
+                   float(rng.randint(0, 20) * 5), rng.choice([None, sentence(rng, 6)]), day)
+
+    if items:
+        # The history's monthly partitions first, so COPY does not fill the default one
+        # (fetch_all: execute() would stop at the first row)
+        await database.fetch_all(
+            "SELECT create_task_progress_partition(CAST(m AS date)) "
+            "FROM generate_series(date_trunc('month', CAST(:start AS date)), CAST(:today AS date), interval '1 month') m",
+            {"start": start, "today": today},
+        )
+        await copy_batches(database, "task_progress", [
+            "work_item_id", "user_email", "hours_worked", "progress_percentage", "notes", "date",
+        ], progress_rows(), "task progress")
+        # Keep actual_hours equal to the logged hours, as POST /api/task-progress does
+        await database.execute("""
+            UPDATE work_items wi SET actual_hours = s.hours
+            FROM (SELECT work_item_id, SUM(hours_worked) AS hours FROM task_progress
+                  WHERE work_item_id >= :first GROUP BY work_item_id) s
+            WHERE wi.id = s.work_item_id
+        """, {"first": first_item})
+
+    if not await database.fetch_val("SELECT COUNT(*) FROM azure_config WHERE is_active"):
+        await database.execute(main.azure_config.insert().values(
+            organization_url="https://dev.azure.com/benchmark", project_name="Spark",
+            personal_access_token="benchmark", is_active=True,
+        ))
+
+    await database.execute("ANALYZE")
+    print(f"Generated in {time.perf_counter() - started:.1f}s; users log in with {BENCHMARK_PASSWORD!r}")
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="Synthetic data generator")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--mapped-ratio", type=float, default=0.5, help="share of users with an ADO client id")
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--work-items", type=int, default=50000)
+    parser.add_argument("--backlogs", type=int, default=10000)
+    parser.add_argument("--progress", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="empty the application tables first")
+    args = parser.parse_args()
+
+    async def run():
+        await main.database.connect()
+        try:
+            await generate(main.database, args.users, args.mapped_ratio, args.projects, args.work_items,
+                           args.backlogs, args.progress, args.seed, args.reset)
+        finally:
+            await main.database.disconnect()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,91 @@
+# Login storm benchmark
+#
+# Fires --logins logins at --concurrency against the in-process app while a probe
+# requests --probe-path every few milliseconds, then reports login throughput and
+# the probe's latency. With bcrypt on the event loop the probe waits behind every
+# hash; with the process pool it should stay flat.
+#
+#   python -m benchmarks.login --logins 200 --concurrency 50
+#   PASSWORD_WORKERS=0 python -m benchmarks.login    # inline bcrypt baseline
+#
+# Logs in as --email, which is registered first if it does not exist yet.
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+import main
+import passwords
+from benchmarks.report import percentile
+
+def summarize(name, latencies):
+    ms = [value * 1000 for value in latencies]
+    return "%-8s n=%-5d p50=%7.1fms p95=%7.1fms p99=%7.1fms max=%7.1fms" % (
+        name, len(ms), percentile(ms, 50), percentile(ms, 95), percentile(ms, 99), max(ms, default=0.0)
+    )
+
+
+async def run(logins, concurrency, email, password, probe_path, probe_interval):
+    await main.startup()
+    transport = httpx.ASGITransport(app=main.app)
+    login_latencies = []
+    probe_latencies = []
+    statuses = {}
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # 400 when the user already exists; either way this also starts the pool
+        await client.post("/api/auth/register", json={"email": email, "name": "Benchmark", "password": password})
+        credentials = {"email": email, "password": password}
+        remaining = iter(range(logins))
+
+        async def login_worker():
+            for _ in remaining:
+                started = time.perf_counter()
+                response = await client.post("/api/auth/login", json=credentials)
+                login_latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe():
+            # Timed from when the request was due, so time spent waiting for a
+            # blocked event loop to wake the probe up counts too
+            due = time.perf_counter()
+            while not done.is_set():
+                await client.get(probe_path)
+                probe_latencies.append(time.perf_counter() - due)
+                due = time.perf_counter() + probe_interval
+                await asyncio.sleep(probe_interval)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*[login_worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    pool = passwords.snapshot()
+    await main.shutdown()
+
+    print("password workers=%s max_concurrency=%s" % (pool["workers"], pool["max_concurrency"]))
+    print("logins: %d in %.2fs = %.1f/s, statuses %s" % (logins, elapsed, logins / elapsed, statuses))
+    print(summarize("login", login_latencies))
+    print(summarize("probe", probe_latencies))
+    print("password queue: max waiting %d, rejected %d" % (pool["max_waiting"], pool["rejected"]))
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="Login storm benchmark")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=25)
+    parser.add_argument("--email", default="login-benchmark@example.com")
+    parser.add_argument("--password", default="benchmark-password")
+    parser.add_argument("--probe-path", default="/", help="endpoint whose latency is watched during the storm")
+    parser.add_argument("--probe-interval", type=float, default=0.01, help="seconds between probe requests")
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, args.concurrency, args.email, args.password, args.probe_path, args.probe_interval))
+
+
+if __name__ == "__main__":
+    cli()
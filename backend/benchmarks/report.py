@@ -0,0 +1,76 @@
+# Benchmark results: summaries, the printed table and baseline comparison
+#
+# Results are saved as JSON ({scenario: summary}) so a run can be compared with a
+# saved baseline; a scenario regresses when its p95 grows by more than the allowed
+# ratio or it runs more queries per request than before.
+
+import json
+
+# (name, width, value format)
+COLUMNS = [
+    ("scenario", 22, "%-22s"), ("requests", 8, "%8d"), ("errors", 6, "%6d"), ("rps", 8, "%8.1f"),
+    ("p50_ms", 8, "%8.1f"), ("p95_ms", 8, "%8.1f"), ("p99_ms", 8, "%8.1f"), ("max_ms", 8, "%8.1f"),
+    ("queries", 7, "%7.1f"),
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(result):
+    # result: drive() output; statuses >= 400 and exceptions count as errors
+    samples = result["samples"]
+    latencies = [latency * 1000 for latency, _, _ in samples]
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 400)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "statuses": statuses,
+        "rps": len(samples) / result["elapsed"] if result["elapsed"] else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies, default=0.0),
+        "queries": sum(queries for _, _, queries in samples) / len(samples) if samples else 0.0,
+    }
+
+
+def format_table(summaries):
+    lines = [" ".join(name.ljust(width) if name == "scenario" else name.rjust(width) for name, width, _ in COLUMNS)]
+    for scenario, summary in summaries.items():
+        values = {**summary, "scenario": scenario}
+        lines.append(" ".join(fmt % values[name] for name, _, fmt in COLUMNS))
+    return "\n".join(lines)
+
+
+def save(path, summaries):
+    with open(path, "w") as output:
+        json.dump(summaries, output, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as source:
+        return json.load(source)
+
+
+def regressions(baseline, summaries, max_ratio=1.25):
+    found = []
+    for scenario, summary in summaries.items():
+        before = baseline.get(scenario)
+        if not before:
+            continue
+        if before["p95_ms"] and summary["p95_ms"] > before["p95_ms"] * max_ratio:
+            found.append(f"{scenario}: p95 {before['p95_ms']:.1f}ms -> {summary['p95_ms']:.1f}ms")
+        if summary["queries"] > before["queries"] + 0.01:
+            found.append(f"{scenario}: queries/request {before['queries']:.1f} -> {summary['queries']:.1f}")
+        if summary["errors"] > before["errors"]:
+            found.append(f"{scenario}: errors {before['errors']} -> {summary['errors']}")
+    return found
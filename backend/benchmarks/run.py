@@ -0,0 +1,160 @@
+# API benchmark
+#
+# Drives every scenario below against the in-process app and prints p50/p95/p99
+# latency, throughput and database statements per request. Requests are made as
+# random generated users (see benchmarks.generate), so per-user filters and the
+# identity cache behave as in production. The response cache is off unless
+# --cache is given, so the numbers are those of the queries behind each route.
+#
+#   python -m benchmarks.run --requests 200 --concurrency 20
+#   python -m benchmarks.run --scenarios dashboard,search --save baseline.json
+#   python -m benchmarks.run --baseline baseline.json   # exit 1 on a regression
+#
+# Scenarios that write (log_progress, ado_sync) change the data; use a throwaway
+# database.
+
+import argparse
+import asyncio
+import random
+import sys
+from datetime import date, timedelta
+
+import main
+from benchmarks import fake_ado, report
+from benchmarks.driver import app_client, drive
+from benchmarks.generate import BENCHMARK_EMAIL_DOMAIN, BENCHMARK_PASSWORD, WORDS
+
+
+async def load_fixtures(database):
+    users = await database.fetch_all(
+        "SELECT u.email, u.role, m.client_user_id FROM users u "
+        "LEFT JOIN user_client_id_map m ON m.user_id = u.id AND m.active "
+        "WHERE u.email LIKE :pattern ORDER BY u.id",
+        {"pattern": f"%@{BENCHMARK_EMAIL_DOMAIN}"},
+    )
+    if not users:
+        raise SystemExit("No generated users found; run python -m benchmarks.generate first")
+    work_item_ids = [row[0] for row in await database.fetch_all(
+        "SELECT id FROM work_items TABLESAMPLE SYSTEM (10) LIMIT 10000"
+    )] or [row[0] for row in await database.fetch_all("SELECT id FROM work_items LIMIT 10000")]
+    config = await database.fetch_one(main.azure_config.select().where(main.azure_config.c.is_active == True))
+    return {"users": users, "work_item_ids": work_item_ids, "config": config}
+
+
+def scenarios(client, fixtures, rng, ado_items, ado_latency):
+    users = fixtures["users"]
+    tokens = {}
+
+    def headers():
+        user = rng.choice(users)
+        if user["email"] not in tokens:
+            tokens[user["email"]] = main.create_access_token({"sub": user["email"], "role": user["role"]})
+        return {"Authorization": "Bearer " + tokens[user["email"]]}
+
+    def get(path):
+        async def call(n):
+            url = path() if callable(path) else path
+            return (await client.get(url, headers=headers())).status_code
+        return call
+
+    def report_range():
+        start = date.today() - timedelta(days=rng.choice([7, 30, 90]))
+        return f"/api/reports/utilization?start_date={start}"
+
+    async def log_progress(n):
+        response = await client.post("/api/task-progress", headers=headers(), json={
+            "work_item_id": rng.choice(fixtures["work_item_ids"]), "hours_worked": 1.5,
+            "progress_percentage": 50, "notes": "benchmark", "date": str(date.today()),
+        })
+        return response.status_code
+
+    async def login(n):
+        user = rng.choice(users)
+        response = await client.post("/api/auth/login", json={"email": user["email"], "password": BENCHMARK_PASSWORD})
+        return response.status_code
+
+    async def ado_sync(n):
+        # The sync job itself, not POST /api/sync-azure-boards, which only queues it
+        if not fixtures["config"]:
+            raise LookupError("no active azure_config")
+        mapped = [user for user in users if user["client_user_id"]] or users
+        user = rng.choice(mapped)
+        assignee = user["client_user_id"] or user["email"]
+        fake_ado.install(fixtures["config"]["id"], fake_ado.FakeWorkItemClient(ado_items, assignee, ado_latency))
+        await main.run_azure_sync(fixtures["config"], assignee, full_resync=True)
+        return 200
+
+    return {
+        "projects": get("/api/projects"),
+        "work_items": get("/api/work-items"),
+        "backlogs": get("/api/backlogs"),
+        "task_progress": get(lambda: f"/api/task-progress/{rng.choice(fixtures['work_item_ids'])}"),
+        "utilization_report": get(report_range),
+        "utilization_timeseries": get(lambda: f"/api/reports/utilization/timeseries?bucket=week&start_date={date.today() - timedelta(days=365)}"),
+        "project_status_report": get("/api/reports/project-status"),
+        "forecast_report": get("/api/reports/forecast"),
+        "dashboard": get("/api/dashboard"),
+        "search": get(lambda: f"/api/search?q={rng.choice(WORDS)}"),
+        "log_progress": log_progress,
+        "login": login,
+        "ado_sync": ado_sync,
+    }
+
+
+async def run(args):
+    if not args.cache:
+        # Nothing fits in a zero byte cache
+        main.response_cache.maxbytes = 0
+    await main.startup()
+    rng = random.Random(args.seed)
+    summaries = {}
+    try:
+        fixtures = await load_fixtures(main.database)
+        # Warm the identity cache, so queries per request do not depend on how
+        # many distinct users a scenario happened to pick
+        for user in fixtures["users"]:
+            main.identity_cache.set(user["email"], await main.load_identity(user["email"]))
+        async with app_client(main.app) as client:
+            available = scenarios(client, fixtures, rng, args.ado_items, args.ado_latency)
+            wanted = args.scenarios.split(",") if args.scenarios else list(available)
+            unknown = [name for name in wanted if name not in available]
+            if unknown:
+                raise SystemExit("Unknown scenarios: " + ", ".join(unknown) + "; choose from " + ", ".join(available))
+            for name in wanted:
+                # Writes are slower; the sync moves ado_items rows per call
+                requests = args.requests if name not in ("ado_sync", "login") else max(1, args.requests // 10)
+                concurrency = min(args.concurrency, requests) if name != "ado_sync" else 1
+                print(f"{name}: {requests} requests at concurrency {concurrency}")
+                summaries[name] = report.summarize(await drive(available[name], requests, concurrency))
+    finally:
+        await main.shutdown()
+
+    print()
+    print(report.format_table(summaries))
+    if args.save:
+        report.save(args.save, summaries)
+    if args.baseline:
+        found = report.regressions(report.load(args.baseline), summaries, args.max_regression)
+        for line in found:
+            print("REGRESSION " + line)
+        return 1 if found else 0
+    return 0
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="API benchmark")
+    parser.add_argument("--scenarios", help="comma separated subset (default: all)")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario (a tenth for login and ado_sync)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--cache", action="store_true", help="leave the response cache on")
+    parser.add_argument("--ado-items", type=int, default=1000, help="work items returned by the fake ADO client")
+    parser.add_argument("--ado-latency", type=float, default=0.0, help="seconds added to every fake ADO call")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with results saved by --save")
+    parser.add_argument("--max-regression", type=float, default=1.25, help="allowed p95 growth against the baseline")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    cli()
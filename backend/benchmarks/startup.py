@@ -0,0 +1,88 @@
+# Import and startup time budget
+#
+# Times `import main` in a fresh interpreter, then main.startup() and shutdown()
+# against DATABASE_URL, and checks that the modules main is meant to load lazily
+# (the Azure DevOps SDK, openpyxl) were not imported on the way. Each figure is the
+# median of --runs interpreters. Exits 1 when a budget is exceeded, so it can gate
+# a build like run.py --baseline.
+#
+#   python -m benchmarks.startup
+#   python -m benchmarks.startup --import-budget 1.5 --startup-budget 0.5 --runs 5
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Imported on first use only (see ado_sync._connect and exports.py)
+LAZY_MODULES = ["azure.devops", "msrest", "requests", "openpyxl", "numpy", "pandas"]
+# Seconds allowed for import main and for main.startup()
+IMPORT_BUDGET = 2.0
+STARTUP_BUDGET = 1.0
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+lazy = [name for name in {lazy!r} if name in sys.modules]
+startup = None
+if {with_startup!r}:
+    async def run():
+        began = time.perf_counter()
+        await main.startup()
+        ready = time.perf_counter()
+        await main.shutdown()
+        return ready - began
+    startup = asyncio.run(run())
+print(json.dumps({{"import": imported - started, "startup": startup, "lazy_loaded": lazy}}))
+"""
+
+
+def probe(with_startup, env=None):
+    # env replaces the environment of the probe (e.g. another DATABASE_URL)
+    code = PROBE.format(lazy=LAZY_MODULES, with_startup=with_startup)
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    # The last line; startup() may log before it
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="Import and startup time budget")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET, help="seconds allowed for import main")
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET, help="seconds allowed for main.startup()")
+    parser.add_argument("--no-startup", action="store_true", help="only time the import (no database needed)")
+    args = parser.parse_args()
+
+    # A first interpreter compiles any stale bytecode, so it is not counted
+    probe(False)
+    results = [probe(not args.no_startup) for _ in range(args.runs)]
+    failures = []
+
+    import_seconds = statistics.median(result["import"] for result in results)
+    print(f"import main: {import_seconds:.3f}s (budget {args.import_budget}s)")
+    if import_seconds > args.import_budget:
+        failures.append("import main is over budget")
+    if not args.no_startup:
+        startup_seconds = statistics.median(result["startup"] for result in results)
+        print(f"startup():   {startup_seconds:.3f}s (budget {args.startup_budget}s)")
+        if startup_seconds > args.startup_budget:
+            failures.append("startup() is over budget")
+    lazy_loaded = sorted({name for result in results for name in result["lazy_loaded"]})
+    if lazy_loaded:
+        failures.append("imported at startup: " + ", ".join(lazy_loaded))
+
+    for failure in failures:
+        print("OVER BUDGET " + failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,139 @@
+# Small in-process caches shared by the API
+
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    # Bounded LRU mapping whose entries also expire after ttl seconds
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class ResponseCache:
+    # LRU of encoded response bodies bounded by their total size in bytes. Entries
+    # also expire after ttl seconds, which bounds staleness for writes this process
+    # never sees (other workers, manual SQL).
+
+    def __init__(self, maxbytes=32 * 1024 * 1024, ttl=300.0):
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def set(self, key, etag, body, ttl=None):
+        # ttl: shorter lifetime for this entry
+        if len(body) > self.maxbytes:
+            return
+        if key in self._data:
+            self._remove(key)
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, etag, body)
+        self.size += len(body)
+        while self.size > self.maxbytes:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._data.pop(key)
+        self.size -= len(entry[2])
+
+    def clear(self):
+        self._data.clear()
+        self.size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "entries": len(self._data),
+            "bytes": self.size,
+            "maxbytes": self.maxbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class VersionCounters:
+    # Per-resource counters bumped by writes. Cached responses are keyed by the
+    # versions of the resources they read, so a bump makes them unreachable and
+    # the LRU ages them out.
+
+    def __init__(self):
+        self._versions = {}
+        self._changed = {}
+        # Bumped along with every resource by bump_all
+        self._generation = 0
+        self._all_changed = float("-inf")
+
+    def bump(self, *resources):
+        now = time.monotonic()
+        for resource in resources:
+            self._versions[resource] = self._versions.get(resource, 0) + 1
+            self._changed[resource] = now
+
+    def bump_all(self):
+        self._generation += 1
+        self._all_changed = time.monotonic()
+
+    def snapshot(self, resources):
+        return (self._generation,) + tuple(self._versions.get(resource, 0) for resource in resources)
+
+    def changed_within(self, resources, seconds):
+        # Whether any of resources was written in the last seconds
+        cutoff = time.monotonic() - seconds
+        if self._all_changed > cutoff:
+            return True
+        return any(self._changed.get(resource, float("-inf")) > cutoff for resource in resources)
@@ -0,0 +1,293 @@
+# Live change feed: compact change events pushed to clients over Server-Sent Events
+#
+# Write endpoints and the Azure DevOps sync publish() events inside the transaction
+# of the write itself: they are inserted into change_events and their ids NOTIFYed
+# on CHANGE_CHANNEL, which Postgres delivers only once the transaction commits.
+# Every API process LISTENs on a dedicated connection, loads the notified events
+# and queues each subscriber the ones its user may see.
+#
+# An event is {"id", "resource", "action", "item_id", "scope_keys", "data"}:
+#   upsert  data is the row as the list endpoints return it
+#   delete  item_id was deleted
+#   reload  too many rows changed to send them one by one; refetch the resource
+# scope_keys lists who may see it (assignee keys, "role:<role>"); None is everyone.
+#
+# The event id is the resume token. A client reconnecting with Last-Event-ID is
+# sent what it missed from change_events, or a reset event (reload everything)
+# when that has been pruned, is more than CHANGE_REPLAY_LIMIT events, or the
+# client fell CHANGE_QUEUE_SIZE events behind.
+#
+# on_change(resource) is also called for every event a process receives, whichever
+# process published it, and with None when events may have been missed; worker
+# processes use it to drop cached responses that another worker's write made stale.
+
+import asyncio
+import json
+import logging
+import os
+from datetime import timedelta
+
+import asyncpg
+import sqlalchemy
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+CHANGE_CHANNEL = "change_events"
+CHANGE_RETENTION_HOURS = float(os.getenv("CHANGE_RETENTION_HOURS", "24"))
+# More events than this for one resource in one publish() become a single reload
+CHANGE_BULK_LIMIT = int(os.getenv("CHANGE_BULK_LIMIT", "100"))
+# Events a slow client may fall behind by before it is sent a reset
+CHANGE_QUEUE_SIZE = int(os.getenv("CHANGE_QUEUE_SIZE", "1000"))
+# Most events replayed to a reconnecting client
+CHANGE_REPLAY_LIMIT = int(os.getenv("CHANGE_REPLAY_LIMIT", "1000"))
+# Ids are taken when a transaction inserts its events, not when it commits, so a
+# replay also resends the events of transactions that started this many seconds
+# before the client's last one; applying an event twice is harmless
+REPLAY_OVERLAP_SECONDS = 5
+KEEPALIVE_SECONDS = 15
+PRUNE_INTERVAL_SECONDS = 600
+RECONNECT_SECONDS = 5
+# Milliseconds EventSource waits before reconnecting
+CLIENT_RETRY_MS = 3000
+
+# Queued in place of events when a subscriber has to start over
+RESET = object()
+
+
+def upsert(resource, row, scope=None):
+    data = jsonable_encoder(dict(row._mapping) if hasattr(row, "_mapping") else dict(row))
+    return {"resource": resource, "action": "upsert", "item_id": data.get("id"), "scope_keys": scope, "data": data}
+
+
+def delete(resource, item_id, scope=None):
+    return {"resource": resource, "action": "delete", "item_id": item_id, "scope_keys": scope, "data": None}
+
+
+def reload(resource, scope=None):
+    return {"resource": resource, "action": "reload", "item_id": None, "scope_keys": scope, "data": None}
+
+
+def _collapse(events):
+    # One reload instead of the events of any resource with more than CHANGE_BULK_LIMIT
+    by_resource = {}
+    for event in events:
+        by_resource.setdefault(event["resource"], []).append(event)
+    collapsed = []
+    for resource, group in by_resource.items():
+        if len(group) <= CHANGE_BULK_LIMIT:
+            collapsed.extend(group)
+        elif any(event["scope_keys"] is None for event in group):
+            collapsed.append(reload(resource))
+        else:
+            collapsed.append(reload(resource, sorted({key for event in group for key in event["scope_keys"]})))
+    return collapsed
+
+
+def _message(kind, event_id, data):
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def _change_message(event):
+    return _message("change", event["id"], {
+        "resource": event["resource"], "action": event["action"], "id": event["item_id"], "data": event["data"],
+    })
+
+
+class Subscription:
+    def __init__(self, view):
+        # view(event) -> the event as this subscriber should see it, or None
+        self.view = view
+        self.queue = asyncio.Queue(CHANGE_QUEUE_SIZE)
+
+    def offer(self, event):
+        event = self.view(event)
+        if event is None:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.reset()
+
+    def reset(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(RESET)
+
+
+class ChangeFeed:
+    def __init__(self, database, table, on_change=None):
+        self.database = database
+        self.table = table
+        self.on_change = on_change
+        self.enabled = database.url.dialect in ("postgresql", "postgres")
+        self.subscribers = set()
+        self.stats = {"published": 0, "dispatched": 0, "resets": 0}
+        # Lists of notified ids, dispatched in order by a single task
+        self._notified = asyncio.Queue()
+        self._tasks = []
+
+    async def publish(self, events):
+        # Call inside the transaction of the write the events describe
+        if not self.enabled or not events:
+            return
+        events = _collapse(events)
+        rows = [{**event, "data": None if event["data"] is None else json.dumps(event["data"])} for event in events]
+        async with self.database.transaction():
+            inserted = await self.database.fetch_all(self.table.insert().values(rows).returning(self.table.c.id))
+            await self.database.execute(
+                "SELECT pg_notify(:channel, :ids)",
+                {"channel": CHANGE_CHANNEL, "ids": ",".join(str(row["id"]) for row in inserted)},
+            )
+        self.stats["published"] += len(events)
+
+    def _event(self, row):
+        return {
+            "id": row["id"], "resource": row["resource"], "action": row["action"], "item_id": row["item_id"],
+            "scope_keys": row["scope_keys"], "data": None if row["data"] is None else json.loads(row["data"]),
+        }
+
+    async def latest_id(self):
+        return await self.database.fetch_val(sqlalchemy.select([sqlalchemy.func.coalesce(sqlalchemy.func.max(self.table.c.id), 0)]))
+
+    async def replay(self, after):
+        # Events since the resume token after, oldest first; None when they cannot be
+        # told apart from events that were pruned or when there are too many
+        table = self.table
+        anchor = await self.database.fetch_val(sqlalchemy.select([table.c.created_at]).where(table.c.id == after))
+        if anchor is None:
+            # Pruned or unknown: fine only if nothing has happened since
+            newer = await self.database.fetch_val(sqlalchemy.select([table.c.id]).where(table.c.id > after).limit(1))
+            return None if newer is not None else []
+        query = table.select().where(sqlalchemy.or_(
+            table.c.id > after,
+            table.c.created_at >= anchor - timedelta(seconds=REPLAY_OVERLAP_SECONDS),
+        )).order_by(table.c.id).limit(CHANGE_REPLAY_LIMIT + 1)
+        rows = await self.database.fetch_all(query)
+        if len(rows) > CHANGE_REPLAY_LIMIT:
+            return None
+        return [self._event(row) for row in rows]
+
+    def subscribe(self, view):
+        subscription = Subscription(view)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+    def reset_all(self):
+        if self.on_change is not None:
+            self.on_change(None)
+        for subscription in self.subscribers:
+            subscription.reset()
+
+    async def stream(self, view, after=None):
+        # Server-Sent Events for one client; after is its resume token, if any
+        subscription = self.subscribe(view)
+        try:
+            # Subscribed before reading the table, so nothing falls between the two
+            yield f"retry: {CLIENT_RETRY_MS}\n\n"
+            replayed = set()
+            events = None if after is None else await self.replay(after)
+            if events is None:
+                # ready: load everything, then apply changes; reset: the same, but
+                # after the client had data that may now be out of date
+                kind = "ready" if after is None else "reset"
+                if kind == "reset":
+                    self.stats["resets"] += 1
+                yield _message(kind, await self.latest_id(), {})
+            else:
+                for event in events:
+                    event = view(event)
+                    if event is not None:
+                        replayed.add(event["id"])
+                        yield _change_message(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                if event is RESET:
+                    self.stats["resets"] += 1
+                    replayed.clear()
+                    yield _message("reset", await self.latest_id(), {})
+                elif event["id"] not in replayed:
+                    yield _change_message(event)
+        finally:
+            self.unsubscribe(subscription)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self._notified.put_nowait([int(value) for value in payload.split(",") if value])
+
+    async def _dispatch(self):
+        while True:
+            ids = await self._notified.get()
+            try:
+                rows = await self.database.fetch_all(self.table.select().where(self.table.c.id.in_(ids)).order_by(self.table.c.id))
+            except Exception:
+                logger.exception("Could not load change events; resetting subscribers")
+                self.reset_all()
+                continue
+            if self.on_change is not None:
+                for resource in dict.fromkeys(row["resource"] for row in rows):
+                    self.on_change(resource)
+            for row in rows:
+                event = self._event(row)
+                for subscription in list(self.subscribers):
+                    subscription.offer(event)
+            self.stats["dispatched"] += len(rows)
+
+    async def _listen(self):
+        # A dedicated connection: LISTEN belongs to a session, not a pooled connection
+        connected_before = False
+        while True:
+            try:
+                connection = await asyncpg.connect(str(self.database.url))
+            except Exception as e:
+                logger.warning("Change feed cannot connect", extra={"reason": f"{type(e).__name__}: {e}"})
+                await asyncio.sleep(RECONNECT_SECONDS)
+                continue
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            try:
+                await connection.add_listener(CHANGE_CHANNEL, self._on_notify)
+                if connected_before:
+                    # Notifications sent while disconnected are gone
+                    logger.warning("Change feed reconnected; resetting subscribers")
+                    self.reset_all()
+                connected_before = True
+                await lost.wait()
+            except Exception:
+                logger.exception("Change feed listener failed")
+            finally:
+                if not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    async def _prune(self):
+        while True:
+            try:
+                await self.database.execute(
+                    f"DELETE FROM {self.table.name} WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => :seconds)",
+                    {"seconds": CHANGE_RETENTION_HOURS * 3600},
+                )
+            except Exception:
+                logger.exception("Could not prune change events")
+            await asyncio.sleep(PRUNE_INTERVAL_SECONDS)
+
+    async def start(self):
+        if not self.enabled or self._tasks:
+            return
+        self._tasks = [asyncio.create_task(coroutine) for coroutine in (self._listen(), self._dispatch(), self._prune())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self):
+        return {"subscribers": len(self.subscribers), **self.stats}
@@ -0,0 +1,148 @@
+# Database connections: pool settings and read replica routing
+#
+# Both the primary and the optional replica are asyncpg pools sized by the DB_POOL_*
+# settings below. With READ_DATABASE_URL set, list, report, search, dashboard and
+# export reads go to the replica while writes, auth and everything else stay on the
+# primary. A background check every REPLICA_CHECK_INTERVAL seconds measures the
+# replica's replication lag; while it is unreachable or more than REPLICA_MAX_LAG
+# seconds behind, reads fall back to the primary. After a user writes, their reads
+# are pinned to the primary for REPLICA_PIN_SECONDS so they see their own changes.
+
+import asyncio
+import logging
+import os
+
+from databases import DatabaseURL
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# asyncpg pool settings, per process; the defaults are asyncpg's own
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "10"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Connections all worker processes together may open to each database (0: no
+# limit beyond DB_POOL_MAX_SIZE per worker). Each worker's pool gets an equal share,
+# less the one connection its change feed listener holds. WEB_CONCURRENCY is the
+# number of workers (set by gunicorn.conf.py).
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "0"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# A connection is closed and replaced after this many queries...
+DB_POOL_MAX_QUERIES = int(os.getenv("DB_POOL_MAX_QUERIES", "50000"))
+# ...or after being idle this many seconds (0 keeps idle connections open)
+DB_POOL_MAX_IDLE_SECONDS = float(os.getenv("DB_POOL_MAX_IDLE_SECONDS", "300"))
+# Prepared statements cached per connection; set 0 behind pgbouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# Seconds before a statement is cancelled (0: no limit)
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "0"))
+
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL", "")
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+REPLICA_PIN_SECONDS = float(os.getenv("REPLICA_PIN_SECONDS", "10"))
+
+# Seconds the replica is behind the primary; 0 when it has replayed everything it
+# received, and also when it is not a standby at all (e.g. a second local database)
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def pool_options(url):
+    # Keyword arguments for databases.Database; only the asyncpg backend takes them
+    if DatabaseURL(url).dialect not in ("postgresql", "postgres"):
+        return {}
+    max_size = DB_POOL_MAX_SIZE
+    if DB_MAX_CONNECTIONS:
+        max_size = max(1, min(max_size, DB_MAX_CONNECTIONS // max(1, WEB_CONCURRENCY) - 1))
+    options = {
+        "min_size": min(DB_POOL_MIN_SIZE, max_size),
+        "max_size": max_size,
+        "max_queries": DB_POOL_MAX_QUERIES,
+        "max_inactive_connection_lifetime": DB_POOL_MAX_IDLE_SECONDS,
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+    }
+    if DB_COMMAND_TIMEOUT:
+        options["command_timeout"] = DB_COMMAND_TIMEOUT
+    return options
+
+
+class ReadRouter:
+    def __init__(self, primary, replica=None, max_lag=REPLICA_MAX_LAG, check_interval=REPLICA_CHECK_INTERVAL,
+                 pin_seconds=REPLICA_PIN_SECONDS):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.healthy = False
+        self.lag = None
+        self.failovers = 0
+        self.reads = {"primary": 0, "replica": 0}
+        # user -> True while their reads are pinned to the primary
+        self._pinned = TTLCache(maxsize=100000, ttl=pin_seconds)
+        self._checker = None
+
+    def pin(self, user):
+        if self.replica is not None and user:
+            self._pinned.set(user, True)
+
+    def database_for(self, user=None):
+        # Where a read for user should go
+        if self.replica is None or not self.healthy or (user and self._pinned.get(user)):
+            self.reads["primary"] += 1
+            return self.primary
+        self.reads["replica"] += 1
+        return self.replica
+
+    def is_replica(self, database):
+        return self.replica is not None and database is self.replica
+
+    async def check(self):
+        was_healthy = self.healthy
+        try:
+            if not self.replica.is_connected:
+                await self.replica.connect()
+            self.lag = float(await asyncio.wait_for(self.replica.fetch_val(REPLICA_LAG_QUERY), self.check_interval))
+            self.healthy = self.lag <= self.max_lag
+            reason = f"{self.lag:.1f}s behind"
+        except Exception as e:
+            self.healthy = False
+            self.lag = None
+            reason = f"{type(e).__name__}: {e}"
+        if was_healthy and not self.healthy:
+            self.failovers += 1
+            logger.warning("Read replica unavailable, reading from the primary", extra={"reason": reason})
+        elif self.healthy and not was_healthy:
+            logger.info("Read replica available", extra={"lag_seconds": self.lag})
+
+    async def connect(self):
+        # A replica that is down at startup is retried by the health check
+        if self.replica is None:
+            return
+        await self.check()
+
+        async def loop():
+            while True:
+                await asyncio.sleep(self.check_interval)
+                await self.check()
+
+        self._checker = asyncio.create_task(loop())
+
+    async def disconnect(self):
+        if self._checker is not None:
+            self._checker.cancel()
+            self._checker = None
+        if self.replica is not None and self.replica.is_connected:
+            await self.replica.disconnect()
+
+    def snapshot(self):
+        return {
+            "configured": self.replica is not None,
+            "healthy": self.healthy,
+            "lag": self.lag,
+            "failovers": self.failovers,
+            "reads": dict(self.reads),
+        }
@@ -0,0 +1,210 @@
+# CSV / XLSX export and import
+#
+# Exports read rows through database.iterate, which walks a server-side cursor, and
+# hand them to a StreamingResponse a batch at a time, so memory stays flat however
+# many rows are exported. XLSX uses openpyxl's write-only mode: rows are spooled to a
+# temporary file as they arrive and the finished workbook is streamed from disk.
+# openpyxl is only imported when an XLSX file is first written or read.
+#
+# Imports read the uploaded file IMPORT_BATCH_SIZE rows at a time on a worker
+# thread, validate each chunk against the endpoint's pydantic model and write every
+# valid chunk with one INSERT ... SELECT FROM unnest(column arrays) inside a single
+# transaction. Neither parsing nor compiling a multi-row VALUES (a bind parameter
+# per cell) runs on the event loop, so a large import does not stall other
+# requests. Invalid rows are skipped and reported back with their spreadsheet row
+# number.
+
+import asyncio
+import csv
+import io
+import itertools
+import tempfile
+from decimal import Decimal
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import String, select
+from sqlalchemy.dialects import postgresql
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+# Rows per CSV chunk sent to the client
+EXPORT_BATCH_SIZE = 1000
+# Rows validated and inserted per statement on import
+IMPORT_BATCH_SIZE = 500
+# Row errors returned by one import; the total is always reported
+MAX_IMPORT_ERRORS = 1000
+# Bytes per chunk when streaming a finished XLSX file
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def _cell(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+async def csv_chunks(rows, columns, batch_size=EXPORT_BATCH_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    count = 0
+    async for row in rows:
+        writer.writerow([_cell(row[name]) for name in columns])
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+async def xlsx_chunks(rows, columns, sheet_title):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title[:31])
+    sheet.append(columns)
+    async for row in rows:
+        sheet.append([_cell(row[name]) for name in columns])
+    with tempfile.TemporaryFile() as output:
+        # Zipping the spooled sheet is blocking work
+        await asyncio.to_thread(workbook.save, output)
+        output.seek(0)
+        while True:
+            chunk = output.read(FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def export_response(database, query, columns, export_format, filename, values=None):
+    # query is a SQLAlchemy select or a raw SQL string (with values); columns are the
+    # result column names, in the order they are written
+    rows = database.iterate(query, values)
+    if export_format == "xlsx":
+        body = xlsx_chunks(rows, columns, filename)
+    else:
+        body = csv_chunks(rows, columns)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
+
+
+def read_upload(upload):
+    # Yields (row number, {header: value}) from an uploaded .csv or .xlsx file;
+    # row numbers match what a spreadsheet shows, with the header on row 1
+    filename = (upload.filename or "").lower()
+    if filename.endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        try:
+            workbook = load_workbook(upload.file, read_only=True, data_only=True)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Could not read the XLSX file")
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(name).strip() if name is not None else "" for name in next(rows, [])]
+        for number, values in enumerate(rows, start=2):
+            if any(value not in (None, "") for value in values):
+                yield number, dict(zip(header, values))
+        workbook.close()
+    elif filename.endswith(".csv"):
+        reader = csv.DictReader(io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline=""))
+        for record in reader:
+            if any(value not in (None, "") for value in record.values()):
+                # line_num also counts the blank lines DictReader skips
+                yield reader.line_num, {str(name).strip(): value for name, value in record.items() if name is not None}
+    else:
+        raise HTTPException(status_code=400, detail="Upload a .csv or .xlsx file")
+
+
+def sql_type(column):
+    # TEXT for strings: a cast to VARCHAR(n) would silently cut longer values
+    if isinstance(column.type, String):
+        return "TEXT"
+    return column.type.compile(dialect=postgresql.dialect())
+
+
+async def insert_many(database, table, rows):
+    # rows all have the same keys; the statement is the same size however many
+    names = list(rows[0])
+    query = f"""
+        INSERT INTO {table.name} ({", ".join(f'"{name}"' for name in names)})
+        SELECT * FROM unnest({", ".join(f"CAST(:{name} AS {sql_type(table.c[name])}[])" for name in names)})
+    """
+    await database.execute(query, {name: [row[name] for row in rows] for name in names})
+
+
+def _read_batch(rows, size):
+    return list(itertools.islice(rows, size))
+
+
+def _clean(record):
+    # Blank cells fall back to the model defaults
+    return {name: value for name, value in record.items() if name and value not in (None, "")}
+
+
+def validation_message(exc):
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in exc.errors())
+
+
+async def missing_references(database, rows, foreign_keys):
+    # rows: (position, row) pairs; the ids each foreign_keys field has in rows that
+    # are not in its column
+    missing = {}
+    for field, column in foreign_keys.items():
+        wanted = {row[field] for _, row in rows if row.get(field) is not None}
+        if wanted:
+            found = await database.fetch_all(select([column]).where(column.in_(wanted)))
+            missing[field] = wanted - {row[0] for row in found}
+    return missing
+
+
+async def import_rows(database, upload, model, table, defaults=None, foreign_keys=None,
+                      batch_size=IMPORT_BATCH_SIZE):
+    # foreign_keys maps a model field to the column it must exist in, checked with
+    # one query per chunk instead of failing the whole import on the constraint
+    defaults = defaults or {}
+    foreign_keys = foreign_keys or {}
+    result = {"imported": 0, "error_count": 0, "errors": []}
+
+    def error(number, message):
+        result["error_count"] += 1
+        if len(result["errors"]) < MAX_IMPORT_ERRORS:
+            result["errors"].append({"row": number, "error": message})
+
+    async def write(batch):
+        valid = []
+        for number, record in batch:
+            try:
+                valid.append((number, model(**_clean(record)).dict()))
+            except ValidationError as exc:
+                error(number, validation_message(exc))
+        missing = await missing_references(database, valid, foreign_keys)
+        rows = []
+        for number, row in valid:
+            bad = [field for field, ids in missing.items() if row.get(field) in ids]
+            if bad:
+                error(number, "; ".join(f"{field}: {row[field]} does not exist" for field in bad))
+            else:
+                rows.append({**row, **defaults})
+        if rows:
+            await insert_many(database, table, rows)
+            result["imported"] += len(rows)
+
+    async with database.transaction():
+        rows = read_upload(upload)
+        while True:
+            # The generator is only ever advanced by one thread at a time
+            batch = await asyncio.to_thread(_read_batch, rows, batch_size)
+            if batch:
+                await write(batch)
+            if len(batch) < batch_size:
+                break
+    result["errors"].sort(key=lambda e: e["row"])
+    return result
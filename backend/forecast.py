@@ -0,0 +1,156 @@
+# Project burn-down forecasts
+#
+# A project's burn rate is the hours logged against it per week over the last
+# FORECAST_HISTORY_WEEKS complete weeks (from the project_daily_hours rollup,
+# starting at its first week with any hours). What is left is the estimated
+# hours of its open work items beyond the hours already worked on them
+# (work_items.actual_hours, which logging progress adds to).
+#
+# Weekly burn is treated as independent draws with the history's mean m and
+# standard deviation s, so k weeks burn about k*m +/- z*s*sqrt(k) hours. Solving
+# k*m + z*s*sqrt(k) = remaining for sqrt(k) gives the completion week at each
+# end of the confidence band (z = +/-FORECAST_Z) and remaining / m in the middle.
+#
+# Both queries return one row of arrays per call, whatever the number of
+# projects, and every project is computed at once with NumPy, which is imported
+# on first use.
+
+import os
+from datetime import date, timedelta
+
+FORECAST_HISTORY_WEEKS = int(os.getenv("FORECAST_HISTORY_WEEKS", "12"))
+# z of the confidence band: 1.2816 covers 80% (10th to 90th percentile)
+FORECAST_Z = float(os.getenv("FORECAST_Z", "1.2816"))
+# Completion further out than this is reported as no date
+FORECAST_MAX_WEEKS = 520
+
+# Work item statuses that count as done (as in the project status report)
+COMPLETED_STATUSES = ["completed", "Committed", "Done"]
+
+HISTORY_QUERY = """
+    SELECT
+        COALESCE(array_agg(w.project_id), '{{}}') AS project_ids,
+        COALESCE(array_agg(w.week), '{{}}') AS weeks,
+        COALESCE(array_agg(w.hours_worked), '{{}}') AS hours_worked
+    FROM (
+        SELECT r.project_id, (r.day - CAST(:since AS date)) / 7 AS week, SUM(r.hours_worked) AS hours_worked
+        FROM project_daily_hours r
+        WHERE r.day >= :since AND r.day < :until {project_filter}
+        GROUP BY 1, 2
+    ) w
+"""
+
+REMAINING_QUERY = """
+    SELECT
+        p.id AS project_id,
+        p.name,
+        p.status,
+        p.end_date,
+        COUNT(wi.id) AS total_items,
+        COUNT(wi.id) FILTER (WHERE wi.status IS NULL OR wi.status <> ALL(:completed)) AS open_items,
+        COALESCE(SUM(wi.estimated_hours), 0) AS estimated_hours,
+        COALESCE(SUM(GREATEST(COALESCE(wi.estimated_hours, 0) - COALESCE(wi.actual_hours, 0), 0))
+            FILTER (WHERE wi.status IS NULL OR wi.status <> ALL(:completed)), 0) AS remaining_hours
+    FROM projects p
+    LEFT JOIN work_items wi ON wi.project_id = p.id
+    WHERE 1=1 {project_filter}
+    GROUP BY p.id
+    ORDER BY p.id
+"""
+
+
+def history_window(today):
+    # The FORECAST_HISTORY_WEEKS complete weeks (Monday to Sunday) before this one
+    until = today - timedelta(days=today.weekday())
+    return until - timedelta(weeks=FORECAST_HISTORY_WEEKS), until
+
+
+async def project_forecasts(database, project_ids=None, today=None, include_history=False):
+    # Forecasts for project_ids (None: every project), ordered by project id
+    import numpy as np
+
+    today = today or date.today()
+    since, until = history_window(today)
+    params = {"since": since, "until": until}
+    project_filter = ""
+    if project_ids is not None:
+        project_filter = " AND {column} = ANY(:project_ids)"
+        params["project_ids"] = list(project_ids)
+    history = await database.fetch_one(
+        HISTORY_QUERY.format(project_filter=project_filter.format(column="r.project_id")), params
+    )
+    remaining_params = {"completed": COMPLETED_STATUSES}
+    if project_ids is not None:
+        remaining_params["project_ids"] = params["project_ids"]
+    projects = await database.fetch_all(
+        REMAINING_QUERY.format(project_filter=project_filter.format(column="p.id")), remaining_params
+    )
+    if not projects:
+        return []
+
+    # Weekly hours, one row per project
+    ids = np.array([row["project_id"] for row in projects])
+    weekly = np.zeros((len(ids), FORECAST_HISTORY_WEEKS))
+    history_ids = np.array(history["project_ids"], dtype=np.int64)
+    if len(history_ids):
+        rows = np.searchsorted(ids, history_ids)
+        known = (rows < len(ids)) & (ids[np.minimum(rows, len(ids) - 1)] == history_ids)
+        np.add.at(weekly, (rows[known], np.array(history["weeks"])[known]), np.array(history["hours_worked"], dtype=float)[known])
+
+    # Each project's history starts at its first week with hours
+    active = weekly > 0
+    first = np.where(active.any(axis=1), active.argmax(axis=1), FORECAST_HISTORY_WEEKS)
+    counted = np.arange(FORECAST_HISTORY_WEEKS) >= first[:, None]
+    weeks = counted.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(weeks > 0, (weekly * counted).sum(axis=1) / weeks, 0.0)
+        deviation = np.where(counted, weekly - mean[:, None], 0.0)
+        std = np.where(weeks > 1, np.sqrt((deviation ** 2).sum(axis=1) / (weeks - 1)), 0.0)
+
+        remaining = np.array([row["remaining_hours"] for row in projects], dtype=float)
+        root = np.sqrt((FORECAST_Z * std) ** 2 + 4 * mean * remaining)
+        expected = remaining / mean
+        early = ((root - FORECAST_Z * std) / (2 * mean)) ** 2
+        late = ((root + FORECAST_Z * std) / (2 * mean)) ** 2
+    done = remaining <= 0
+
+    def completion_dates(completion_weeks):
+        # today plus the weeks, rounded up to whole days; None when there is no burn
+        # to extrapolate or it lands beyond FORECAST_MAX_WEEKS
+        completion_weeks = np.where(done, 0.0, completion_weeks)
+        valid = done | ((mean > 0) & (completion_weeks <= FORECAST_MAX_WEEKS))
+        days = np.ceil(np.where(valid, completion_weeks, 0.0) * 7).astype(np.int64)
+        dates = (np.datetime64(today, "D") + days).tolist()
+        return [value if ok else None for value, ok in zip(dates, valid.tolist())]
+
+    expected_dates = completion_dates(expected)
+    early_dates = completion_dates(early)
+    late_dates = completion_dates(late)
+
+    forecasts = []
+    for i, row in enumerate(projects):
+        forecast = {
+            "project_id": row["project_id"],
+            "name": row["name"],
+            "status": row["status"],
+            "end_date": row["end_date"],
+            "total_items": row["total_items"],
+            "open_items": row["open_items"],
+            "estimated_hours": row["estimated_hours"],
+            "remaining_hours": row["remaining_hours"],
+            "history_weeks": int(weeks[i]),
+            "burn_rate": round(float(mean[i]), 2),
+            "burn_rate_stddev": round(float(std[i]), 2),
+            "forecast_date": expected_dates[i],
+            "forecast_date_early": early_dates[i],
+            "forecast_date_late": late_dates[i],
+            # Whether the expected date is on or before the project's end date
+            "on_track": None if row["end_date"] is None or expected_dates[i] is None else expected_dates[i] <= row["end_date"],
+        }
+        if include_history:
+            forecast["weekly_hours"] = [
+                {"week": since + timedelta(weeks=week), "hours_worked": float(weekly[i, week])}
+                for week in range(FORECAST_HISTORY_WEEKS)
+            ]
+        forecasts.append(forecast)
+    return forecasts
@@ -0,0 +1,44 @@
+# Production server: gunicorn running uvicorn workers
+#
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# The app is imported once by the master (preload_app) and the workers are forked
+# from it, so they start without importing FastAPI again and share its memory
+# until they write to it. Each worker opens its own database pools, change feed
+# listener and password pool when it starts (main.startup).
+#
+# WEB_CONCURRENCY sets the number of workers (default: one per core). With
+# DB_MAX_CONNECTIONS set, each worker's pool gets an equal share of it (see db.py).
+
+import asyncio
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+preload_app = True
+# Seconds a worker may go silent before it is restarted, and to finish requests on shutdown
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+accesslog = None
+
+# Read by the app as it is preloaded below
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# bcrypt processes per worker, so a login storm uses the cores once, not once per worker
+os.environ.setdefault("PASSWORD_WORKERS", str(max(1, (os.cpu_count() or 1) // workers)))
+# Interrupted sync jobs are failed once, in on_starting, instead of by every worker
+os.environ["RECOVER_JOBS_ON_STARTUP"] = "0"
+
+
+def on_starting(server):
+    import databases
+
+    import job_runner
+    import main
+
+    async def recover():
+        async with databases.Database(main.DATABASE_URL) as database:
+            await job_runner.recover(database, main.sync_jobs)
+
+    asyncio.run(recover())
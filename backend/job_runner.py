@@ -0,0 +1,239 @@
+# In-process background runner for Azure DevOps syncs
+#
+# A sync is recorded as a row in the sync_jobs table and executed on an asyncio task, so the
+# HTTP request returns straight away with the job id. A partial unique index on
+# (config_id, client_user_id) for queued/running rows makes a second request for
+# the same sync join the existing job instead of starting another one, and a
+# per-config advisory lock keeps syncs of one Azure DevOps config from running
+# concurrently, across every worker process. A running job writes its phase and
+# item counts to its row every SYNC_PROGRESS_SECONDS, so any worker can report it.
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+# Seconds between progress writes of a running job, and between tries for the
+# config lock while another job holds it
+SYNC_PROGRESS_SECONDS = float(os.getenv("SYNC_PROGRESS_SECONDS", "2"))
+
+# job id -> JobProgress for jobs running in this process
+_live = {}
+_tasks = set()
+_scheduler = None
+
+# Totals for jobs run by this process, for /metrics
+stats = {"completed": 0, "failed": 0, "synced": 0, "skipped": 0}
+
+
+class JobProgress:
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.phase = "queued"
+        self.items_total = 0
+        self.items_processed = 0
+        self.started = None
+        # Changed since last written to the job row
+        self.dirty = False
+
+    def update(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.dirty = True
+
+    def values(self):
+        return {
+            "phase": self.phase,
+            "items_total": self.items_total,
+            "items_processed": self.items_processed,
+            "throughput": self.throughput(),
+        }
+
+    def throughput(self):
+        if not self.started:
+            return 0.0
+        elapsed = time.perf_counter() - self.started
+        return round(self.items_processed / elapsed, 2) if elapsed > 0 else 0.0
+
+
+def _job_response(row, joined=False):
+    job = dict(row)
+    job["timings"] = json.loads(job["timings"]) if job.get("timings") else None
+    # Running here: fresher than the last write to the row
+    progress = _live.get(job["id"])
+    if progress is not None:
+        job.update(progress.values())
+    job["joined"] = joined
+    return job
+
+
+async def submit(database, jobs_table, config_id, client_user_id, requested_by, full_resync, run):
+    # run(progress) is awaited on a background task and returns the ado_sync result
+    query = pg_insert(jobs_table).values(
+        config_id=config_id,
+        client_user_id=client_user_id,
+        requested_by=requested_by,
+        full_resync=full_resync,
+        status="queued",
+        phase="queued",
+        items_total=0,
+        items_processed=0,
+        created_at=datetime.utcnow(),
+    ).on_conflict_do_nothing(
+        index_elements=[jobs_table.c.config_id, jobs_table.c.client_user_id],
+        # Must match the predicate of idx_sync_jobs_active
+        index_where=text("status IN ('queued', 'running')"),
+    )
+    job_id = await database.execute(query)
+
+    if job_id is None:
+        existing = jobs_table.select().where(
+            (jobs_table.c.config_id == config_id)
+            & (jobs_table.c.client_user_id == client_user_id)
+            & jobs_table.c.status.in_(ACTIVE_STATUSES)
+        )
+        row = await database.fetch_one(existing)
+        if row is not None:
+            return _job_response(row, joined=True)
+        # The active job finished between the insert and the lookup
+        return await submit(database, jobs_table, config_id, client_user_id, requested_by, full_resync, run)
+
+    progress = JobProgress(job_id)
+    _live[job_id] = progress
+    task = asyncio.create_task(_run(database, jobs_table, config_id, progress, run))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return await get_job(database, jobs_table, job_id)
+
+
+async def _try_lock(database, config_id):
+    # Session lock: taken and released on the connection the job task holds
+    return await database.fetch_val(
+        "SELECT pg_try_advisory_lock(hashtext('ado_sync'), :config_id)", {"config_id": config_id}
+    )
+
+
+async def _unlock(database, config_id):
+    await database.fetch_val(
+        "SELECT pg_advisory_unlock(hashtext('ado_sync'), :config_id)", {"config_id": config_id}
+    )
+
+
+async def _write_progress(database, job, progress):
+    # Writes the job's progress to its row while it runs, when it changed
+    while True:
+        await asyncio.sleep(SYNC_PROGRESS_SECONDS)
+        if progress.dirty:
+            progress.dirty = False
+            try:
+                await database.execute(job.values(**progress.values()))
+            except Exception:
+                logger.exception("Writing progress of sync job %s failed", progress.job_id)
+
+
+async def _run(database, jobs_table, config_id, progress, run):
+    job = jobs_table.update().where(jobs_table.c.id == progress.job_id)
+    try:
+        while True:
+            # A connection for each try, kept only once the lock is taken: the lock
+            # lives on it, and is released on it. Queued jobs hold none while waiting
+            async with database.connection():
+                if await _try_lock(database, config_id):
+                    try:
+                        await _execute(database, job, progress, run)
+                    finally:
+                        await _unlock(database, config_id)
+                    return
+            # Another worker's job on this config holds the lock; stay queued until it ends
+            await asyncio.sleep(SYNC_PROGRESS_SECONDS)
+    finally:
+        _live.pop(progress.job_id, None)
+
+
+async def _execute(database, job, progress, run):
+    progress.started = time.perf_counter()
+    await database.execute(job.values(status="running", started_at=datetime.utcnow()))
+    # Its own task, so its own connection: writes commit while the sync's
+    # transaction is still open
+    writer = asyncio.create_task(_write_progress(database, job, progress))
+    try:
+        result = await run(progress)
+        values = {
+            "status": "completed",
+            "phase": "done",
+            "synced_count": result["synced_count"],
+            "skipped_count": result["skipped_count"],
+            "timings": json.dumps(result["timings"]),
+        }
+        stats["completed"] += 1
+        stats["synced"] += result["synced_count"]
+        stats["skipped"] += result["skipped_count"]
+    except Exception as e:
+        logger.exception("Azure DevOps sync job %s failed", progress.job_id)
+        values = {"status": "failed", "phase": progress.phase, "error": str(e)}
+        stats["failed"] += 1
+    finally:
+        writer.cancel()
+        await asyncio.gather(writer, return_exceptions=True)
+        _live.pop(progress.job_id, None)
+    values.update(
+        items_total=progress.items_total,
+        items_processed=progress.items_processed,
+        throughput=progress.throughput(),
+        finished_at=datetime.utcnow(),
+    )
+    await database.execute(job.values(**values))
+
+
+async def get_job(database, jobs_table, job_id):
+    row = await database.fetch_one(jobs_table.select().where(jobs_table.c.id == job_id))
+    if row is None:
+        return None
+    return _job_response(row)
+
+
+def snapshot():
+    return {**stats, "running": len(_live)}
+
+
+async def recover(database, jobs_table):
+    # Jobs left active by a previous process will never finish; release them
+    await database.execute(
+        jobs_table.update()
+        .where(jobs_table.c.status.in_(ACTIVE_STATUSES))
+        .values(status="failed", error="Interrupted by server restart", finished_at=datetime.utcnow())
+    )
+
+
+def start_scheduler(interval_minutes, enqueue_all):
+    # enqueue_all() is awaited every interval_minutes to keep boards fresh
+    global _scheduler
+
+    async def loop():
+        while True:
+            await asyncio.sleep(interval_minutes * 60)
+            try:
+                await enqueue_all()
+            except Exception:
+                logger.exception("Scheduled Azure DevOps sync failed to enqueue")
+
+    if interval_minutes > 0 and _scheduler is None:
+        _scheduler = asyncio.create_task(loop())
+
+
+async def shutdown():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.cancel()
+        _scheduler = None
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
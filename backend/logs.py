@@ -0,0 +1,78 @@
+# Structured, non-blocking logging
+#
+# Records go onto a queue through a QueueHandler and a QueueListener thread writes
+# them to stderr, so a request never waits on the stream. LOG_FORMAT=json (the
+# default) writes one JSON object per line, including any extra={...} fields;
+# LOG_FORMAT=text is easier to read locally. LOG_LEVEL sets the root level.
+
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+# Attributes every LogRecord has; anything else was passed as extra
+# (color_message is uvicorn's ANSI-coloured copy of the message)
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName", "color_message"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _STANDARD_ATTRS:
+                entry[name] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() folds the traceback into the message; keep it apart
+    # (as text, tracebacks do not cross threads well) for the JSON "exception" field
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup():
+    # Idempotent; called on startup
+    global _listener
+    if _listener is not None:
+        return
+    stream = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [_QueueHandler(records)]
+    root.setLevel(LOG_LEVEL)
+    _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown():
+    # Flushes what is still queued
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
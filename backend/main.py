@@ -1,22 +1,46 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, File, Header, Query, Request, Response, UploadFile, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
-from datetime import datetime, date
-import databases
+from pydantic import BaseModel, EmailStr, Field
+from typing import List, Literal, NamedTuple, Optional
+from datetime import datetime, date, timedelta
 import sqlalchemy
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, Float, DateTime, Date, Text, Boolean, and_ , or_ 
+from sqlalchemy import create_engine, MetaData, Table, Column, BigInteger, Integer, String, Float, DateTime, Date, Text, Boolean, and_ , or_ 
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 import os
-from passlib.context import CryptContext
 import jwt
-from azure.devops.connection import Connection
-from msrest.authentication import BasicAuthentication
 import asyncio
+import hashlib
+from decimal import Decimal
+from urllib.parse import urlencode
+import orjson
+import ado_sync
+import changes
+import db
+import forecast
+import job_runner
+import logs
+import metrics
+import partitions
+import passwords
+import ranks
+from cache import ResponseCache, TTLCache, VersionCounters
+from exports import export_response, import_rows
+from search import SEARCH_KINDS, search
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, fetch_page
+from projection import list_columns, project
+from batch import MAX_BATCH_OPERATIONS, apply_batch
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "postgres://avnadmin:<password>@pglearn-ameerdeen-b188.i.aivencloud.com:18706/defaultdb?sslmode=require")
-database = databases.Database(DATABASE_URL)
+database = metrics.InstrumentedDatabase(DATABASE_URL, **db.pool_options(DATABASE_URL))
+# Optional read replica for list, report, search and export reads (see db.py)
+read_database = None
+if db.READ_DATABASE_URL:
+    read_database = metrics.InstrumentedDatabase(db.READ_DATABASE_URL, name="replica", **db.pool_options(db.READ_DATABASE_URL))
+read_router = db.ReadRouter(database, read_database)
 metadata = MetaData()
 
 # JWT Configuration
@@ -24,8 +48,19 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Minutes between automatic Azure DevOps syncs (0 disables the scheduler)
+ADO_SYNC_INTERVAL_MINUTES = float(os.getenv("ADO_SYNC_INTERVAL_MINUTES", "0"))
+# Fail sync jobs left queued or running by a previous server on startup. Under
+# gunicorn (gunicorn.conf.py) the master does it once, before forking: a worker
+# doing it would fail jobs its siblings had already started.
+RECOVER_JOBS_ON_STARTUP = os.getenv("RECOVER_JOBS_ON_STARTUP", "1") == "1"
+
 security = HTTPBearer()
+# GET /api/changes also takes a ticket, as EventSource cannot send headers
+optional_security = HTTPBearer(auto_error=False)
+# Seconds a change feed ticket (POST /api/changes/ticket) can be used to connect
+CHANGE_TICKET_SECONDS = 60
+CHANGE_TICKET_AUDIENCE = "changes"
 
 # Tables
 users = Table(
@@ -71,27 +106,35 @@ work_items = Table(
     Column("priority", String(50)),
     Column("status", String(50)),
     Column("assigned_to", String(255)),
+    # lower(assigned_to), generated by the database
+    Column("assignee_key", String(255), sqlalchemy.Computed("lower(assigned_to)")),
     Column("start_date", Date),
     Column("end_date", Date),
     Column("estimated_hours", Float),
     Column("actual_hours", Float),
     Column("t_shirt_size", String(10)),
-    Column("ado_id", String(100)),
-    Column("created_at", DateTime, default=datetime.utcnow),
-    Column("updated_at", DateTime, default=datetime.utcnow),
+    Column("ado_id", String(100), unique=True),
+    Column("ado_rev", Integer),
+    # Set by the database: the databases driver does not run Python-side defaults,
+    # so default=datetime.utcnow would insert NULL
+    Column("created_at", DateTime, server_default=sqlalchemy.text("CURRENT_TIMESTAMP")),
+    Column("updated_at", DateTime, nullable=False, server_default=sqlalchemy.text("CURRENT_TIMESTAMP")),
 )
 
 backlogs = Table(
     "backlogs",
     metadata,
     Column("id", Integer, primary_key=True),
-    Column("project_id", Integer),
+    # Never NULL: part of the backlog order across projects
+    Column("project_id", Integer, nullable=False),
     Column("title", String(500), nullable=False),
     Column("description", Text),
     Column("priority", Integer),
     Column("status", String(50)),
     Column("created_by", String(255)),
     Column("created_at", DateTime, default=datetime.utcnow),
+    # Order within the project; new items are ranked last by the database (see ranks.py)
+    Column("rank", Text),
 )
 
 task_progress = Table(
@@ -118,6 +161,55 @@ azure_config = Table(
     Column("created_at", DateTime, default=datetime.utcnow),
 )
 
+# Last successful Azure DevOps sync per config and client user
+azure_sync_state = Table(
+    "azure_sync_state",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("config_id", Integer, nullable=False),
+    Column("client_user_id", String(255), nullable=False),
+    Column("watermark", DateTime),
+    Column("last_synced_at", DateTime),
+)
+
+# Background Azure DevOps sync jobs (see job_runner.py)
+sync_jobs = Table(
+    "sync_jobs",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("config_id", Integer, nullable=False),
+    Column("client_user_id", String(255), nullable=False),
+    Column("requested_by", String(255)),
+    Column("full_resync", Boolean, default=False),
+    Column("status", String(20)),
+    Column("phase", String(20)),
+    Column("items_total", Integer),
+    Column("items_processed", Integer),
+    Column("synced_count", Integer),
+    Column("skipped_count", Integer),
+    Column("throughput", Float),
+    Column("timings", Text),
+    Column("error", Text),
+    Column("created_at", DateTime, default=datetime.utcnow),
+    Column("started_at", DateTime),
+    Column("finished_at", DateTime),
+)
+
+# Live change feed behind GET /api/changes (see changes.py)
+change_events = Table(
+    "change_events",
+    metadata,
+    Column("id", BigInteger, primary_key=True),
+    Column("resource", String(50), nullable=False),
+    Column("action", String(20), nullable=False),
+    Column("item_id", Integer),
+    Column("scope_keys", ARRAY(Text)),
+    Column("data", Text),
+    # Set by the database, so pruning and replay compare times from one clock
+    Column("created_at", DateTime),
+)
+change_feed = changes.ChangeFeed(database, change_events, on_change=lambda resource: apply_remote_change(resource))
+
 # Pydantic Models
 class UserLogin(BaseModel):
     email: EmailStr
@@ -149,6 +241,31 @@ class WorkItemCreate(BaseModel):
     estimated_hours: Optional[float] = None
     t_shirt_size: Optional[str] = None
 
+class WorkItemUpdate(BaseModel):
+    # WorkItemCreate with every field optional, for batch operations; an update
+    # changes only the fields sent
+    project_id: Optional[int] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    type: Optional[str] = None
+    priority: Optional[str] = None
+    status: Optional[str] = None
+    assigned_to: Optional[str] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    estimated_hours: Optional[float] = None
+    t_shirt_size: Optional[str] = None
+
+class WorkItemOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    data: WorkItemUpdate = Field(default_factory=WorkItemUpdate)
+
+class WorkItemBatch(BaseModel):
+    operations: List[WorkItemOperation] = Field(..., min_length=1, max_length=MAX_BATCH_OPERATIONS)
+    # All or nothing: with a failed operation none are applied
+    atomic: bool = False
+
 class BacklogCreate(BaseModel):
     project_id: int
     title: str
@@ -156,6 +273,28 @@ class BacklogCreate(BaseModel):
     priority: int = 0
     status: str = "new"
 
+class BacklogUpdate(BaseModel):
+    # BacklogCreate with every field optional, as WorkItemUpdate
+    project_id: Optional[int] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    priority: Optional[int] = None
+    status: Optional[str] = None
+
+class BacklogMove(BaseModel):
+    # Exactly one: the item goes just before or just after this sibling
+    before: Optional[int] = None
+    after: Optional[int] = None
+
+class BacklogOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    data: BacklogUpdate = Field(default_factory=BacklogUpdate)
+
+class BacklogBatch(BaseModel):
+    operations: List[BacklogOperation] = Field(..., min_length=1, max_length=MAX_BATCH_OPERATIONS)
+    atomic: bool = False
+
 class TaskProgressCreate(BaseModel):
     work_item_id: int
     hours_worked: float
@@ -163,13 +302,21 @@ class TaskProgressCreate(BaseModel):
     notes: Optional[str] = None
     date: date
 
+class TimesheetCreate(BaseModel):
+    # A whole timesheet (many work items and days) applied in one call
+    entries: List[TaskProgressCreate] = Field(..., min_length=1, max_length=1000)
+
+class ClientMappingUpdate(BaseModel):
+    client_user_id: str
+    active: bool = True
+
 class AzureConfigCreate(BaseModel):
     organization_url: str
     project_name: str
     personal_access_token: str
 
 # FastAPI App
-app = FastAPI(title="Developer Utilization API", version="1.0.0")
+app = FastAPI(title="Developer Utilization API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # CORS
 app.add_middleware(
@@ -180,78 +327,247 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency, status and per-request query metrics (see metrics.py)
+app.add_middleware(metrics.MetricsMiddleware)
+
 @app.on_event("startup")
 async def startup():
+    logs.setup()
     await database.connect()
+    await read_router.connect()
+    if RECOVER_JOBS_ON_STARTUP:
+        await job_runner.recover(database, sync_jobs)
+    job_runner.start_scheduler(ADO_SYNC_INTERVAL_MINUTES, enqueue_scheduled_syncs)
+    await change_feed.start()
+    partitions.start(database, task_progress_archived)
+    ranks.start(database, backlogs, backlogs_rebalanced)
 
 @app.on_event("shutdown")
 async def shutdown():
+    await job_runner.shutdown()
+    await partitions.stop()
+    await ranks.stop()
+    await change_feed.stop()
+    await read_router.disconnect()
     await database.disconnect()
+    ado_sync.shutdown()
+    passwords.shutdown()
+    logs.shutdown()
 
 # Authentication helpers
-def verify_password(plain_password, hashed_password):
-    print(pwd_context.hash(plain_password))
-    return pwd_context.verify(plain_password, hashed_password)
+# bcrypt runs on a process pool (see passwords.py)
+async def verify_password(plain_password, hashed_password):
+    return await passwords.verify_password(plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await passwords.hash_password(password)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        print("from get_current_user : ", email)
-        return email
-    except jwt.PyJWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+class Identity(NamedTuple):
+    user_id: int
+    email: str
+    name: Optional[str]
+    role: Optional[str]
+    client_user_id: str
+
+# email (token subject) -> Identity; entries expire so role/mapping edits made
+# directly in the database are picked up within IDENTITY_CACHE_TTL seconds
+identity_cache = TTLCache(
+    maxsize=int(os.getenv("IDENTITY_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("IDENTITY_CACHE_TTL", "60")),
+)
+
+async def load_identity(email: str):
+    # User, role and active client mapping in one round trip
+    query = sqlalchemy.select([
+        users.c.id, users.c.email, users.c.name, users.c.role, user_client_map.c.client_user_id
+    ]).select_from(
+        users.outerjoin(user_client_map, and_(user_client_map.c.user_id == users.c.id, user_client_map.c.active == True))
+    ).where(users.c.email == email).order_by(user_client_map.c.id).limit(1)
+    row = await database.fetch_one(query)
+    if not row:
+        return None
+    return Identity(row["id"], row["email"], row["name"], row["role"], row["client_user_id"] or "")
+
+def invalidate_identity(email: str):
+    identity_cache.pop(email)
 
-async def get_current_role(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def identity_from_token(token: str, audience: Optional[str] = None):
+    # Tokens with an audience (change feed tickets) are only accepted where it is expected
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        role: str = payload.get("role")
-        if role is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        print("from get_current_role : ", role)
-        return get_current_role
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], audience=audience)
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
-        
-async def get_client_user_id(current_user: str = Depends(get_current_user)):
-    #fetching user and client mapping details starts ------
-    print("current_user : ",current_user)
-    print("Fetching login user details")
-    query = users.select().where(users.c.email == current_user)
-    db_user = await database.fetch_one(query)
-    print(query) 
-    email = db_user["email"]
-    role = db_user["role"]
-    userid  = db_user["id"]    
-    print("Fetching user client mapping  details for " ,userid )
-    query_user_client = user_client_map.select().where(user_client_map.c.user_id == userid)
-    print(query_user_client)
-    db_user_client  = await database.fetch_one(query_user_client)
-    if not db_user_client:
-        client_id_user_mapping = ""
+    email: str = payload.get("sub")
+    if email is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    identity = identity_cache.get(email)
+    if identity is None:
+        identity = await load_identity(email)
+        if identity is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        identity_cache.set(email, identity)
+    return identity
+
+async def get_identity(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # FastAPI caches this per request, so the token is decoded once however many
+    # of the dependencies below an endpoint uses
+    identity = await identity_from_token(credentials.credentials)
+    request.state.identity = identity
+    if request.method not in ("GET", "HEAD"):
+        # Their next reads must see this write, so keep them off the replica
+        read_router.pin(identity.email)
+    return identity
+
+async def get_current_user(identity: Identity = Depends(get_identity)):
+    return identity.email
+
+async def get_current_role(identity: Identity = Depends(get_identity)):
+    return identity.role
+
+async def get_client_user_id(identity: Identity = Depends(get_identity)):
+    return identity.client_user_id
+
+# Read endpoints cache their encoded JSON keyed by path, query string, the user
+# scope the result depends on and the versions of the resources it reads. Writes
+# bump those versions, so a cached response is served until the data changes, and
+# its strong ETag lets clients revalidate with If-None-Match for a 304.
+# The versions are per process: other workers' writes arrive through the change
+# feed (see apply_remote_change), and RESPONSE_CACHE_TTL bounds how long they can go
+# unseen without it.
+response_cache = ResponseCache(
+    maxbytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+)
+data_versions = VersionCounters()
+
+def apply_remote_change(resource):
+    # Called for every change event, including this process's own; None when
+    # events may have been missed
+    if resource is None:
+        data_versions.bump_all()
+    else:
+        data_versions.bump(resource)
+    if resource in (None, "users"):
+        identity_cache.clear()
+
+async def task_progress_archived(months):
+    # Archived entries are gone from task progress lists and exports; every
+    # process drops its cached ones through the change feed
+    await change_feed.publish([changes.reload("task_progress")])
+
+async def backlogs_rebalanced(project_ids):
+    # Every item of the projects has a new rank
+    await change_feed.publish([changes.reload("backlogs")])
+
+def etag_matches(if_none_match: Optional[str], etag: str):
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or "W/" + etag in candidates
+
+def reader(request: Request):
+    # Database for a read-only endpoint: the replica when it is healthy and the
+    # caller has not just written (see db.py), otherwise the primary
+    identity = getattr(request.state, "identity", None)
+    return read_router.database_for(identity.email if identity else None)
+
+async def cached_json(request: Request, resources: List[str], scope, compute):
+    # scope: what the result depends on besides the URL (None when shared by all users)
+    # compute: coroutine function taking the database to read and producing the
+    # response data on a miss, or the JSON body itself as bytes (see fetch_json)
+    query_string = urlencode(sorted(request.query_params.multi_items()))
+    key = (request.url.path, query_string, scope, data_versions.snapshot(resources))
+    cached = response_cache.get(key)
+    if cached is None:
+        source = reader(request)
+        data = await compute(source)
+        if isinstance(data, bytes):
+            body = data
+        else:
+            body = orjson.dumps(data, default=encode_json, option=orjson.OPT_NON_STR_KEYS)
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        ttl = None
+        if read_router.is_replica(source) and data_versions.changed_within(resources, read_router.max_lag):
+            # The replica may not have the latest write yet; keep this entry only
+            # as long as that can be true
+            ttl = read_router.max_lag
+        response_cache.set(key, etag, body, ttl)
     else:
-        client_id_user_mapping = db_user_client["client_user_id"]
-    print(client_id_user_mapping)
-    print(email)
-    return client_id_user_mapping
-    #fetching user and client mapping details ends ------
+        etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+def encode_json(value):
+    # What orjson cannot encode itself: database records straight to dicts, the
+    # rest as FastAPI would
+    if hasattr(value, "_mapping"):
+        return dict(value._mapping)
+    if isinstance(value, Decimal):
+        return float(value)
+    return jsonable_encoder(value)
+
+async def fetch_json(db, query, params=None):
+    # The rows of query as a JSON array rendered by Postgres, for results of tens of
+    # thousands of rows where encoding each Record in Python takes longer than the query
+    body = await db.fetch_val("SELECT COALESCE(json_agg(t), '[]') FROM ({query}) t".format(query=query), params)
+    return body.encode()
 
 # Routes
 @app.get("/")
 async def root():
     return {"message": "Developer Utilization API", "version": "1.0.0"}
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    # Prometheus text format; not routed through the frontend's /api proxy
+    pools = {"primary": database.pool_stats()}
+    if read_database is not None:
+        pools["replica"] = read_database.pool_stats()
+    replica = read_router.snapshot()
+    responses = response_cache.stats()
+    identities = identity_cache.stats()
+    hashing = passwords.snapshot()
+    jobs = job_runner.snapshot()
+    feed = change_feed.snapshot()
+    lines = []
+    lines += metrics.gauge("db_pool_connections", "Database pool connections by state",
+                           {(("database", target), ("state", name)): value
+                            for target, pool in pools.items() for name, value in pool.items()})
+    lines += metrics.counter("db_reads_total", "Read endpoint requests by the database they were routed to",
+                             {(("database", target),): count for target, count in replica["reads"].items()})
+    if replica["configured"]:
+        lines += metrics.gauge("replica_healthy", "1 while reads may go to the replica", int(replica["healthy"]))
+        lines += metrics.gauge("replica_lag_seconds", "Replication lag at the last health check", replica["lag"] or 0)
+        lines += metrics.counter("replica_failovers_total", "Times reads fell back to the primary", replica["failovers"])
+    lines += metrics.gauge("response_cache_entries", "Cached responses", responses["entries"])
+    lines += metrics.gauge("response_cache_bytes", "Bytes held by cached responses", responses["bytes"])
+    lines += metrics.counter("response_cache_events_total", "Response cache hits, misses and evictions",
+                             {(("event", name),): responses[name] for name in ("hits", "misses", "evictions")})
+    lines += metrics.gauge("identity_cache_entries", "Cached identities", identities["size"])
+    lines += metrics.counter("identity_cache_events_total", "Identity cache hits and misses",
+                             {(("event", name),): identities[name] for name in ("hits", "misses")})
+    lines += metrics.gauge("password_operations", "Password hashing operations in flight, by state",
+                           {(("state", name),): hashing[name] for name in ("running", "waiting")})
+    lines += metrics.counter("password_operations_total", "Finished password hashing operations, by outcome",
+                             {(("outcome", name),): hashing[name] for name in ("completed", "rejected")})
+    lines += metrics.counter("password_wait_seconds_total", "Time password operations spent queued", hashing["wait_seconds"])
+    lines += metrics.gauge("sync_jobs_running", "Azure DevOps sync jobs running in this process", jobs["running"])
+    lines += metrics.counter("sync_jobs_total", "Finished Azure DevOps sync jobs, by status",
+                             {(("status", name),): jobs[name] for name in ("completed", "failed")})
+    lines += metrics.counter("sync_items_total", "Work items read from Azure DevOps, by outcome",
+                             {(("outcome", name),): jobs[name] for name in ("synced", "skipped")})
+    lines += metrics.gauge("change_feed_subscribers", "Clients connected to /api/changes", feed["subscribers"])
+    lines += metrics.counter("change_events_total", "Change events published and dispatched by this process",
+                             {(("event", name),): feed[name] for name in ("published", "dispatched")})
+    lines += metrics.counter("change_feed_resets_total", "Times a client was told to reload everything", feed["resets"])
+    return Response(metrics.render(lines), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/auth/register")
 async def register(user: UserCreate):
     query = users.select().where(users.c.email == user.email)
@@ -259,24 +575,28 @@ async def register(user: UserCreate):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     query = users.insert().values(
         email=user.email,
         name=user.name,
         password_hash=hashed_password,
         role=user.role
     )
-    await database.execute(query)
+    async with database.transaction():
+        user_id = await database.execute(query)
+        # Work items already assigned to the email (e.g. from an ADO sync) count for them
+        await database.execute("SELECT rebuild_user_daily_utilization(:user_id)", {"user_id": user_id})
+        # Tells other workers to drop cached user lists and reports
+        await change_feed.publish([changes.reload("users", ["role:admin"])])
+    invalidate_identity(user.email)
+    data_versions.bump("users")
     return {"message": "User registered successfully"}
 
 @app.post("/api/auth/login")
 async def login(user: UserLogin):
     query = users.select().where(users.c.email == user.email)
     db_user = await database.fetch_one(query)
-    print(query)
-    print(user.password)
-    print(db_user["password_hash"])
-    if not db_user or not verify_password(user.password, db_user["password_hash"]):
+    if not db_user or not await verify_password(user.password, db_user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     access_token = create_access_token(data={"sub": db_user["email"], "role": db_user["role"]})
@@ -290,38 +610,72 @@ async def login(user: UserLogin):
         }
     }
 
-@app.get("/api/projects")
-async def get_projects(current_user: str = Depends(get_current_user),current_role: str = Depends(get_current_role),client_id_user_mapping: str =Depends(get_client_user_id)):
-    #No projects 
-    no_default_project = {
-                    "id": "0",
-                    "name": "No Default Project",
-                    "description": "No Default Project",
-                    "start_date": "",
-                    "end_date": "",
-                    "status": "",
-                    "created_at": "",                  
-                }                 
-    #result = []
+@app.put("/api/users/{user_id}/client-mapping")
+async def update_client_mapping(user_id: int, mapping: ClientMappingUpdate, current_role: str = Depends(get_current_role)):
+    if current_role != "admin":
+        raise HTTPException(status_code=401, detail="You are not authorised to change client mappings")
+    db_user = await database.fetch_one(users.select().where(users.c.id == user_id))
+    if not db_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    async with database.transaction():
+        query = user_client_map.update().where(user_client_map.c.user_id == user_id).values(**mapping.dict()).returning(user_client_map.c.id)
+        updated = await database.fetch_one(query)
+        if not updated:
+            # user_client_id_map.id has no sequence
+            next_id = sqlalchemy.select([sqlalchemy.func.coalesce(sqlalchemy.func.max(user_client_map.c.id), 0) + 1]).scalar_subquery()
+            query = user_client_map.insert().values(id=next_id, user_id=user_id, **mapping.dict())
+            await database.execute(query)
+        # Work items assigned to the old/new client id move between users
+        await database.execute("SELECT rebuild_user_daily_utilization(:user_id)", {"user_id": user_id})
+        await change_feed.publish([changes.reload("users", ["role:admin"])])
+    invalidate_identity(db_user["email"])
+    data_versions.bump("users")
+    return {"user_id": user_id, **mapping.dict()}
+
+# Projects every user may see; admins see them all
+SHARED_PROJECT_IDS = [1, 4]
+
+def projects_query(current_role):
     if current_role == "admin":        
-        query = projects.select()
-        result = await database.fetch_all(query)
-    else:
-        query_wp = work_items.select().where( or_( work_items.c.assigned_to.ilike(current_user), work_items.c.assigned_to.ilike(client_id_user_mapping)))
-        print("query_wp: " , query_wp)
-        result_wp = await database.fetch_all(query_wp)        
-        query =  projects.select().where(projects.c.id.in_([1,4]))
-        print("query:" ,query)
-        result = await database.fetch_all(query)
-    return result  
+        return projects.select()
+    return projects.select().where(projects.c.id.in_(SHARED_PROJECT_IDS))
+
+def project_scope(project_id):
+    # Who is sent a project's change events (see projects_query)
+    return None if project_id in SHARED_PROJECT_IDS else ["role:admin"]
+
+@app.get("/api/projects")
+async def get_projects(
+    request: Request,
+    status: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    current_user: str = Depends(get_current_user),current_role: str = Depends(get_current_role),client_id_user_mapping: str =Depends(get_client_user_id)
+):
+    query = projects_query(current_role)
+    if status:
+        query = query.where(projects.c.status == status)
+    if start_date:
+        query = query.where(projects.c.start_date >= start_date)
+    if end_date:
+        query = query.where(projects.c.end_date <= end_date)
+    # Projects are few, so the list has every column unless fields says otherwise
+    query = project(query, projects, fields, projects.columns, [projects.c.id])
+    return await cached_json(request, ["projects"], current_role, lambda db: fetch_page(db, query, [projects.c.id], cursor, limit))
    
 
 @app.post("/api/projects")
-async def create_project(project: ProjectCreate, current_user: str = Depends(get_current_user)):
+async def create_project(project: ProjectCreate, current_user: str = Depends(get_current_user), current_role: str = Depends(get_current_role)):
     if current_role == "admin": 
-        query = projects.insert().values(**project.dict())
-        project_id = await database.execute(query)
-        return {"id": project_id, **project.dict()}
+        async with database.transaction():
+            query = projects.insert().values(**project.dict()).returning(*projects.c)
+            row = await database.fetch_one(query)
+            await change_feed.publish([changes.upsert("projects", row, project_scope(row["id"]))])
+        data_versions.bump("projects")
+        return {"id": row["id"], **project.dict()}
     raise HTTPException(status_code=401, detail="You are not authorised to create project")
 
 @app.get("/api/projects/{project_id}")
@@ -334,104 +688,330 @@ async def get_project(project_id: int, current_user: str = Depends(get_current_u
 
 @app.put("/api/projects/{project_id}")
 async def update_project(project_id: int, project: ProjectCreate, current_user: str = Depends(get_current_user)):
-    query = projects.update().where(projects.c.id == project_id).values(**project.dict())
-    await database.execute(query)
+    async with database.transaction():
+        query = projects.update().where(projects.c.id == project_id).values(**project.dict()).returning(*projects.c)
+        row = await database.fetch_one(query)
+        if row:
+            await change_feed.publish([changes.upsert("projects", row, project_scope(project_id))])
+    data_versions.bump("projects")
     return {"id": project_id, **project.dict()}
 
+def assignee_keys(current_user, client_user):
+    # Values of work_items.assignee_key that belong to the user
+    keys = [current_user.lower()]
+    if client_user:
+        keys.append(client_user.lower())
+    return keys
+
+def work_item_scope(*keys):
+    # Who is sent a work item's change events: the users it is, or was, assigned to
+    return sorted({key for key in keys if key})
+
+def work_items_query(current_user, client_user, project_id=None, status=None, type=None, start_date=None, end_date=None):
+    # Work items assigned to the user (by email or ADO identity), shared by the list and export.
+    # Equality on assignee_key, so idx_work_items_assignee serves it
+    query = work_items.select().where(work_items.c.assignee_key.in_(assignee_keys(current_user, client_user)))
+    if project_id:
+        query = query.where(work_items.c.project_id == project_id)
+    if status:
+        query = query.where(work_items.c.status == status)
+    if type:
+        query = query.where(work_items.c.type == type)
+    if start_date:
+        query = query.where(work_items.c.start_date >= start_date)
+    if end_date:
+        query = query.where(work_items.c.end_date <= end_date)
+    return query
+
+# List columns: everything but the description, which GET /api/work-items/{item_id} has
+WORK_ITEM_LIST_COLUMNS = list_columns(work_items, exclude={"description"})
+
 @app.get("/api/work-items")
 async def get_work_items(
+    request: Request,
     project_id: Optional[int] = None,
+    status: Optional[str] = None,
+    type: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
     current_user: str = Depends(get_current_user),
     client_user: str = Depends(get_client_user_id)
     
 ):    
-    if not client_user:
-        client_id_user_mapping = ""
-    else:
-        client_id_user_mapping = client_user
-    print(client_id_user_mapping)
-    
-    if project_id:
-        query = work_items.select().where(work_items.c.project_id == project_id).where( or_( work_items.c.assigned_to.ilike(current_user), work_items.c.assigned_to.ilike(client_id_user_mapping)))
-    else:
-        query = work_items.select().where( or_( work_items.c.assigned_to.ilike(current_user), work_items.c.assigned_to.ilike(client_id_user_mapping)))
-    print(query)
-    result = await database.fetch_all(query)
+    query = work_items_query(current_user, client_user, project_id, status, type, start_date, end_date)
+    sort_columns = [work_items.c.updated_at, work_items.c.id]
+    query = project(query, work_items, fields, WORK_ITEM_LIST_COLUMNS, sort_columns)
+    # Most recently updated first
+    return await cached_json(
+        request, ["work_items"], (current_user, client_user),
+        lambda db: fetch_page(db, query, sort_columns, cursor, limit, descending=True)
+    )
+
+@app.get("/api/work-items/{item_id}")
+async def get_work_item(item_id: int, current_user: str = Depends(get_current_user), client_user: str = Depends(get_client_user_id)):
+    # Every column, for work items the list would show the user
+    query = work_items_query(current_user, client_user).where(work_items.c.id == item_id)
+    result = await database.fetch_one(query)
+    if not result:
+        raise HTTPException(status_code=404, detail="Work item not found")
     return result
 
 @app.post("/api/work-items")
 async def create_work_item(item: WorkItemCreate, current_user: str = Depends(get_current_user)):
-    query = work_items.insert().values(**item.dict(), actual_hours=0.0)
-    item_id = await database.execute(query)
-    return {"id": item_id, **item.dict()}
+    async with database.transaction():
+        query = work_items.insert().values(**item.dict(), actual_hours=0.0).returning(*work_items.c)
+        row = await database.fetch_one(query)
+        await change_feed.publish([changes.upsert("work_items", row, work_item_scope(row["assignee_key"]))])
+    data_versions.bump("work_items")
+    return {"id": row["id"], **item.dict()}
 
 @app.put("/api/work-items/{item_id}")
 async def update_work_item(item_id: int, item: WorkItemCreate, current_user: str = Depends(get_current_user)):
-    query = work_items.update().where(work_items.c.id == item_id).values(**item.dict(), updated_at=datetime.utcnow())
-    await database.execute(query)
+    async with database.transaction():
+        # The previous assignee is sent the change too, so the item leaves their list
+        query = sqlalchemy.select([work_items.c.assignee_key]).where(work_items.c.id == item_id).with_for_update()
+        previous = await database.fetch_val(query)
+        query = work_items.update().where(work_items.c.id == item_id).values(**item.dict(), updated_at=datetime.utcnow())
+        row = await database.fetch_one(query.returning(*work_items.c))
+        if row:
+            await change_feed.publish([changes.upsert("work_items", row, work_item_scope(previous, row["assignee_key"]))])
+    data_versions.bump("work_items")
     return {"id": item_id, **item.dict()}
 
 @app.delete("/api/work-items/{item_id}")
 async def delete_work_item(item_id: int, current_user: str = Depends(get_current_user)):
-    query = work_items.delete().where(work_items.c.id == item_id)
-    await database.execute(query)
+    async with database.transaction():
+        query = work_items.delete().where(work_items.c.id == item_id).returning(work_items.c.assignee_key)
+        row = await database.fetch_one(query)
+        if row:
+            await change_feed.publish([changes.delete("work_items", item_id, work_item_scope(row["assignee_key"]))])
+    # Progress entries are deleted with it (ON DELETE CASCADE)
+    data_versions.bump("work_items", "task_progress")
     return {"message": "Work item deleted"}
 
+@app.post("/api/work-items:batch")
+async def batch_work_items(batch: WorkItemBatch, current_user: str = Depends(get_current_user)):
+    # Creates, partial updates and deletes in one transaction (see batch.py).
+    # Timestamps are set here: databases does not apply the table's Python defaults
+    now = datetime.utcnow()
+    async with database.transaction():
+        result = await apply_batch(
+            database, work_items, WorkItemCreate, batch.operations, batch.atomic,
+            foreign_keys={"project_id": projects.c.id},
+            create_defaults={"actual_hours": 0.0, "created_at": now, "updated_at": now},
+            update_defaults={"updated_at": now}, not_found="Work item not found",
+        )
+        await change_feed.publish(
+            [changes.upsert("work_items", row, work_item_scope(row["assignee_key"])) for row in result.created] +
+            [changes.upsert("work_items", row, work_item_scope(previous["assignee_key"], row["assignee_key"]))
+             for previous, row in result.updated] +
+            [changes.delete("work_items", row["id"], work_item_scope(row["assignee_key"])) for row in result.deleted]
+        )
+    if result.created or result.updated:
+        data_versions.bump("work_items")
+    if result.deleted:
+        # Progress entries are deleted with them (ON DELETE CASCADE)
+        data_versions.bump("work_items", "task_progress")
+    return batch_response(result)
+
+def batch_response(result):
+    # The rows are plain dicts, so orjson encodes them without jsonable_encoder
+    failed = sum(1 for item in result.results if item["status"] == "error")
+    return ORJSONResponse({"applied": len(result.results) - failed, "failed": failed, "results": result.results})
+
+# List columns: everything but the description, which GET /api/backlogs/{backlog_id} has
+BACKLOG_LIST_COLUMNS = list_columns(backlogs, exclude={"description"})
+
+def backlog_sort_columns(project_id=None):
+    # Backlog order: rank within a project, projects in id order when not filtered
+    if project_id:
+        return [backlogs.c.rank, backlogs.c.id]
+    return [backlogs.c.project_id, backlogs.c.rank, backlogs.c.id]
+
 @app.get("/api/backlogs")
 async def get_backlogs(
+    request: Request,
     project_id: Optional[int] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
     current_user: str = Depends(get_current_user)
 ):
     if project_id:
         query = backlogs.select().where(backlogs.c.project_id == project_id)
     else:
         query = backlogs.select()
-    result = await database.fetch_all(query)
+    if status:
+        query = query.where(backlogs.c.status == status)
+    # Either way one walk of idx_backlogs_project_rank
+    sort_columns = backlog_sort_columns(project_id)
+    query = project(query, backlogs, fields, BACKLOG_LIST_COLUMNS, sort_columns)
+    return await cached_json(request, ["backlogs"], None, lambda db: fetch_page(db, query, sort_columns, cursor, limit))
+
+@app.get("/api/backlogs/{backlog_id}")
+async def get_backlog(backlog_id: int, current_user: str = Depends(get_current_user)):
+    result = await database.fetch_one(backlogs.select().where(backlogs.c.id == backlog_id))
+    if not result:
+        raise HTTPException(status_code=404, detail="Backlog not found")
     return result
 
 @app.post("/api/backlogs")
 async def create_backlog(backlog: BacklogCreate, current_user: str = Depends(get_current_user)):
-    query = backlogs.insert().values(**backlog.dict(), created_by=current_user)
-    backlog_id = await database.execute(query)
-    return {"id": backlog_id, **backlog.dict()}
+    async with database.transaction():
+        query = backlogs.insert().values(**backlog.dict(), created_by=current_user).returning(*backlogs.c)
+        row = await database.fetch_one(query)
+        await change_feed.publish([changes.upsert("backlogs", row)])
+    data_versions.bump("backlogs")
+    # rank is set by the database (appended to the project)
+    return {"id": row["id"], **backlog.dict(), "rank": row["rank"]}
 
 @app.put("/api/backlogs/{backlog_id}")
 async def update_backlog(backlog_id: int, backlog: BacklogCreate, current_user: str = Depends(get_current_user)):
-    query = backlogs.update().where(backlogs.c.id == backlog_id).values(**backlog.dict())
-    await database.execute(query)
-    return {"id": backlog_id, **backlog.dict()}
+    async with database.transaction():
+        query = backlogs.update().where(backlogs.c.id == backlog_id).values(**backlog.dict()).returning(*backlogs.c)
+        row = await database.fetch_one(query)
+        if row:
+            await change_feed.publish([changes.upsert("backlogs", row)])
+    data_versions.bump("backlogs")
+    return {"id": backlog_id, **backlog.dict(), "rank": row["rank"] if row else None}
+
+@app.post("/api/backlogs/{backlog_id}/move")
+async def move_backlog(backlog_id: int, move: BacklogMove, current_user: str = Depends(get_current_user)):
+    # Reorders by rewriting the moved item's rank only (see ranks.py)
+    if (move.before is None) == (move.after is None):
+        raise HTTPException(status_code=400, detail="Give one of before or after")
+    async with database.transaction():
+        row = await ranks.move(database, backlogs, backlog_id, move.before, move.after)
+        await change_feed.publish([changes.upsert("backlogs", row)])
+    data_versions.bump("backlogs")
+    ranks.after_move(database, row, backlogs_rebalanced)
+    return dict(row._mapping)
 
 @app.delete("/api/backlogs/{backlog_id}")
 async def delete_backlog(backlog_id: int, current_user: str = Depends(get_current_user)):
-    query = backlogs.delete().where(backlogs.c.id == backlog_id)
-    await database.execute(query)
+    async with database.transaction():
+        query = backlogs.delete().where(backlogs.c.id == backlog_id).returning(backlogs.c.id)
+        if await database.fetch_one(query):
+            await change_feed.publish([changes.delete("backlogs", backlog_id)])
+    data_versions.bump("backlogs")
     return {"message": "Backlog deleted"}
 
+@app.post("/api/backlogs:batch")
+async def batch_backlogs(batch: BacklogBatch, current_user: str = Depends(get_current_user)):
+    # Creates, partial updates and deletes in one transaction (see batch.py)
+    async with database.transaction():
+        result = await apply_batch(
+            database, backlogs, BacklogCreate, batch.operations, batch.atomic,
+            foreign_keys={"project_id": projects.c.id},
+            create_defaults={"created_by": current_user, "created_at": datetime.utcnow()},
+            not_found="Backlog not found",
+        )
+        await change_feed.publish(
+            [changes.upsert("backlogs", row) for row in result.created] +
+            [changes.upsert("backlogs", row) for previous, row in result.updated] +
+            [changes.delete("backlogs", row["id"]) for row in result.deleted]
+        )
+    if result.created or result.updated or result.deleted:
+        data_versions.bump("backlogs")
+    return batch_response(result)
+
+async def log_progress(entries: List[TaskProgressCreate], user_email: str):
+    # Inserts the entries and adds their hours to work_items.actual_hours in a single
+    # statement (one aggregated update per work item), so it is atomic and costs the
+    # same however much progress history the work items already have
+    query = """
+        WITH inserted AS (
+            INSERT INTO task_progress (work_item_id, user_email, hours_worked, progress_percentage, notes, date)
+            SELECT e.work_item_id, :user_email, e.hours_worked, e.progress_percentage, e.notes, e.date
+            FROM unnest(
+                CAST(:work_item_ids AS INTEGER[]),
+                CAST(:hours_worked AS FLOAT[]),
+                CAST(:progress_percentages AS FLOAT[]),
+                CAST(:notes AS TEXT[]),
+                CAST(:dates AS DATE[])
+            ) WITH ORDINALITY AS e(work_item_id, hours_worked, progress_percentage, notes, date, position)
+            ORDER BY e.position
+            RETURNING id, work_item_id, hours_worked
+        ), totals AS (
+            SELECT work_item_id, SUM(hours_worked) as hours
+            FROM inserted
+            GROUP BY work_item_id
+        ), updated AS (
+            UPDATE work_items wi
+            SET actual_hours = COALESCE(wi.actual_hours, 0) + t.hours
+            FROM totals t
+            WHERE wi.id = t.work_item_id
+        )
+        SELECT id FROM inserted ORDER BY id
+    """
+    work_item_ids = [entry.work_item_id for entry in entries]
+    async with database.transaction():
+        rows = await database.fetch_all(query, {
+            "user_email": user_email,
+            "work_item_ids": work_item_ids,
+            "hours_worked": [entry.hours_worked for entry in entries],
+            "progress_percentages": [entry.progress_percentage for entry in entries],
+            "notes": [entry.notes for entry in entries],
+            "dates": [entry.date for entry in entries],
+        })
+        ids = [row["id"] for row in rows]
+        if change_feed.enabled:
+            # The new entries, and the work items with their new actual_hours
+            items = await database.fetch_all(work_items.select().where(work_items.c.id.in_(set(work_item_ids))))
+            logged = await database.fetch_all(task_progress.select().where(task_progress.c.id.in_(ids)))
+            assignees = {item["id"]: item["assignee_key"] for item in items}
+            await change_feed.publish(
+                [changes.upsert("work_items", item, work_item_scope(item["assignee_key"])) for item in items] +
+                [changes.upsert("task_progress", row, work_item_scope(assignees.get(row["work_item_id"]), user_email.lower()))
+                 for row in logged]
+            )
+    return ids
+
 @app.post("/api/task-progress")
 async def create_task_progress(progress: TaskProgressCreate, current_user: str = Depends(get_current_user)):
-    query = task_progress.insert().values(**progress.dict(), user_email=current_user)
-    progress_id = await database.execute(query)
-    
-    # Update actual hours in work item
-    hours_query = """
-        SELECT SUM(hours_worked) as total_hours 
-        FROM task_progress 
-        WHERE work_item_id = :work_item_id
-    """
-    total_hours = await database.fetch_val(hours_query, {"work_item_id": progress.work_item_id})
-    
-    update_query = work_items.update().where(
-        work_items.c.id == progress.work_item_id
-    ).values(actual_hours=total_hours or 0.0)
-    await database.execute(update_query)
-    
+    [progress_id] = await log_progress([progress], current_user)
+    data_versions.bump("task_progress", "work_items")
     return {"id": progress_id, **progress.dict()}
 
+@app.post("/api/task-progress/bulk")
+async def create_task_progress_bulk(timesheet: TimesheetCreate, current_user: str = Depends(get_current_user)):
+    work_item_ids = {entry.work_item_id for entry in timesheet.entries}
+    query = sqlalchemy.select([work_items.c.id]).where(work_items.c.id.in_(work_item_ids))
+    missing = work_item_ids - {row["id"] for row in await database.fetch_all(query)}
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Work items not found: {sorted(missing)}")
+    ids = await log_progress(timesheet.entries, current_user)
+    data_versions.bump("task_progress", "work_items")
+    return {"count": len(ids), "ids": ids}
+
 @app.get("/api/task-progress/{work_item_id}")
-async def get_task_progress(work_item_id: int, current_user: str = Depends(get_current_user)):
+async def get_task_progress(
+    work_item_id: int,
+    request: Request,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    current_user: str = Depends(get_current_user)
+):
     query = task_progress.select().where(task_progress.c.work_item_id == work_item_id)
-    result = await database.fetch_all(query)
-    return result
+    if start_date:
+        query = query.where(task_progress.c.date >= start_date)
+    if end_date:
+        query = query.where(task_progress.c.date <= end_date)
+    # Entries have no endpoint of their own, so notes are in the list unless fields leaves them out
+    sort_columns = [task_progress.c.date, task_progress.c.id]
+    query = project(query, task_progress, fields, task_progress.columns, sort_columns)
+    # Latest entries first
+    return await cached_json(
+        request, ["task_progress"], None,
+        lambda db: fetch_page(db, query, sort_columns, cursor, limit, descending=True)
+    )
 
 @app.post("/api/azure-config")
 async def save_azure_config(config: AzureConfigCreate, current_user: str = Depends(get_current_user)):
@@ -440,6 +1020,7 @@ async def save_azure_config(config: AzureConfigCreate, current_user: str = Depen
     
     query = azure_config.insert().values(**config.dict(), is_active=True)
     config_id = await database.execute(query)
+    ado_sync.clear_client_cache()
     return {"id": config_id, "message": "Azure DevOps configuration saved"}
 
 @app.get("/api/azure-config")
@@ -455,8 +1036,8 @@ async def get_azure_config(current_user: str = Depends(get_current_user)):
         }
     return None
 
-@app.post("/api/sync-azure-boards")
-async def sync_azure_boards(current_user: str = Depends(get_current_user),client_user: str = Depends(get_client_user_id)):
+@app.post("/api/sync-azure-boards", status_code=202)
+async def sync_azure_boards(full_resync: bool = False, current_user: str = Depends(get_current_user),client_user: str = Depends(get_client_user_id)):
     # Get active config
     query = azure_config.select().where(azure_config.c.is_active == True)
     config = await database.fetch_one(query)
@@ -464,159 +1045,325 @@ async def sync_azure_boards(current_user: str = Depends(get_current_user),client
     if not config:
         raise HTTPException(status_code=400, detail="Azure DevOps not configured")
     
-    try:
-        if not client_user:
-            client_id_user_mapping = ""
-        else:
-            client_id_user_mapping = client_user
-        # Connect to Azure DevOps
-        credentials = BasicAuthentication('', config["personal_access_token"])
-        connection = Connection(base_url=config["organization_url"], creds=credentials)
-        
-        # Get work item tracking client
-        wit_client = connection.clients.get_work_item_tracking_client()
-        
-        # Query for work items (customize WIQL as needed)
-        wiql_query = """
-            SELECT [System.Id], [System.Title], [System.State], 
-                   [System.AssignedTo], [Microsoft.VSTS.Scheduling.StartDate],
-                   [Microsoft.VSTS.Scheduling.FinishDate], 
-                   [Microsoft.VSTS.Scheduling.OriginalEstimate],
-                   [Microsoft.VSTS.Scheduling.CompletedWork]
-            FROM WorkItems
-            WHERE [System.TeamProject] = 'Spark' 
-        """
-        wiql_query +=  "  AND [System.AssignedTo] = '" + client_id_user_mapping + "'"
-        wiql_query +=  "  AND ([System.WorkItemType] CONTAINS  'BACKLOG' OR  [System.WorkItemType] CONTAINS   'FEATURE' OR  [System.WorkItemType] CONTAINS  'BUG' OR   [System.WorkItemType] CONTAINS  'TASK' )"
-            
-        print(wiql_query)
-        #AND [System.State] <> 'Closed'
-        #@project
-        wiql = {"query": wiql_query}
-        #query_result = wit_client.query_by_wiql(wiql, project=config["project_name"])
-        query_result = wit_client.query_by_wiql(wiql)
-        synced_count = 0
-        print(query_result.work_items)
-        if query_result.work_items:
-            work_item_ids = [item.id for item in query_result.work_items]
-            work_items_data = wit_client.get_work_items(ids=work_item_ids, expand='All')
-            
-            for wi in work_items_data:
-                fields = wi.fields
-                
-                # Check if work item already exists
-                existing_query = work_items.select().where(work_items.c.ado_id == str(wi.id))
-                existing = await database.fetch_one(existing_query)
-                
-                work_item_data = {
-                    "title": fields.get("System.Title", ""),
-                    "status": fields.get("System.State", "new"),
-                    "assigned_to": fields.get("System.AssignedTo", {}).get("uniqueName", ""),
-                    "start_date": fields.get("Microsoft.VSTS.Scheduling.StartDate"),
-                    "end_date": fields.get("Microsoft.VSTS.Scheduling.FinishDate"),
-                    "estimated_hours": fields.get("Microsoft.VSTS.Scheduling.OriginalEstimate", 0.0),
-                    "actual_hours": fields.get("Microsoft.VSTS.Scheduling.CompletedWork", 0.0),
-                    "ado_id": str(wi.id),
-                    "type": fields.get("System.WorkItemType", "task"),
-                }
-               
-                if existing:
-                    print(" work item already exists")
-                    # Update existing work item
-                    update_query = work_items.update().where(
-                        work_items.c.ado_id == str(wi.id)
-                    ).values(**work_item_data, updated_at=datetime.utcnow())
-                    #await database.execute(update_query)
-                else:
-                    print(" work item not exists")
-                    # Create new work item (assign to default project)
-                    # Get first project or create default
-                    project_query = projects.select().where(projects.c.name== "Spark")
-                    project = await database.fetch_one(project_query)
-                    
-                    if not project:
-                        # Create default project
-                        default_project = projects.insert().values(
-                            name="Spark",
-                            description="Auto-created for Azure DevOps sync for Spark Client",
-                            status="active"
-                        )
-                        #project_id = await database.execute(default_project)
-                    else:
-                        project_id = project["id"]
-                    
-                    work_item_data["project_id"] = project_id
-                    insert_query = work_items.insert().values(**work_item_data)
-                    #await database.execute(insert_query)
-                
-                synced_count += 1
-        
-        return {
-            "message": "Azure DevOps sync completed",
-            "synced_count": synced_count
-        }
-        
-    except Exception as e:
-        print(str(e))
-        raise HTTPException(status_code=500, detail=f"Azure DevOps sync failed: {str(e)}")
+    if not client_user:
+        client_id_user_mapping = ""
+    else:
+        client_id_user_mapping = client_user
+
+    # Runs in the background; a sync already running for this user joins instead
+    job = await enqueue_azure_sync(config, client_id_user_mapping, current_user, full_resync)
+    return {
+        "message": "Azure DevOps sync already running" if job["joined"] else "Azure DevOps sync started",
+        "job_id": job["id"],
+        "status": job["status"],
+        "joined": job["joined"]
+    }
+
+@app.get("/api/sync-jobs/{job_id}")
+async def get_sync_job(job_id: int, current_user: str = Depends(get_current_user),
+                       current_role: str = Depends(get_current_role), client_user: str = Depends(get_client_user_id)):
+    job = await job_runner.get_job(database, sync_jobs, job_id)
+    # Admins see every job, others those they started or that sync their client id;
+    # someone else's job is reported as missing
+    visible = job is not None and (
+        current_role == "admin" or job["requested_by"] == current_user
+        or (bool(client_user) and job["client_user_id"] == client_user)
+    )
+    if not visible:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return job
+
+async def enqueue_azure_sync(config, client_id_user_mapping, requested_by, full_resync=False):
+    async def run(progress):
+        return await run_azure_sync(config, client_id_user_mapping, full_resync, progress)
+    return await job_runner.submit(database, sync_jobs, config["id"], client_id_user_mapping, requested_by, full_resync, run)
+
+async def enqueue_scheduled_syncs():
+    # Re-sync every client user that has synced the active config before
+    config = await database.fetch_one(azure_config.select().where(azure_config.c.is_active == True))
+    if not config:
+        return
+    states = await database.fetch_all(azure_sync_state.select().where(azure_sync_state.c.config_id == config["id"]))
+    for state in states:
+        await enqueue_azure_sync(config, state["client_user_id"], "scheduler")
+
+async def run_azure_sync(config, client_id_user_mapping, full_resync, progress=None):
+    # Connect to Azure DevOps (client is cached per azure_config row)
+    wit_client = await ado_sync.get_wit_client(config)
+    
+    # Query for work items (customize WIQL as needed)
+    wiql_query = """
+        SELECT [System.Id]
+        FROM WorkItems
+        WHERE [System.TeamProject] = 'Spark' 
+    """
+    wiql_query +=  "  AND [System.AssignedTo] = '" + client_id_user_mapping.replace("'", "''") + "'"
+    wiql_query +=  "  AND ([System.WorkItemType] CONTAINS  'BACKLOG' OR  [System.WorkItemType] CONTAINS   'FEATURE' OR  [System.WorkItemType] CONTAINS  'BUG' OR   [System.WorkItemType] CONTAINS  'TASK' )"
+    #AND [System.State] <> 'Closed'
+    #@project
+
+    # Only items changed since the last successful sync, unless a full resync is requested
+    state_query = azure_sync_state.select().where(and_(
+        azure_sync_state.c.config_id == config["id"],
+        azure_sync_state.c.client_user_id == client_id_user_mapping
+    ))
+    state = await database.fetch_one(state_query)
+    watermark = None if full_resync or not state else state["watermark"]
+
+    result = await ado_sync.sync_work_items(database, wit_client, wiql_query, work_items, get_sync_project_id, watermark=watermark, progress=progress)
+    await save_sync_state(config["id"], client_id_user_mapping, result["watermark"])
+    if result["synced_count"]:
+        # The first sync may also have created the Spark project
+        data_versions.bump("work_items", "projects")
+        await change_feed.publish([changes.reload("work_items", await sync_scope(client_id_user_mapping))])
+    return result
+
+async def sync_scope(client_user_id):
+    # Users whose work items a sync for client_user_id may have changed: items are
+    # assigned to the ADO identity, which is either the mapping itself or the email
+    query = sqlalchemy.select([users.c.email]).select_from(
+        users.join(user_client_map, and_(user_client_map.c.user_id == users.c.id, user_client_map.c.active == True))
+    ).where(sqlalchemy.func.lower(user_client_map.c.client_user_id) == client_user_id.lower())
+    return work_item_scope(client_user_id.lower(), *[row["email"].lower() for row in await database.fetch_all(query)])
+
+async def save_sync_state(config_id, client_user_id, watermark):
+    query = pg_insert(azure_sync_state).values(
+        config_id=config_id,
+        client_user_id=client_user_id,
+        watermark=watermark,
+        last_synced_at=datetime.utcnow()
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[azure_sync_state.c.config_id, azure_sync_state.c.client_user_id],
+        set_={"watermark": query.excluded.watermark, "last_synced_at": query.excluded.last_synced_at}
+    )
+    await database.execute(query)
+
+async def get_sync_project_id():
+    # New ADO work items are assigned to the Spark project, created on first sync
+    project_query = projects.select().where(projects.c.name == "Spark")
+    project = await database.fetch_one(project_query)
+    if project:
+        return project["id"]
+    default_project = projects.insert().values(
+        name="Spark",
+        description="Auto-created for Azure DevOps sync for Spark Client",
+        status="active"
+    ).returning(*projects.c)
+    async with database.transaction():
+        row = await database.fetch_one(default_project)
+        await change_feed.publish([changes.upsert("projects", row, project_scope(row["id"]))])
+    return row["id"]
+
+def utilization_report_query(identity: Identity, start_date=None, end_date=None):
+    # Reads the user_daily_utilization rollup (maintained by triggers in init.sql),
+    # so only the rollup rows inside the date range are scanned. Work items count on
+    # their start date, logged hours and progress on the day they were logged.
+    rollup_filter = ""
+    params = {}
+    if start_date:
+        rollup_filter += " AND r.day >= :start_date"
+        params["start_date"] = start_date
+    if end_date:
+        rollup_filter += " AND r.day <= :end_date"
+        params["end_date"] = end_date
+
+    query = """
+        SELECT 
+            u.email,
+            u.name,
+            COALESCE(r.total_tasks, 0) as total_tasks,
+            r.total_estimated_hours,
+            r.total_actual_hours,
+            COALESCE(r.total_hours_worked, 0) as total_hours_worked,
+            r.avg_progress
+        FROM users u
+        LEFT JOIN (
+            SELECT 
+                r.user_id,
+                SUM(r.tasks_assigned) as total_tasks,
+                SUM(r.estimated_hours) as total_estimated_hours,
+                SUM(r.actual_hours) as total_actual_hours,
+                SUM(r.hours_worked) as total_hours_worked,
+                SUM(r.progress_sum) / NULLIF(SUM(r.progress_entries), 0) as avg_progress
+            FROM user_daily_utilization r
+            WHERE 1=1 {rollup_filter}
+            GROUP BY r.user_id
+        ) r ON r.user_id = u.id
+    """.format(rollup_filter=rollup_filter)
+
+    # Admins see every user, everyone else only their own row
+    if identity.role != "admin":
+        query += " WHERE u.id = :user_id"
+        params["user_id"] = identity.user_id
+    query += " ORDER BY u.email"
+    return query, params
+
+UTILIZATION_REPORT_COLUMNS = ["email", "name", "total_tasks", "total_estimated_hours", "total_actual_hours", "total_hours_worked", "avg_progress"]
 
 @app.get("/api/reports/utilization")
 async def get_utilization_report(
+    request: Request,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    current_user: str = Depends(get_current_user),
-    client_user: str = Depends(get_client_user_id),
-    current_role: str = Depends(get_current_role)
+    identity: Identity = Depends(get_identity)
 ):
-    if current_role== "admin":
+    query, params = utilization_report_query(identity, start_date, end_date)
+    scope = None if identity.role == "admin" else identity.user_id
+    return await cached_json(request, ["users", "work_items", "task_progress"], scope, lambda db: db.fetch_all(query, params))
+
+# Utilization over time: hours per day, week or month bucket
+CAPACITY_HOURS_PER_DAY = float(os.getenv("CAPACITY_HOURS_PER_DAY", "8"))
+# A bit over a year of daily buckets
+MAX_TIMESERIES_BUCKETS = 400
+DEFAULT_TIMESERIES_DAYS = 90
+TIMESERIES_BUCKET = Query("week", pattern="^(day|week|month)$")
+TIMESERIES_GROUP_BY = Query("user", pattern="^(user|project)$")
+
+# Every bucket overlapping the range, with the weekdays in it (clipped to the range)
+# times CAPACITY_HOURS_PER_DAY. Buckets start on the 1st of the month or on Monday.
+TIMESERIES_BUCKETS_CTE = """
+        days AS (
+            SELECT CAST(d AS date) AS day, CAST(date_trunc(:bucket, d) AS date) AS bucket
+            FROM generate_series(CAST(CAST(:start_date AS date) AS timestamp), CAST(CAST(:end_date AS date) AS timestamp), interval '1 day') d
+        ),
+        buckets AS (
+            SELECT bucket, COUNT(*) FILTER (WHERE EXTRACT(ISODOW FROM day) < 6) * CAST(:capacity AS float) AS capacity_hours
+            FROM days
+            GROUP BY bucket
+        )
+"""
+
+def timeseries_range(bucket, start_date=None, end_date=None):
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=DEFAULT_TIMESERIES_DAYS)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    if bucket == "day":
+        count = (end_date - start_date).days + 1
+    elif bucket == "week":
+        count = (end_date - (start_date - timedelta(days=start_date.weekday()))).days // 7 + 1
+    else:
+        count = (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+    if count > MAX_TIMESERIES_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TIMESERIES_BUCKETS} buckets; use a larger bucket or a shorter range")
+    return start_date, end_date
+
+def utilization_timeseries_query(identity: Identity, bucket, group_by, start_date, end_date):
+    # One statement for the whole range: the daily rollups are summed per bucket on
+    # their integer keys first and only then joined to names and bucket capacity.
+    # Users get a row for every bucket, so idle weeks show; projects only for
+    # buckets with hours logged or work planned.
+    params = {"bucket": bucket, "start_date": start_date, "end_date": end_date}
+    if group_by == "user":
+        params["capacity"] = CAPACITY_HOURS_PER_DAY
+        user_filter = ""
+        if identity.role != "admin":
+            user_filter = " AND r.user_id = :user_id"
+            params["user_id"] = identity.user_id
         query = """
-            SELECT 
+            WITH {buckets},
+            rollup AS (
+                SELECT
+                    r.user_id,
+                    CAST(date_trunc(:bucket, CAST(r.day AS timestamp)) AS date) AS bucket,
+                    SUM(r.hours_worked) AS hours_worked,
+                    SUM(r.estimated_hours) AS estimated_hours,
+                    SUM(r.actual_hours) AS actual_hours,
+                    SUM(r.tasks_assigned) AS tasks_assigned
+                FROM user_daily_utilization r
+                WHERE r.day BETWEEN :start_date AND :end_date {user_filter}
+                GROUP BY 1, 2
+            )
+            SELECT
+                b.bucket,
                 u.email,
                 u.name,
-                COUNT(DISTINCT wi.id) as total_tasks,
-                SUM(wi.estimated_hours) as total_estimated_hours,
-                SUM(wi.actual_hours) as total_actual_hours,
-                AVG(tp.progress_percentage) as avg_progress
+                COALESCE(r.hours_worked, 0) AS hours_worked,
+                r.estimated_hours,
+                r.actual_hours,
+                COALESCE(r.tasks_assigned, 0) AS tasks_assigned,
+                b.capacity_hours,
+                ROUND(CAST(100 * COALESCE(r.hours_worked, 0) / NULLIF(b.capacity_hours, 0) AS numeric), 1) AS utilization
             FROM users u
-            LEFT JOIN work_items wi ON (wi.assigned_to = u.email 
-            LEFT JOIN task_progress tp ON tp.work_item_id = wi.id AND tp.user_email = u.email
-            WHERE 1=1
+            CROSS JOIN buckets b
+            LEFT JOIN rollup r ON r.user_id = u.id AND r.bucket = b.bucket
+        """.format(buckets=TIMESERIES_BUCKETS_CTE, user_filter=user_filter)
+        if identity.role != "admin":
+            query += " WHERE u.id = :user_id"
+        query += " ORDER BY b.bucket, u.email"
+        return query, params
+
+    # Per project. Admins read the project_daily_hours rollup; everyone else only
+    # their own logged hours and their own work items.
+    if identity.role == "admin":
+        logged = """
+            SELECT r.project_id, CAST(date_trunc(:bucket, CAST(r.day AS timestamp)) AS date) AS bucket, SUM(r.hours_worked) AS hours_worked
+            FROM project_daily_hours r
+            WHERE r.day BETWEEN :start_date AND :end_date
+            GROUP BY 1, 2
         """
+        work_item_filter = ""
     else:
-        query = """
-            SELECT 
-                u.email,
-                u.name,
-                COUNT(DISTINCT wi.id) as total_tasks,
-                SUM(wi.estimated_hours) as total_estimated_hours,
-                SUM(wi.actual_hours) as total_actual_hours,
-                AVG(tp.progress_percentage) as avg_progress
-            FROM users u
-            LEFT JOIN work_items wi ON (wi.assigned_to ILIKE :email  OR wi.assigned_to ILIKE :clientsideid)
-            LEFT JOIN task_progress tp ON tp.work_item_id = wi.id AND tp.user_email = u.email
-            WHERE 1=1
+        logged = """
+            SELECT wi.project_id, CAST(date_trunc(:bucket, CAST(tp.date AS timestamp)) AS date) AS bucket, SUM(tp.hours_worked) AS hours_worked
+            FROM task_progress tp
+            JOIN work_items wi ON wi.id = tp.work_item_id
+            WHERE tp.user_email = :email AND tp.date BETWEEN :start_date AND :end_date
+            GROUP BY 1, 2
         """
-    
-    params = {}
-    params["email"] = current_user 
-    params["clientsideid"] = client_user #id for assigned in AzureDevops is based on the logged in id
-    
+        work_item_filter = " AND wi.assignee_key = ANY(:keys)"
+        params["email"] = identity.email
+        params["keys"] = assignee_keys(identity.email, identity.client_user_id)
+    query = """
+        WITH logged AS ({logged}),
+        planned AS (
+            SELECT
+                wi.project_id,
+                CAST(date_trunc(:bucket, CAST(COALESCE(wi.start_date, CAST(wi.created_at AS date)) AS timestamp)) AS date) AS bucket,
+                SUM(wi.estimated_hours) AS estimated_hours,
+                SUM(wi.actual_hours) AS actual_hours,
+                COUNT(*) AS tasks_assigned
+            FROM work_items wi
+            WHERE COALESCE(wi.start_date, CAST(wi.created_at AS date)) BETWEEN :start_date AND :end_date {work_item_filter}
+            GROUP BY 1, 2
+        )
+        SELECT
+            COALESCE(l.bucket, pl.bucket) AS bucket,
+            p.id AS project_id,
+            p.name AS project_name,
+            COALESCE(l.hours_worked, 0) AS hours_worked,
+            pl.estimated_hours,
+            pl.actual_hours,
+            COALESCE(pl.tasks_assigned, 0) AS tasks_assigned
+        FROM logged l
+        FULL JOIN planned pl ON pl.project_id = l.project_id AND pl.bucket = l.bucket
+        JOIN projects p ON p.id = COALESCE(l.project_id, pl.project_id)
+        ORDER BY 1, p.name, p.id
+    """.format(logged=logged, work_item_filter=work_item_filter)
+    return query, params
 
-    if start_date:
-        query += " AND wi.start_date >= :start_date"
-        params["start_date"] = start_date
-    if end_date:
-        query += " AND wi.end_date <= :end_date"
-        params["end_date"] = end_date
-    
-    query += " GROUP BY u.email, u.name"
-    print(query)
-    result = await database.fetch_all(query, params)
-    return result
+UTILIZATION_TIMESERIES_COLUMNS = {
+    "user": ["bucket", "email", "name", "hours_worked", "estimated_hours", "actual_hours", "tasks_assigned", "capacity_hours", "utilization"],
+    "project": ["bucket", "project_id", "project_name", "hours_worked", "estimated_hours", "actual_hours", "tasks_assigned"],
+}
 
-@app.get("/api/reports/project-status")
-async def get_project_status_report(current_user: str = Depends(get_current_user)):
-    query = """
+@app.get("/api/reports/utilization/timeseries")
+async def get_utilization_timeseries(
+    request: Request,
+    bucket: str = TIMESERIES_BUCKET,
+    group_by: str = TIMESERIES_GROUP_BY,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    identity: Identity = Depends(get_identity)
+):
+    start_date, end_date = timeseries_range(bucket, start_date, end_date)
+    query, params = utilization_timeseries_query(identity, bucket, group_by, start_date, end_date)
+    resources = ["users", "work_items", "task_progress"] + (["projects"] if group_by == "project" else [])
+    scope = None if identity.role == "admin" else identity.user_id
+    return await cached_json(request, resources, scope, lambda db: fetch_json(db, query, params))
+
+PROJECT_STATUS_REPORT_QUERY = """
         SELECT 
             p.id,
             p.name,
@@ -629,10 +1376,236 @@ async def get_project_status_report(current_user: str = Depends(get_current_user
         LEFT JOIN work_items wi ON wi.project_id = p.id
         GROUP BY p.id, p.name, p.status
     """
-    
-    result = await database.fetch_all(query)
+
+PROJECT_STATUS_REPORT_COLUMNS = ["id", "name", "status", "total_work_items", "completed_items", "total_estimated_hours", "total_actual_hours"]
+
+@app.get("/api/reports/project-status")
+async def get_project_status_report(request: Request, current_user: str = Depends(get_current_user)):
+    return await cached_json(request, ["projects", "work_items"], None, lambda db: db.fetch_all(PROJECT_STATUS_REPORT_QUERY))
+
+# Burn-down forecasts (see forecast.py). Every visible project is computed in one
+# pass, so the portfolio costs about as much as a single project; results are cached
+# until progress is logged or work items or projects change, and for the day only.
+FORECAST_RESOURCES = ["projects", "work_items", "task_progress"]
+
+@app.get("/api/reports/forecast")
+async def get_forecast_report(request: Request, identity: Identity = Depends(get_identity)):
+    project_ids = None if identity.role == "admin" else SHARED_PROJECT_IDS
+    scope = (identity.role == "admin", date.today())
+    return await cached_json(request, FORECAST_RESOURCES, scope, lambda db: forecast.project_forecasts(db, project_ids))
+
+@app.get("/api/projects/{project_id}/forecast")
+async def get_project_forecast(request: Request, project_id: int, identity: Identity = Depends(get_identity)):
+    # As in the report, plus the weekly hours the burn rate is based on
+    if identity.role != "admin" and project_id not in SHARED_PROJECT_IDS:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    async def load(db):
+        forecasts = await forecast.project_forecasts(db, [project_id], include_history=True)
+        if not forecasts:
+            raise HTTPException(status_code=404, detail="Project not found")
+        return forecasts[0]
+    return await cached_json(request, FORECAST_RESOURCES, date.today(), load)
+
+# Search
+@app.get("/api/search")
+async def search_items(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[str] = Query(None, pattern="^(work_item|backlog)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: str = Depends(get_current_user),
+    client_user: str = Depends(get_client_user_id)
+):
+    # Ranked matches in work item and backlog titles/descriptions (see search.py);
+    # work items are limited to the caller's, like GET /api/work-items
+    kinds = [kind] if kind else SEARCH_KINDS
+    return await cached_json(
+        request, ["work_items", "backlogs"], (current_user, client_user),
+        lambda db: search(db, q.strip(), assignee_keys(current_user, client_user), work_items, backlogs, kinds, cursor, limit)
+    )
+
+# Dashboard
+DASHBOARD_SECTIONS = ["projects", "work_items", "backlogs", "utilization", "project_status"]
+DASHBOARD_RESOURCES = ["projects", "work_items", "backlogs", "task_progress", "users"]
+
+@app.get("/api/dashboard")
+async def get_dashboard(request: Request, sections: Optional[str] = None, identity: Identity = Depends(get_identity)):
+    # Everything the dashboard loads in one request: identity is resolved once and
+    # each section is gathered as its own task, so each runs on its own pooled
+    # connection and the request takes as long as the slowest query.
+    # sections is a comma separated subset of DASHBOARD_SECTIONS (default: all).
+    wanted = DASHBOARD_SECTIONS
+    if sections:
+        wanted = list(dict.fromkeys(name.strip() for name in sections.split(",") if name.strip()))
+        unknown = [name for name in wanted if name not in DASHBOARD_SECTIONS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown dashboard sections: {', '.join(unknown)}")
+
+    loaders = {
+        "projects": lambda db: fetch_page(db, projects_query(identity.role), [projects.c.id], limit=MAX_PAGE_SIZE),
+        "work_items": lambda db: fetch_page(
+            db, work_items_query(identity.email, identity.client_user_id).with_only_columns(WORK_ITEM_LIST_COLUMNS),
+            [work_items.c.updated_at, work_items.c.id], descending=True
+        ),
+        "backlogs": lambda db: fetch_page(
+            db, sqlalchemy.select(BACKLOG_LIST_COLUMNS), backlog_sort_columns()
+        ),
+        "utilization": lambda db: db.fetch_all(*utilization_report_query(identity)),
+        "project_status": lambda db: db.fetch_all(PROJECT_STATUS_REPORT_QUERY),
+    }
+
+    async def load(db):
+        results = await asyncio.gather(*[loaders[name](db) for name in wanted])
+        return dict(zip(wanted, results))
+    return await cached_json(request, DASHBOARD_RESOURCES, identity, load)
+
+# Export / Import (see exports.py)
+EXPORT_FORMAT = Query("csv", pattern="^(csv|xlsx)$")
+
+@app.get("/api/export/work-items")
+async def export_work_items(
+    request: Request,
+    project_id: Optional[int] = None,
+    status: Optional[str] = None,
+    type: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: str = EXPORT_FORMAT,
+    current_user: str = Depends(get_current_user),
+    client_user: str = Depends(get_client_user_id)
+):
+    query = work_items_query(current_user, client_user, project_id, status, type, start_date, end_date)
+    query = query.order_by(work_items.c.updated_at.desc(), work_items.c.id.desc())
+    return export_response(reader(request), query, [c.name for c in work_items.columns], format, "work-items")
+
+@app.get("/api/export/task-progress")
+async def export_task_progress(
+    request: Request,
+    work_item_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: str = EXPORT_FORMAT,
+    current_user: str = Depends(get_current_user)
+):
+    query = task_progress.select()
+    if work_item_id:
+        query = query.where(task_progress.c.work_item_id == work_item_id)
+    if start_date:
+        query = query.where(task_progress.c.date >= start_date)
+    if end_date:
+        query = query.where(task_progress.c.date <= end_date)
+    query = query.order_by(task_progress.c.date.desc(), task_progress.c.id.desc())
+    return export_response(reader(request), query, [c.name for c in task_progress.columns], format, "task-progress")
+
+@app.get("/api/export/reports/utilization")
+async def export_utilization_report(
+    request: Request,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: str = EXPORT_FORMAT,
+    identity: Identity = Depends(get_identity)
+):
+    query, params = utilization_report_query(identity, start_date, end_date)
+    return export_response(reader(request), query, UTILIZATION_REPORT_COLUMNS, format, "utilization-report", params)
+
+@app.get("/api/export/reports/utilization/timeseries")
+async def export_utilization_timeseries(
+    request: Request,
+    bucket: str = TIMESERIES_BUCKET,
+    group_by: str = TIMESERIES_GROUP_BY,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: str = EXPORT_FORMAT,
+    identity: Identity = Depends(get_identity)
+):
+    start_date, end_date = timeseries_range(bucket, start_date, end_date)
+    query, params = utilization_timeseries_query(identity, bucket, group_by, start_date, end_date)
+    return export_response(
+        reader(request), query, UTILIZATION_TIMESERIES_COLUMNS[group_by], format, f"utilization-{group_by}-{bucket}", params
+    )
+
+@app.get("/api/export/reports/project-status")
+async def export_project_status_report(
+    request: Request,
+    format: str = EXPORT_FORMAT,
+    current_user: str = Depends(get_current_user)
+):
+    return export_response(reader(request), PROJECT_STATUS_REPORT_QUERY, PROJECT_STATUS_REPORT_COLUMNS, format, "project-status-report")
+
+@app.post("/api/import/work-items")
+async def import_work_items(file: UploadFile = File(...), current_user: str = Depends(get_current_user)):
+    result = await import_rows(
+        database, file, WorkItemCreate, work_items,
+        defaults={"actual_hours": 0.0}, foreign_keys={"project_id": projects.c.id}
+    )
+    data_versions.bump("work_items")
+    if result["imported"]:
+        await change_feed.publish([changes.reload("work_items")])
+    return result
+
+@app.post("/api/import/backlogs")
+async def import_backlogs(file: UploadFile = File(...), current_user: str = Depends(get_current_user)):
+    result = await import_rows(
+        database, file, BacklogCreate, backlogs,
+        defaults={"created_by": current_user}, foreign_keys={"project_id": projects.c.id}
+    )
+    data_versions.bump("backlogs")
+    if result["imported"]:
+        await change_feed.publish([changes.reload("backlogs")])
     return result
 
+def change_view(identity: Identity):
+    # What the user is sent of each change event: those scoped to them (see
+    # work_item_scope and project_scope), with work items reassigned away from
+    # them turned into deletes
+    keys = set(assignee_keys(identity.email, identity.client_user_id)) | {"role:" + (identity.role or "")}
+
+    def view(event):
+        if event["scope_keys"] is not None and keys.isdisjoint(event["scope_keys"]):
+            return None
+        if event["resource"] == "work_items" and event["action"] == "upsert" and event["data"]["assignee_key"] not in keys:
+            return {**event, "action": "delete", "data": None}
+        return event
+    return view
+
+@app.post("/api/changes/ticket")
+async def create_change_ticket(identity: Identity = Depends(get_identity)):
+    # Browsers open the change feed with EventSource, which cannot send an
+    # Authorization header; this short-lived ticket goes in its URL instead of the
+    # access token itself, and is rejected everywhere else
+    expires = datetime.utcnow() + timedelta(seconds=CHANGE_TICKET_SECONDS)
+    ticket = create_access_token({"sub": identity.email, "aud": CHANGE_TICKET_AUDIENCE, "exp": expires})
+    return {"ticket": ticket, "expires_in": CHANGE_TICKET_SECONDS}
+
+@app.get("/api/changes")
+async def stream_changes(
+    ticket: Optional[str] = None,
+    after: Optional[int] = None,
+    last_event_id: Optional[int] = Header(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    # Server-Sent Events (see changes.py). EventSource resends the last event id it
+    # saw as Last-Event-ID when it reconnects; after= does the same for a new
+    # connection, e.g. one opened with a fresh ticket
+    if ticket:
+        identity = await identity_from_token(ticket, CHANGE_TICKET_AUDIENCE)
+    elif credentials:
+        identity = await identity_from_token(credentials.credentials)
+    else:
+        raise HTTPException(status_code=403, detail="Not authenticated")
+    if not change_feed.enabled:
+        raise HTTPException(status_code=501, detail="The change feed requires PostgreSQL")
+    resume = last_event_id if last_event_id is not None else after
+    return StreamingResponse(
+        change_feed.stream(change_view(identity), resume),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx would otherwise hold events back in its buffer
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 if __name__ == "__main__":
+    # A single process for development; production runs gunicorn.conf.py
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
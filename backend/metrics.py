@@ -0,0 +1,230 @@
+# Request and database metrics, exposed in Prometheus text format at /metrics
+#
+# MetricsMiddleware times every HTTP request and counts it by route template and
+# status. InstrumentedDatabase is a databases.Database that times every statement
+# and counts the statements each request runs; statements slower than
+# SLOW_QUERY_MS are logged with their SQL. The request being served is kept in a
+# context variable, so queries run by tasks a request spawns still count towards it.
+
+import contextvars
+import logging
+import os
+import time
+
+import databases
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Longest SQL text written to the slow query log
+SLOW_QUERY_SQL_LENGTH = 2000
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# [ASGI scope, statements run, seconds spent in them] for the current request
+_current = contextvars.ContextVar("metrics_request", default=None)
+
+
+def route_of(scope):
+    # The route template, not the path, keeps the label set bounded. The router
+    # adds it to the scope once it has matched the request.
+    return getattr(scope.get("route"), "path", "unmatched")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        # label values -> [count per bucket..., sum, count]
+        self._series = {}
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {series[-1]}")
+        return lines
+
+
+def _samples(kind, name, help, values):
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    if not isinstance(values, dict):
+        values = {(): values}
+    for labels, value in values.items():
+        lines.append(f"{name}{_labels([n for n, _ in labels], [v for _, v in labels])} {float(value)}")
+    return lines
+
+
+def gauge(name, help, values):
+    # values: a number, or {((label, value), ...): number}, for state kept elsewhere
+    return _samples("gauge", name, help, values)
+
+
+def counter(name, help, values):
+    # As gauge(), for totals kept elsewhere that only grow
+    return _samples("counter", name, help, values)
+
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_request_seconds = Histogram("http_request_duration_seconds", "HTTP request latency", REQUEST_BUCKETS, ("method", "route"))
+db_query_seconds = Histogram("db_query_duration_seconds", "Database statement latency", QUERY_BUCKETS, ("database", "operation"))
+db_queries_per_request = Histogram("db_queries_per_request", "Database statements run per HTTP request", QUERY_COUNT_BUCKETS, ("route",))
+db_seconds_per_request = Histogram("db_time_per_request_seconds", "Time spent in database statements per HTTP request", REQUEST_BUCKETS, ("route",))
+db_slow_queries = Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ("database", "operation"))
+
+REGISTRY = [http_requests, http_request_seconds, db_query_seconds, db_queries_per_request, db_seconds_per_request, db_slow_queries]
+
+
+def _sql(query):
+    return " ".join(str(query).split())[:SLOW_QUERY_SQL_LENGTH]
+
+
+def record_query(database, operation, query, seconds):
+    db_query_seconds.observe(seconds, database, operation)
+    current = _current.get()
+    if current is not None:
+        current[1] += 1
+        current[2] += seconds
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        db_slow_queries.inc(database, operation)
+        logger.warning("Slow query", extra={
+            "database": database,
+            "operation": operation,
+            "duration_ms": round(seconds * 1000, 1),
+            "route": route_of(current[0]) if current else None,
+            "sql": _sql(query),
+        })
+
+
+class InstrumentedDatabase(databases.Database):
+    # name labels this database's metrics ("primary", "replica")
+    def __init__(self, url, name="primary", **options):
+        super().__init__(url, **options)
+        self.name = name
+
+    async def _timed(self, operation, query, call):
+        started = time.perf_counter()
+        try:
+            return await call
+        finally:
+            record_query(self.name, operation, query, time.perf_counter() - started)
+
+    async def fetch_all(self, query, values=None):
+        return await self._timed("fetch_all", query, super().fetch_all(query, values))
+
+    async def fetch_one(self, query, values=None):
+        return await self._timed("fetch_one", query, super().fetch_one(query, values))
+
+    async def fetch_val(self, query, values=None, column=0):
+        return await self._timed("fetch_val", query, super().fetch_val(query, values, column=column))
+
+    async def execute(self, query, values=None):
+        return await self._timed("execute", query, super().execute(query, values))
+
+    async def execute_many(self, query, values):
+        return await self._timed("execute_many", query, super().execute_many(query, values))
+
+    async def iterate(self, query, values=None):
+        # Counted but not timed: a streamed export takes as long as its client reads
+        current = _current.get()
+        if current is not None:
+            current[1] += 1
+        async for row in super().iterate(query, values):
+            yield row
+
+    def pool_stats(self):
+        # asyncpg pool sizes; empty before connect() or on other backends
+        pool = getattr(self._backend, "_pool", None)
+        if pool is None or not hasattr(pool, "get_size"):
+            return {}
+        return {
+            "size": pool.get_size(),
+            "idle": pool.get_idle_size(),
+            "min": pool.get_min_size(),
+            "max": pool.get_max_size(),
+        }
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware: it never buffers, so streamed responses pass straight through
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        current = [scope, 0, 0.0]
+        token = _current.set(current)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_of(scope)
+            http_request_seconds.observe(time.perf_counter() - started, scope["method"], route)
+            http_requests.inc(scope["method"], route, str(status[0]))
+            db_queries_per_request.observe(current[1], route)
+            db_seconds_per_request.observe(current[2], route)
+            _current.reset(token)
+
+
+def render(extra_lines=()):
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
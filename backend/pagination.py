@@ -0,0 +1,67 @@
+# Keyset (cursor) pagination for list endpoints
+#
+# Pages are ordered by a unique sort key such as (updated_at, id) and continue with
+# a row-value comparison against the last row returned, so every page is an index
+# range scan no matter how deep the client has paged. The cursor is the opaque,
+# url-safe encoding of that last row's sort key. Sort key columns must be NOT NULL:
+# a NULL never compares true, so a page after one would come back empty.
+
+import base64
+import json
+from datetime import date, datetime
+
+from fastapi import HTTPException
+from sqlalchemy import Date, DateTime, tuple_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def _dump(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _load(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value)
+    return value
+
+
+def encode_cursor(row, sort_columns):
+    values = [_dump(row[column.name]) for column in sort_columns]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, sort_columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(sort_columns):
+            raise ValueError(cursor)
+        return [_load(column, value) for column, value in zip(sort_columns, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(query, sort_columns, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    # One extra row is fetched to know whether another page exists
+    if cursor:
+        key = tuple_(*sort_columns)
+        values = tuple_(*decode_cursor(cursor, sort_columns))
+        query = query.where(key < values if descending else key > values)
+    order = [column.desc() if descending else column.asc() for column in sort_columns]
+    return query.order_by(*order).limit(limit + 1)
+
+
+async def fetch_page(database, query, sort_columns, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    rows = await database.fetch_all(paginate(query, sort_columns, cursor, limit, descending))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1], sort_columns)
+    return {"items": rows, "next_cursor": next_cursor}
@@ -0,0 +1,348 @@
+# task_progress partitions: creation, retention and archives
+#
+# task_progress is partitioned by month on date (database/migrations/010), so a
+# query with a date range only reads the months in it. Each API process runs
+# maintain() at startup and every PARTITION_MAINTENANCE_HOURS, one process at a
+# time (an advisory lock):
+#   - the partitions of this month and the next TASK_PROGRESS_PARTITIONS_AHEAD are
+#     created, and rows that fell into the default partition (dates no partition
+#     covered) are moved into partitions of their own
+#   - with TASK_PROGRESS_RETENTION_MONTHS set, the partitions of months before the
+#     last that many are archived: detached, written to
+#     TASK_PROGRESS_ARCHIVE_DIR/task_progress_pYYYY_MM.npz and dropped
+#
+# An archive is a compressed NumPy .npz file holding one array per column, plus a
+# "<column>_null" mask for columns with NULLs. The rollups keep an archived month's
+# hours, so reports over it do not change; its entries are gone from
+# GET /api/task-progress and exports until restore() puts them back:
+#
+#   python partitions.py list
+#   python partitions.py archive 2024-01
+#   python partitions.py restore 2024-01
+#
+# Progress logged later for an archived month goes into a new partition, is added
+# to the month's archive by the next maintenance and counts in the reports once
+# the month is restored.
+
+import argparse
+import asyncio
+import logging
+import os
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+TASK_PROGRESS_PARTITIONS_AHEAD = int(os.getenv("TASK_PROGRESS_PARTITIONS_AHEAD", "3"))
+# Months of progress kept in the database before the current one (0 keeps all)
+TASK_PROGRESS_RETENTION_MONTHS = int(os.getenv("TASK_PROGRESS_RETENTION_MONTHS", "0"))
+TASK_PROGRESS_ARCHIVE_DIR = os.getenv("TASK_PROGRESS_ARCHIVE_DIR", "archives")
+# Hours between maintenance runs (0: only when run from the command line)
+PARTITION_MAINTENANCE_HOURS = float(os.getenv("PARTITION_MAINTENANCE_HOURS", "6"))
+
+PARTITION_PREFIX = "task_progress_p"
+# create_task_progress_partition() takes the same lock
+PARTITIONS_LOCK = "task_progress_partitions"
+MAINTENANCE_LOCK = "task_progress_maintenance"
+
+# Column name and the NumPy dtype it is archived as
+COLUMNS = [
+    ("id", "int64"),
+    ("work_item_id", "int64"),
+    ("user_email", "str"),
+    ("hours_worked", "float64"),
+    ("progress_percentage", "float64"),
+    ("notes", "str"),
+    ("date", "datetime64[D]"),
+    ("created_at", "datetime64[us]"),
+]
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+
+ATTACHED_QUERY = """
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = CAST('task_progress' AS regclass) AND c.relname LIKE 'task\\_progress\\_p%'
+    ORDER BY c.relname
+"""
+
+LIST_QUERY = """
+    SELECT c.relname AS partition, GREATEST(c.reltuples, 0) AS estimated_rows,
+           pg_size_pretty(pg_total_relation_size(c.oid)) AS size
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = CAST('task_progress' AS regclass)
+    ORDER BY c.relname
+"""
+
+# Recomputes a restored month's rollup cells: those with progress now and those
+# the rollups held while the month was archived
+REFRESH_ROLLUPS_QUERIES = [
+    """
+    SELECT refresh_user_daily_utilization(array_agg(k.user_id), array_agg(k.day))
+    FROM (
+        SELECT u.id AS user_id, tp.date AS day
+        FROM task_progress tp JOIN users u ON u.email = tp.user_email
+        WHERE tp.date >= :since AND tp.date < :until
+        UNION
+        SELECT r.user_id, r.day FROM user_daily_utilization r WHERE r.day >= :since AND r.day < :until
+    ) k
+    """,
+    """
+    SELECT refresh_project_daily_hours(array_agg(k.project_id), array_agg(k.day))
+    FROM (
+        SELECT wi.project_id, tp.date AS day
+        FROM task_progress tp JOIN work_items wi ON wi.id = tp.work_item_id
+        WHERE tp.date >= :since AND tp.date < :until
+        UNION
+        SELECT r.project_id, r.day FROM project_daily_hours r WHERE r.day >= :since AND r.day < :until
+    ) k
+    """,
+]
+
+_task = None
+
+
+def month_start(value):
+    # A date, or "YYYY-MM", as the first day of its month
+    if isinstance(value, str):
+        value = datetime.strptime(value, "%Y-%m").date()
+    return value.replace(day=1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+
+def partition_month(name):
+    return datetime.strptime(name[len(PARTITION_PREFIX):], "%Y_%m").date()
+
+
+def archive_path(month):
+    return os.path.join(TASK_PROGRESS_ARCHIVE_DIR, f"{partition_name(month)}.npz")
+
+
+def write_archive(path, rows):
+    # rows are tuples in COLUMNS order; written to a temporary file first so the
+    # archive is replaced whole or not at all
+    import numpy as np
+
+    arrays = {}
+    for index, (name, dtype) in enumerate(COLUMNS):
+        values = [row[index] for row in rows]
+        nulls = np.array([value is None for value in values], dtype=bool)
+        if dtype == "str":
+            arrays[name] = np.array(["" if value is None else value for value in values], dtype=str)
+        elif dtype.startswith("datetime64"):
+            arrays[name] = np.array(values, dtype=dtype)
+        else:
+            filler = 0 if dtype == "int64" else float("nan")
+            arrays[name] = np.array([filler if value is None else value for value in values], dtype=dtype)
+        if nulls.any():
+            arrays[f"{name}_null"] = nulls
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as archive:
+        np.savez_compressed(archive, **arrays)
+        archive.flush()
+        os.fsync(archive.fileno())
+    os.replace(temporary, path)
+
+
+def read_archive(path):
+    # The rows of an archive, as tuples in COLUMNS order
+    import numpy as np
+
+    columns = []
+    with np.load(path, allow_pickle=False) as archive:
+        for name, _ in COLUMNS:
+            values = archive[name].tolist()
+            if f"{name}_null" in archive.files:
+                values = [None if null else value for value, null in zip(values, archive[f"{name}_null"].tolist())]
+            columns.append(values)
+    return list(zip(*columns))
+
+
+async def attached_months(database):
+    return [partition_month(row["relname"]) for row in await database.fetch_all(ATTACHED_QUERY)]
+
+
+async def archive(database, month):
+    # Detaches the month's partition, writes it to its archive (adding to the one
+    # already there, if any) and drops it. Returns the rows in the archive.
+    month = month_start(month)
+    if month >= month_start(date.today()):
+        raise ValueError(f"{month:%Y-%m} is not over yet")
+    name = partition_name(month)
+    path = archive_path(month)
+
+    async with database.transaction():
+        await database.execute("SELECT pg_advisory_xact_lock(hashtext(:lock))", {"lock": PARTITIONS_LOCK})
+        if await database.fetch_val("SELECT to_regclass(:name)", {"name": name}) is None:
+            raise ValueError(f"There is no partition for {month:%Y-%m}")
+        if month in await attached_months(database):
+            await database.execute(f'ALTER TABLE task_progress DETACH PARTITION "{name}"')
+        # From here on the rollups keep the month's rows as they are
+        previous = await database.fetch_one(
+            "SELECT row_count FROM task_progress_archives WHERE month = :month", {"month": month}
+        )
+        if previous is None:
+            await database.execute(
+                "INSERT INTO task_progress_archives (month, file) VALUES (:month, :file)",
+                {"month": month, "file": os.path.basename(path)},
+            )
+
+    rows = [tuple(row[column] for column in COLUMN_NAMES)
+            for row in await database.fetch_all(f'SELECT {", ".join(COLUMN_NAMES)} FROM "{name}" ORDER BY id')]
+    if previous is not None and os.path.exists(path):
+        # Rows archived before, less any written out again by an interrupted run
+        archived = {row[0]: row for row in await asyncio.to_thread(read_archive, path)}
+        archived.update((row[0], row) for row in rows)
+        rows = [archived[key] for key in sorted(archived)]
+    await asyncio.to_thread(write_archive, path, rows)
+
+    async with database.transaction():
+        await database.execute(
+            "UPDATE task_progress_archives SET row_count = :rows, archived_at = CURRENT_TIMESTAMP WHERE month = :month",
+            {"rows": len(rows), "month": month},
+        )
+        await database.execute(f'DROP TABLE "{name}"')
+    logger.info("Archived task progress", extra={"month": f"{month:%Y-%m}", "rows": len(rows), "file": path})
+    return len(rows)
+
+
+async def restore(database, month):
+    # Loads an archived month back into its partition and recomputes its rollups.
+    # Entries of work items deleted since are left out. Returns the rows restored.
+    month = month_start(month)
+    name = partition_name(month)
+    path = archive_path(month)
+
+    # COPY runs on the transaction's connection
+    async with database.connection() as connection:
+        async with database.transaction():
+            archived = await database.fetch_one(
+                "SELECT row_count FROM task_progress_archives WHERE month = :month FOR UPDATE", {"month": month}
+            )
+            if archived is None:
+                raise ValueError(f"{month:%Y-%m} is not archived")
+            if archived["row_count"] is None:
+                raise ValueError(f"{month:%Y-%m} is still being archived")
+            rows = await asyncio.to_thread(read_archive, path)
+            await database.fetch_val("SELECT create_task_progress_partition(:month)", {"month": month})
+            work_item_ids = list({row[1] for row in rows if row[1] is not None})
+            existing = {row["id"] for row in await database.fetch_all(
+                "SELECT id FROM work_items WHERE id = ANY(:ids)", {"ids": work_item_ids}
+            )}
+            rows = [row for row in rows if row[1] is None or row[1] in existing]
+            # Into the partition itself: the rollup triggers are on task_progress
+            await connection.raw_connection.copy_records_to_table(name, records=rows, columns=COLUMN_NAMES)
+            await database.execute("DELETE FROM task_progress_archives WHERE month = :month", {"month": month})
+            for query in REFRESH_ROLLUPS_QUERIES:
+                await database.execute(query, {"since": month, "until": add_months(month, 1)})
+    os.remove(path)
+    logger.info("Restored task progress", extra={"month": f"{month:%Y-%m}", "rows": len(rows)})
+    return len(rows)
+
+
+async def maintain(database, today=None):
+    # Creates the coming partitions and archives the months past retention (and
+    # any archive a previous run left unfinished). Returns the months archived;
+    # none when another process is already at it.
+    today = today or date.today()
+    async with database.connection():
+        if not await database.fetch_val("SELECT pg_try_advisory_lock(hashtext(:lock))", {"lock": MAINTENANCE_LOCK}):
+            return []
+        try:
+            await database.execute(
+                "SELECT ensure_task_progress_partitions(:ahead)", {"ahead": TASK_PROGRESS_PARTITIONS_AHEAD}
+            )
+            months = [row["month"] for row in await database.fetch_all(
+                "SELECT month FROM task_progress_archives WHERE row_count IS NULL ORDER BY month"
+            )]
+            if TASK_PROGRESS_RETENTION_MONTHS > 0:
+                cutoff = add_months(month_start(today), -TASK_PROGRESS_RETENTION_MONTHS)
+                months += [month for month in await attached_months(database) if month < cutoff and month not in months]
+            for month in months:
+                await archive(database, month)
+            return months
+        finally:
+            await database.execute("SELECT pg_advisory_unlock(hashtext(:lock))", {"lock": MAINTENANCE_LOCK})
+
+
+def start(database, on_archived):
+    # maintain() now and every PARTITION_MAINTENANCE_HOURS; on_archived(months) is
+    # awaited after months were archived
+    global _task
+
+    async def loop():
+        while True:
+            try:
+                months = await maintain(database)
+                if months:
+                    await on_archived(months)
+            except Exception:
+                logger.exception("Task progress partition maintenance failed")
+            await asyncio.sleep(PARTITION_MAINTENANCE_HOURS * 3600)
+
+    if PARTITION_MAINTENANCE_HOURS > 0 and _task is None:
+        _task = asyncio.create_task(loop())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+
+async def run(command, month):
+    # Against the app's database; other API processes drop cached task progress
+    # through the change feed
+    import changes
+    import main
+
+    await main.database.connect()
+    try:
+        if command == "list":
+            for row in await main.database.fetch_all(LIST_QUERY):
+                print(f"{row['partition']:<24} ~{int(row['estimated_rows'])} rows, {row['size']}")
+            for row in await main.database.fetch_all("SELECT * FROM task_progress_archives ORDER BY month"):
+                state = "archiving" if row["row_count"] is None else f"{row['row_count']} rows"
+                print(f"{row['month']:%Y-%m} archived: {state}, {row['file']}, {row['archived_at']:%Y-%m-%d %H:%M}")
+            return
+        if command == "maintain":
+            months = await maintain(main.database)
+            print("Archived: " + (", ".join(f"{month:%Y-%m}" for month in months) or "nothing"))
+            if not months:
+                return
+        elif command == "archive":
+            print(f"Archived {await archive(main.database, month)} rows of {month:%Y-%m}")
+        else:
+            print(f"Restored {await restore(main.database, month)} rows of {month:%Y-%m}")
+        await main.change_feed.publish([changes.reload("task_progress")])
+    finally:
+        await main.database.disconnect()
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="task_progress partitions and archives")
+    parser.add_argument("command", choices=["list", "maintain", "archive", "restore"])
+    parser.add_argument("month", nargs="?", type=month_start, help="YYYY-MM, for archive and restore")
+    args = parser.parse_args()
+    if args.command in ("archive", "restore") and not args.month:
+        parser.error(f"{args.command} needs a month (YYYY-MM)")
+    try:
+        asyncio.run(run(args.command, args.month))
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,105 @@
+# Password hashing off the event loop
+#
+# bcrypt is deliberately slow (~250 ms of CPU per hash at the default cost), so
+# hashing and verifying run on a process pool: a login storm uses up to
+# PASSWORD_WORKERS cores and every other request keeps the event loop to itself.
+# At most PASSWORD_MAX_CONCURRENCY operations are handed to the pool at once; the
+# rest wait on a semaphore, and once PASSWORD_QUEUE_LIMIT are waiting new ones are
+# refused with a 503 instead of queueing without bound. PASSWORD_WORKERS=0 runs
+# bcrypt inline on the event loop (the old behaviour), for tests and baselines.
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(os.cpu_count() or 1, 4))))
+PASSWORD_MAX_CONCURRENCY = int(os.getenv("PASSWORD_MAX_CONCURRENCY", str(PASSWORD_WORKERS * 2)))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "500"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+_executor = None
+_semaphore = None
+
+# running: handed to the pool; waiting: queued on the semaphore
+stats = {
+    "running": 0,
+    "waiting": 0,
+    "max_waiting": 0,
+    "completed": 0,
+    "rejected": 0,
+    "wait_seconds": 0.0,
+    "run_seconds": 0.0,
+}
+
+
+def _hash(password):
+    return pwd_context.hash(password)
+
+
+def _verify(password, hashed):
+    return pwd_context.verify(password, hashed)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn: forking a process that already runs threads (ADO pool, asyncpg) is unsafe
+        _executor = ProcessPoolExecutor(
+            max_workers=PASSWORD_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def _run(fn, *args):
+    global _semaphore
+    if PASSWORD_WORKERS == 0:
+        # Inline on the event loop: for tests and benchmark baselines only
+        return fn(*args)
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(PASSWORD_MAX_CONCURRENCY)
+    if PASSWORD_QUEUE_LIMIT and stats["waiting"] >= PASSWORD_QUEUE_LIMIT:
+        stats["rejected"] += 1
+        raise HTTPException(status_code=503, detail="Too many login attempts, try again shortly",
+                            headers={"Retry-After": "1"})
+
+    queued = time.perf_counter()
+    stats["waiting"] += 1
+    stats["max_waiting"] = max(stats["max_waiting"], stats["waiting"])
+    try:
+        await _semaphore.acquire()
+    finally:
+        stats["waiting"] -= 1
+    started = time.perf_counter()
+    stats["wait_seconds"] += started - queued
+    stats["running"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _semaphore.release()
+        stats["running"] -= 1
+        stats["completed"] += 1
+        stats["run_seconds"] += time.perf_counter() - started
+
+
+async def hash_password(password):
+    return await _run(_hash, password)
+
+
+async def verify_password(password, hashed):
+    return await _run(_verify, password, hashed)
+
+
+def snapshot():
+    return {**stats, "workers": PASSWORD_WORKERS, "max_concurrency": PASSWORD_MAX_CONCURRENCY}
+
+
+def shutdown():
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,26 @@
+# Column projection for list endpoints
+#
+# ?fields=id,title,status selects only those columns in SQL. Without it a list
+# returns its default columns, which leave out long text such as descriptions
+# where the list can grow large; the /{id} endpoints return every column. The
+# sort key columns are always included, as the next page's cursor is made from them.
+
+from fastapi import HTTPException
+
+
+def list_columns(table, exclude=()):
+    return [column for column in table.columns if column.name not in exclude]
+
+
+def project(query, table, fields, default, required=()):
+    # query selecting only the columns in fields (a comma separated string), or
+    # default when fields is None; in table order
+    if fields is None:
+        wanted = {column.name for column in default}
+    else:
+        wanted = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = sorted(wanted - set(table.columns.keys()))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    wanted |= {column.name for column in required}
+    return query.with_only_columns([column for column in table.columns if column.name in wanted])
@@ -0,0 +1,135 @@
+# Backlog order: fractional rank keys
+#
+# backlogs.rank orders a project's backlog (see "Backlog order" in init.sql for the
+# keys). move() puts an item just before or after a sibling by giving it a key
+# between that sibling's and its neighbour's: one row updated however long the
+# backlog is. Repeated moves into the same gap lengthen keys, so a project whose
+# keys grew longer than BACKLOG_RANK_MAX_LENGTH is rebalanced (its keys respaced
+# evenly) in the background: right after such a move, and by a sweep every
+# BACKLOG_RANK_SWEEP_MINUTES for keys that grew otherwise.
+
+import asyncio
+import logging
+import os
+
+from fastapi import HTTPException
+from sqlalchemy import func, select, tuple_
+
+logger = logging.getLogger(__name__)
+
+BACKLOG_RANK_MAX_LENGTH = int(os.getenv("BACKLOG_RANK_MAX_LENGTH", "12"))
+# Minutes between sweeps for long keys (0: only after moves)
+BACKLOG_RANK_SWEEP_MINUTES = float(os.getenv("BACKLOG_RANK_SWEEP_MINUTES", "60"))
+
+_task = None
+# Rebalances started after a move, by project id
+_pending = {}
+
+
+async def lock(database, project_id):
+    # Held until the transaction ends; every rank change of the project takes it
+    await database.execute("SELECT lock_backlog_ranks(CAST(:project_id AS INTEGER))", {"project_id": project_id})
+
+
+async def move(database, table, backlog_id, before=None, after=None):
+    # Call inside a transaction. Returns the moved row
+    anchor_id = before if before is not None else after
+    if anchor_id == backlog_id:
+        raise HTTPException(status_code=400, detail="A backlog item cannot be moved next to itself")
+    project_id = await database.fetch_val(select([table.c.project_id]).where(table.c.id == backlog_id))
+    await lock(database, project_id)
+    rows = await database.fetch_all(
+        select([table.c.id, table.c.project_id, table.c.rank]).where(table.c.id.in_([backlog_id, anchor_id]))
+    )
+    rows = {row["id"]: row for row in rows}
+    if backlog_id not in rows or anchor_id not in rows:
+        raise HTTPException(status_code=404, detail="Backlog not found")
+    if rows[backlog_id]["project_id"] != project_id:
+        raise HTTPException(status_code=409, detail="Backlog item changed project, try again")
+    anchor = rows[anchor_id]
+    if anchor["project_id"] != project_id:
+        raise HTTPException(status_code=400, detail="Backlog items can only be moved within their project")
+
+    for attempt in range(2):
+        # The anchor's neighbour on the side the item goes, other than the item itself
+        key = tuple_(table.c.rank, table.c.id)
+        query = select([table.c.rank]).where(table.c.project_id == project_id).where(table.c.id != backlog_id)
+        if before is not None:
+            query = query.where(key < tuple_(anchor["rank"], anchor["id"])).order_by(table.c.rank.desc(), table.c.id.desc())
+            lower, upper = await database.fetch_val(query.limit(1)), anchor["rank"]
+        else:
+            query = query.where(key > tuple_(anchor["rank"], anchor["id"])).order_by(table.c.rank, table.c.id)
+            lower, upper = anchor["rank"], await database.fetch_val(query.limit(1))
+        if lower is None or upper is None or lower < upper:
+            break
+        # Equal keys leave no room between them; respace the project and look again
+        await rebalance(database, project_id)
+        anchor = await database.fetch_one(select([table.c.id, table.c.rank]).where(table.c.id == anchor_id))
+
+    query = table.update().where(table.c.id == backlog_id).values(rank=func.backlog_rank_between(lower, upper))
+    return await database.fetch_one(query.returning(*table.c))
+
+
+async def rebalance(database, project_id):
+    return await database.fetch_val(
+        "SELECT rebalance_backlog_ranks(CAST(:project_id AS INTEGER))", {"project_id": project_id}
+    )
+
+
+async def rebalance_long(database, table):
+    # Rebalances every project with a key longer than BACKLOG_RANK_MAX_LENGTH;
+    # returns their ids
+    query = select([table.c.project_id]).where(func.length(table.c.rank) > BACKLOG_RANK_MAX_LENGTH).distinct()
+    project_ids = [row["project_id"] for row in await database.fetch_all(query)]
+    for project_id in project_ids:
+        async with database.transaction():
+            await rebalance(database, project_id)
+    return project_ids
+
+
+def after_move(database, row, on_rebalanced):
+    # Rebalances the moved item's project in the background when its new key is
+    # long; on_rebalanced(project_ids) is awaited afterwards
+    project_id = row["project_id"]
+    if len(row["rank"]) <= BACKLOG_RANK_MAX_LENGTH or project_id in _pending:
+        return
+
+    async def run():
+        try:
+            async with database.transaction():
+                await rebalance(database, project_id)
+            await on_rebalanced([project_id])
+        except Exception:
+            logger.exception("Backlog rank rebalance failed")
+        finally:
+            _pending.pop(project_id, None)
+
+    _pending[project_id] = asyncio.create_task(run())
+
+
+def start(database, table, on_rebalanced):
+    # rebalance_long() now and every BACKLOG_RANK_SWEEP_MINUTES
+    global _task
+
+    async def loop():
+        while True:
+            try:
+                project_ids = await rebalance_long(database, table)
+                if project_ids:
+                    await on_rebalanced(project_ids)
+            except Exception:
+                logger.exception("Backlog rank sweep failed")
+            await asyncio.sleep(BACKLOG_RANK_SWEEP_MINUTES * 60)
+
+    if BACKLOG_RANK_SWEEP_MINUTES > 0 and _task is None:
+        _task = asyncio.create_task(loop())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    # Rebalances after moves are short; let them finish
+    await asyncio.gather(*_pending.values(), return_exceptions=True)
@@ -0,0 +1,138 @@
+# Full-text search over work item and backlog titles and descriptions
+#
+# On Postgres both tables carry a generated search_vector (title weighted above
+# description) with a GIN index, and GIN trigram indexes on title for partial
+# words ("migr" finding "Migration"). A row matches when its vector matches the
+# websearch-style query or its title contains the text; results are ordered by
+# ts_rank, with a small boost for title substring hits.
+#
+# Other databases (e.g. SQLite in tests) fall back to case-insensitive LIKE on
+# title and description, ordered by id, without ranking.
+#
+# Each kind is queried for the best offset + limit rows and the lists are merged,
+# so the cursor is an offset, capped at SEARCH_MAX_RESULTS.
+
+import asyncio
+import base64
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import literal, or_, select
+
+SEARCH_KINDS = ["work_item", "backlog"]
+# Deepest result reachable by paging
+SEARCH_MAX_RESULTS = 1000
+# Shorter texts cannot use the trigram indexes, so they only match whole words
+MIN_PARTIAL_LENGTH = 3
+# Matches ranked per kind and query
+SEARCH_CANDIDATES = 5000
+
+# {columns} are the table's mapped columns (not search_vector), so the relevance
+# is called score: backlogs have a rank column of their own. {partial} is
+# "title ILIKE :pattern", or FALSE for short texts, spliced in so the planner
+# always sees which indexes can serve the OR. Ranking is the expensive part, so
+# only the first :candidates matches are ranked; this only changes results for
+# terms found in more rows than that.
+WORK_ITEM_SEARCH = """
+    SELECT {columns},
+           ts_rank(wi.search_vector, websearch_to_tsquery('english', :q))
+           + CASE WHEN {partial} THEN 0.05 ELSE 0 END AS score
+    FROM (
+        SELECT * FROM work_items wi
+        WHERE wi.assignee_key = ANY(CAST(:assignee_keys AS TEXT[]))
+          AND (wi.search_vector @@ websearch_to_tsquery('english', :q) OR {partial})
+        LIMIT :candidates
+    ) wi
+    ORDER BY score DESC, wi.id
+    LIMIT :limit
+"""
+
+BACKLOG_SEARCH = """
+    SELECT {columns},
+           ts_rank(b.search_vector, websearch_to_tsquery('english', :q))
+           + CASE WHEN {partial} THEN 0.05 ELSE 0 END AS score
+    FROM (
+        SELECT * FROM backlogs b
+        WHERE b.search_vector @@ websearch_to_tsquery('english', :q) OR {partial}
+        LIMIT :candidates
+    ) b
+    ORDER BY score DESC, b.id
+    LIMIT :limit
+"""
+
+
+def encode_offset(offset):
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode()
+
+
+def decode_offset(cursor):
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor.encode()))["offset"]
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError(cursor)
+        return offset
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def like_pattern(text):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return "%" + escaped + "%"
+
+
+def is_postgres(database):
+    return database.url.dialect in ("postgresql", "postgres")
+
+
+def _columns(table, alias):
+    return ", ".join(f"{alias}.{column.name}" for column in table.columns)
+
+
+def _fallback_query(table, text, limit, extra_filter=None):
+    pattern = like_pattern(text)
+    query = select([table, literal(0.0).label("score")]).where(
+        or_(table.c.title.ilike(pattern, escape="\\"), table.c.description.ilike(pattern, escape="\\"))
+    )
+    if extra_filter is not None:
+        query = query.where(extra_filter)
+    return query.order_by(table.c.id).limit(limit)
+
+
+async def search(database, text, assignee_keys, work_items, backlogs, kinds=SEARCH_KINDS, cursor=None, limit=20):
+    # assignee_keys scopes work items to the caller, as in GET /api/work-items
+    offset = decode_offset(cursor) if cursor else 0
+    if offset >= SEARCH_MAX_RESULTS:
+        return {"items": [], "next_cursor": None}
+    wanted = min(offset + limit + 1, SEARCH_MAX_RESULTS)
+
+    async def fetch(kind):
+        if not is_postgres(database):
+            if kind == "work_item":
+                return await database.fetch_all(_fallback_query(work_items, text, wanted, work_items.c.assignee_key.in_(assignee_keys)))
+            return await database.fetch_all(_fallback_query(backlogs, text, wanted))
+        values = {"q": text, "limit": wanted, "candidates": SEARCH_CANDIDATES}
+        partial = "FALSE"
+        if len(text) >= MIN_PARTIAL_LENGTH:
+            values["pattern"] = like_pattern(text)
+            partial = "{alias}.title ILIKE :pattern"
+        if kind == "work_item":
+            query = WORK_ITEM_SEARCH.format(columns=_columns(work_items, "wi"), partial=partial.format(alias="wi"))
+            return await database.fetch_all(query, {**values, "assignee_keys": assignee_keys})
+        query = BACKLOG_SEARCH.format(columns=_columns(backlogs, "b"), partial=partial.format(alias="b"))
+        return await database.fetch_all(query, values)
+
+    # Each kind runs as its own task, so on its own pooled connection
+    results = await asyncio.gather(*[fetch(kind) for kind in kinds])
+    hits = []
+    for kind, rows in zip(kinds, results):
+        for row in rows:
+            item = dict(row._mapping)
+            item["kind"] = kind
+            hits.append(item)
+
+    hits.sort(key=lambda hit: (-hit["score"], SEARCH_KINDS.index(hit["kind"]), hit["id"]))
+    page = hits[offset:offset + limit]
+    next_cursor = None
+    if len(hits) > offset + limit and offset + limit < SEARCH_MAX_RESULTS:
+        next_cursor = encode_offset(offset + limit)
+    return {"items": page, "next_cursor": next_cursor}
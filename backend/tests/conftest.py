@@ -0,0 +1,21 @@
+# Shared test setup: the backend on sys.path, and a local SQLite DATABASE_URL
+# unless one is set, so importing main never points at a real server. Tests
+# taking postgres_url run only when TEST_DATABASE_URL names a Postgres database
+# built from database/init.sql; they roll back what they write.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "")
+
+
+@pytest.fixture
+def postgres_url():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL not set")
+    return TEST_DATABASE_URL
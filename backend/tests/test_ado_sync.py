@@ -0,0 +1,119 @@
+# ado_sync pipeline driven by a fake work item client: ids are fetched in chunks
+# of ADO_BATCH_SIZE, each chunk is written with one INSERT ... ON CONFLICT (ado_id),
+# and with a watermark only the delta is queried and unchanged revisions skipped.
+
+import asyncio
+import contextlib
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from databases import Database
+from sqlalchemy.dialects import postgresql
+
+import ado_sync
+import main
+
+FIRST_ID = 5_000_000
+CHANGED = datetime(2024, 3, 1, 12, 0, 0)
+
+
+class FakeClient:
+    # query_by_wiql / get_work_items over count items; records every call
+    def __init__(self, count, title="Item", rev=1):
+        self.items = {
+            FIRST_ID + n: {
+                "System.Title": f"{title} {n}",
+                "System.State": "Active",
+                "System.WorkItemType": "Task",
+                "System.AssignedTo": {"uniqueName": "dev@example.com"},
+                "System.ChangedDate": (CHANGED + timedelta(minutes=n)).isoformat() + "Z",
+            }
+            for n in range(count)
+        }
+        self.rev = rev
+        self.wiql = []
+        self.fetched = []
+
+    def query_by_wiql(self, wiql, **kwargs):
+        self.wiql.append(wiql["query"])
+        return SimpleNamespace(work_items=[SimpleNamespace(id=item_id) for item_id in self.items])
+
+    def get_work_items(self, ids, fields=None, error_policy=None, **kwargs):
+        self.fetched.append(list(ids))
+        return [SimpleNamespace(id=item_id, rev=self.rev, fields=dict(self.items[item_id])) for item_id in ids]
+
+
+class RecordingDatabase:
+    # Keeps the statements ado_sync writes instead of running them; stored maps
+    # ado_id to the revision already synced
+    def __init__(self, stored=None):
+        self.statements = []
+        self.stored = stored or {}
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def execute(self, query):
+        self.statements.append(query)
+
+    async def fetch_all(self, query):
+        return [{"ado_id": ado_id, "ado_rev": rev} for ado_id, rev in self.stored.items()]
+
+
+async def project_one():
+    return 1
+
+
+def sync(database, client, watermark=None):
+    return asyncio.run(ado_sync.sync_work_items(
+        database, client, "SELECT [System.Id] FROM WorkItems", main.work_items, project_one, watermark=watermark,
+    ))
+
+
+def test_fetches_in_chunks_and_upserts_each_chunk_once():
+    database, client = RecordingDatabase(), FakeClient(450)
+    result = sync(database, client)
+
+    assert [len(ids) for ids in client.fetched] == [200, 200, 50]
+    assert result["synced_count"] == 450
+    assert len(database.statements) == 3
+    for statement in database.statements:
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (ado_id) DO UPDATE" in sql
+
+
+def test_watermark_queries_the_delta_and_skips_known_revisions():
+    watermark = CHANGED + timedelta(minutes=1)
+    database = RecordingDatabase(stored={str(FIRST_ID): 1, str(FIRST_ID + 1): 1})
+    client = FakeClient(3, rev=1)
+    result = sync(database, client, watermark)
+
+    # >=: items changed at the watermark instant are read again, then skipped
+    assert f"[System.ChangedDate] >= '{ado_sync.wiql_datetime(watermark)}'" in client.wiql[0]
+    assert result["skipped_count"] == 2
+    assert result["synced_count"] == 1
+    assert result["watermark"] == CHANGED + timedelta(minutes=2)
+
+
+def test_upsert_updates_existing_rows_postgres(postgres_url):
+    async def run():
+        # One connection, rolled back on disconnect
+        async with Database(postgres_url, force_rollback=True) as database:
+            project_id = await database.fetch_val("SELECT id FROM projects ORDER BY id LIMIT 1")
+
+            async def project():
+                return project_id
+
+            for title in ("First", "Second"):
+                await ado_sync.sync_work_items(
+                    database, FakeClient(3, title=title), "SELECT [System.Id] FROM WorkItems", main.work_items, project,
+                )
+            return await database.fetch_all(
+                "SELECT ado_id, title, created_at, updated_at FROM work_items WHERE ado_id = ANY(:ids) ORDER BY ado_id",
+                {"ids": [str(FIRST_ID + n) for n in range(3)]},
+            )
+
+    rows = asyncio.run(run())
+    assert [(row["ado_id"], row["title"]) for row in rows] == [(str(FIRST_ID + n), f"Second {n}") for n in range(3)]
+    assert all(row["created_at"] and row["updated_at"] for row in rows)
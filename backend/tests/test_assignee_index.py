@@ -0,0 +1,34 @@
+# The work item list's assignee filter must be served by idx_work_items_assignee
+# (assignee_key, updated_at, id), not a scan of work_items. Postgres only: set
+# TEST_DATABASE_URL to a database built from database/init.sql.
+
+import asyncio
+
+from databases import Database
+from sqlalchemy.dialects import postgresql
+
+import main
+from pagination import paginate
+
+
+def plan(postgres_url, query):
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+    async def run():
+        async with Database(postgres_url, force_rollback=True) as database:
+            async with database.transaction():
+                # The test database is small enough that a sequential scan would
+                # win; the question is only whether the index can be used
+                await database.execute("SET LOCAL enable_seqscan = off")
+                rows = await database.fetch_all("EXPLAIN " + sql)
+        return "\n".join(row[0] for row in rows)
+
+    return asyncio.run(run())
+
+
+def test_assignee_lookup_uses_assignee_key_index(postgres_url):
+    for keys in (("john.doe@example.com", ""), ("John.Doe@Example.com", "ClientUser")):
+        query = paginate(main.work_items_query(*keys), [main.work_items.c.updated_at, main.work_items.c.id], descending=True)
+        result = plan(postgres_url, query)
+        assert "idx_work_items_assignee" in result, result
+        assert "assignee_key" in result and "lower(" not in result, result
@@ -0,0 +1,136 @@
+# db.ReadRouter against a stub replica whose replication lag the test sets: reads
+# go to a healthy replica, a user who just wrote is pinned to the primary, and an
+# unreachable or lagging replica sends every read back to the primary until it
+# recovers.
+
+import asyncio
+from types import SimpleNamespace
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+import db
+import main
+
+
+class StubReplica:
+    # What ReadRouter.check uses of a databases.Database; lag None means unreachable
+    def __init__(self, lag=0.0):
+        self.lag = lag
+        self.is_connected = False
+
+    async def connect(self):
+        if self.lag is None:
+            raise ConnectionRefusedError("replica down")
+        self.is_connected = True
+
+    async def disconnect(self):
+        self.is_connected = False
+
+    async def fetch_val(self, query):
+        if self.lag is None:
+            raise ConnectionResetError("replica down")
+        return self.lag
+
+
+PRIMARY = object()
+
+
+def checked(router):
+    asyncio.run(router.check())
+    return router
+
+
+def test_reads_go_to_a_healthy_replica():
+    replica = StubReplica(lag=0.5)
+    router = checked(db.ReadRouter(PRIMARY, replica, max_lag=5))
+
+    assert router.healthy
+    assert router.database_for("dev@example.com") is replica
+    assert router.database_for() is replica
+    assert router.is_replica(replica) and not router.is_replica(PRIMARY)
+    assert router.snapshot()["reads"] == {"primary": 0, "replica": 2}
+
+
+def test_without_a_replica_reads_use_the_primary():
+    router = db.ReadRouter(PRIMARY)
+    router.pin("dev@example.com")
+    assert router.database_for("dev@example.com") is PRIMARY
+    assert not router.snapshot()["configured"]
+
+
+def test_pin_keeps_a_writer_on_the_primary():
+    replica = StubReplica()
+    router = checked(db.ReadRouter(PRIMARY, replica, pin_seconds=60))
+
+    router.pin("dev@example.com")
+    assert router.database_for("dev@example.com") is PRIMARY
+    # Only the user who wrote is pinned
+    assert router.database_for("other@example.com") is replica
+
+
+def test_pin_expires():
+    replica = StubReplica()
+    router = checked(db.ReadRouter(PRIMARY, replica, pin_seconds=0.05))
+
+    router.pin("dev@example.com")
+    assert router.database_for("dev@example.com") is PRIMARY
+    asyncio.run(asyncio.sleep(0.1))
+    assert router.database_for("dev@example.com") is replica
+
+
+def test_unreachable_replica_falls_back_to_the_primary_and_recovers():
+    replica = StubReplica()
+    router = checked(db.ReadRouter(PRIMARY, replica))
+    assert router.database_for() is replica
+
+    replica.lag = None
+    checked(router)
+    assert not router.healthy and router.lag is None
+    assert router.database_for() is PRIMARY
+    assert router.failovers == 1
+
+    replica.lag = 0.0
+    checked(router)
+    assert router.database_for() is replica
+
+
+def test_lagging_replica_falls_back_to_the_primary():
+    replica = StubReplica(lag=1.0)
+    router = checked(db.ReadRouter(PRIMARY, replica, max_lag=5))
+    assert router.database_for() is replica
+
+    replica.lag = 30.0
+    checked(router)
+    assert not router.healthy and router.lag == 30.0
+    assert router.database_for() is PRIMARY
+    assert router.failovers == 1
+
+
+def test_replica_down_at_startup_is_not_used():
+    router = checked(db.ReadRouter(PRIMARY, StubReplica(lag=None)))
+    assert router.database_for() is PRIMARY
+    # Never healthy, so not counted as a failover
+    assert router.failovers == 0
+
+
+def test_write_request_pins_the_caller(monkeypatch):
+    replica = StubReplica()
+    router = checked(db.ReadRouter(PRIMARY, replica, pin_seconds=60))
+    monkeypatch.setattr(main, "read_router", router)
+    for email in ("writer@example.com", "reader@example.com"):
+        main.identity_cache.set(email, main.Identity(1, email, "Dev", "developer", ""))
+
+    def request(method, email):
+        token = main.create_access_token({"sub": email})
+        request = SimpleNamespace(method=method, state=SimpleNamespace())
+        asyncio.run(main.get_identity(request, HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)))
+        return request
+
+    try:
+        assert main.reader(request("GET", "writer@example.com")) is replica
+        request("POST", "writer@example.com")
+        assert main.reader(request("GET", "writer@example.com")) is PRIMARY
+        assert main.reader(request("GET", "reader@example.com")) is replica
+    finally:
+        main.identity_cache.pop("writer@example.com")
+        main.identity_cache.pop("reader@example.com")
@@ -0,0 +1,50 @@
+# GET /api/search with backlogs.rank present: the relevance score must not
+# collide with it. Runs on SQLite (the LIKE fallback); set TEST_DATABASE_URL to a
+# Postgres database built from database/init.sql to also run the ranked queries.
+
+import asyncio
+
+import sqlalchemy
+from databases import Database
+
+import main
+from search import search
+
+
+async def run_search(database, text):
+    return await search(database, text, ["dev@example.com"], main.work_items, main.backlogs)
+
+
+def test_search_with_backlog_rank_sqlite(tmp_path):
+    url = f"sqlite:///{tmp_path}/search.db"
+    engine = sqlalchemy.create_engine(url)
+    main.metadata.create_all(engine, tables=[main.projects, main.work_items, main.backlogs])
+    with engine.begin() as connection:
+        connection.execute(main.work_items.insert().values(
+            id=1, title="Fix login timeout", assigned_to="dev@example.com",
+        ))
+        connection.execute(main.backlogs.insert().values(id=1, project_id=1, title="Login page redesign", rank="V"))
+
+    async def run():
+        async with Database(url) as database:
+            return await run_search(database, "login")
+
+    result = asyncio.run(run())
+    assert [(item["kind"], item["id"]) for item in result["items"]] == [("work_item", 1), ("backlog", 1)]
+    backlog = result["items"][1]
+    assert backlog["rank"] == "V"
+    assert backlog["score"] == 0.0
+
+
+def test_search_with_backlog_rank_postgres(postgres_url):
+    async def run():
+        # One connection, rolled back on disconnect
+        async with Database(postgres_url, force_rollback=True) as database:
+            project_id = await database.fetch_val("SELECT id FROM projects ORDER BY id LIMIT 1")
+            await database.execute(main.backlogs.insert().values(project_id=project_id, title="Zanzibar backlog"))
+            return await run_search(database, "zanzibar")
+
+    result = asyncio.run(run())
+    assert [item["kind"] for item in result["items"]] == ["backlog"]
+    assert result["items"][0]["rank"]
+    assert result["items"][0]["score"] > 0
@@ -0,0 +1,24 @@
+# import main in a fresh interpreter stays within benchmarks.startup's budget and
+# leaves the lazily loaded modules (openpyxl, numpy, the Azure DevOps SDK)
+# unimported. main.startup() is timed too when TEST_DATABASE_URL is set.
+
+import os
+
+from benchmarks.startup import IMPORT_BUDGET, LAZY_MODULES, STARTUP_BUDGET, probe
+
+
+def test_import_main_is_within_budget_and_lazy():
+    # The first interpreter compiles any stale bytecode, so it is not timed
+    probe(False)
+    result = probe(False)
+    assert {"numpy", "openpyxl"} <= set(LAZY_MODULES)
+    assert result["lazy_loaded"] == []
+    assert result["import"] < IMPORT_BUDGET
+
+
+def test_startup_is_within_budget(postgres_url):
+    env = {**os.environ, "DATABASE_URL": postgres_url}
+    probe(False, env)
+    result = probe(True, env)
+    assert result["lazy_loaded"] == []
+    assert result["startup"] < STARTUP_BUDGET
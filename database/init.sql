@@ -6,9 +6,18 @@ DROP TABLE IF EXISTS backlogs CASCADE;
 DROP TABLE IF EXISTS work_items CASCADE;
 DROP TABLE IF EXISTS projects CASCADE;
 DROP TABLE IF EXISTS azure_config CASCADE;
+DROP TABLE IF EXISTS azure_sync_state CASCADE;
+DROP TABLE IF EXISTS sync_jobs CASCADE;
+DROP TABLE IF EXISTS change_events CASCADE;
+DROP TABLE IF EXISTS user_daily_utilization CASCADE;
+DROP TABLE IF EXISTS project_daily_hours CASCADE;
+DROP TABLE IF EXISTS task_progress_archives CASCADE;
 DROP TABLE IF EXISTS users CASCADE;
 DROP TABLE IF EXISTS user_client_id_map CASCADE;
 
+-- Trigram indexes for partial-word search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Users table
 CREATE TABLE users (
     id SERIAL PRIMARY KEY,
@@ -27,7 +36,7 @@ CREATE TABLE IF NOT EXISTS user_client_id_map
     client_user_id character varying(255),
     active boolean NOT NULL DEFAULT true,
     CONSTRAINT user_client_id_map_pkey PRIMARY KEY (id)
-)
+);
 
 -- Projects table
 CREATE TABLE projects (
@@ -50,39 +59,58 @@ CREATE TABLE work_items (
     priority VARCHAR(50) DEFAULT 'medium',
     status VARCHAR(50) DEFAULT 'new',
     assigned_to VARCHAR(255),
+    -- Normalized assignee (email or ADO unique name) used for all assignee lookups
+    assignee_key VARCHAR(255) GENERATED ALWAYS AS (lower(assigned_to)) STORED,
     start_date DATE,
     end_date DATE,
     estimated_hours FLOAT DEFAULT 0.0,
     actual_hours FLOAT DEFAULT 0.0,
     t_shirt_size VARCHAR(10),
     ado_id VARCHAR(100),
+    ado_rev INTEGER,
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    -- Sort key of the work item lists (keyset pagination), so never NULL
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Backlogs table
 CREATE TABLE backlogs (
     id SERIAL PRIMARY KEY,
-    project_id INTEGER REFERENCES projects(id) ON DELETE CASCADE,
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
     title VARCHAR(500) NOT NULL,
     description TEXT,
     priority INTEGER DEFAULT 0,
     status VARCHAR(50) DEFAULT 'new',
     created_by VARCHAR(255),
+    -- Order within the project (see "Backlog order" below)
+    rank TEXT COLLATE "C" NOT NULL,
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Task Progress table
+-- Partitioned by month on date (see "task_progress partitions" below)
 CREATE TABLE task_progress (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     work_item_id INTEGER REFERENCES work_items(id) ON DELETE CASCADE,
     user_email VARCHAR(255),
     hours_worked FLOAT,
     progress_percentage FLOAT,
     notes TEXT,
-    date DATE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    date DATE NOT NULL DEFAULT CURRENT_DATE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date);
+
+-- Dates no monthly partition covers yet
+CREATE TABLE task_progress_default PARTITION OF task_progress DEFAULT;
 
 -- Azure DevOps Configuration table
 CREATE TABLE azure_config (
@@ -94,15 +122,609 @@ CREATE TABLE azure_config (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Azure DevOps sync watermark per configuration and client user
+CREATE TABLE azure_sync_state (
+    id SERIAL PRIMARY KEY,
+    config_id INTEGER NOT NULL REFERENCES azure_config(id) ON DELETE CASCADE,
+    client_user_id VARCHAR(255) NOT NULL,
+    watermark TIMESTAMP,
+    last_synced_at TIMESTAMP,
+    UNIQUE (config_id, client_user_id)
+);
+
+-- Background Azure DevOps sync jobs
+CREATE TABLE sync_jobs (
+    id SERIAL PRIMARY KEY,
+    config_id INTEGER NOT NULL REFERENCES azure_config(id) ON DELETE CASCADE,
+    client_user_id VARCHAR(255) NOT NULL,
+    requested_by VARCHAR(255),
+    full_resync BOOLEAN DEFAULT FALSE,
+    status VARCHAR(20) DEFAULT 'queued',
+    phase VARCHAR(20),
+    items_total INTEGER DEFAULT 0,
+    items_processed INTEGER DEFAULT 0,
+    synced_count INTEGER,
+    skipped_count INTEGER,
+    throughput FLOAT,
+    timings TEXT,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- At most one queued/running sync per config and client user
+CREATE UNIQUE INDEX idx_sync_jobs_active ON sync_jobs(config_id, client_user_id)
+    WHERE status IN ('queued', 'running');
+
+-- Change feed behind GET /api/changes; the id is the clients' resume token
+CREATE TABLE change_events (
+    id BIGSERIAL PRIMARY KEY,
+    resource VARCHAR(50) NOT NULL,
+    action VARCHAR(20) NOT NULL,
+    item_id INTEGER,
+    -- assignee keys of the users who may see the event; NULL for everyone
+    scope_keys TEXT[],
+    data TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_change_events_created ON change_events(created_at);
+
 -- Create indexes for better performance
 CREATE INDEX idx_work_items_project ON work_items(project_id);
-CREATE INDEX idx_work_items_assigned ON work_items(assigned_to);
+CREATE INDEX idx_work_items_assignee ON work_items(assignee_key, updated_at, id);
 CREATE INDEX idx_work_items_status ON work_items(status);
+CREATE UNIQUE INDEX idx_work_items_ado_id ON work_items(ado_id);
 CREATE INDEX idx_backlogs_project ON backlogs(project_id);
 CREATE INDEX idx_task_progress_work_item ON task_progress(work_item_id);
 CREATE INDEX idx_task_progress_user ON task_progress(user_email);
 CREATE INDEX idx_task_progress_date ON task_progress(date);
 
+-- Keyset pagination and list filters
+CREATE INDEX idx_work_items_updated ON work_items(updated_at, id);
+CREATE INDEX idx_work_items_project_updated ON work_items(project_id, updated_at, id);
+CREATE INDEX idx_work_items_status_updated ON work_items(status, updated_at, id);
+CREATE INDEX idx_work_items_type_updated ON work_items(type, updated_at, id);
+CREATE INDEX idx_backlogs_project_rank ON backlogs(project_id, rank, id);
+CREATE INDEX idx_task_progress_work_item_date ON task_progress(work_item_id, date, id);
+
+-- Search (GET /api/search)
+CREATE INDEX idx_work_items_search ON work_items USING gin(search_vector);
+CREATE INDEX idx_work_items_title_trgm ON work_items USING gin(title gin_trgm_ops);
+CREATE INDEX idx_backlogs_search ON backlogs USING gin(search_vector);
+CREATE INDEX idx_backlogs_title_trgm ON backlogs USING gin(title gin_trgm_ops);
+
+-- Per-user, per-day utilization rollup behind /api/reports/utilization
+--   task_progress rows count on their date for the user who logged them;
+--   work items count on their start date (created date when unset) for their assignee.
+-- Triggers on task_progress and work_items recompute only the (user, day) cells a
+-- statement touched; rebuild_user_daily_utilization() recomputes everything.
+CREATE TABLE user_daily_utilization (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    hours_worked FLOAT NOT NULL DEFAULT 0,
+    progress_sum FLOAT NOT NULL DEFAULT 0,
+    progress_entries INTEGER NOT NULL DEFAULT 0,
+    tasks_touched INTEGER NOT NULL DEFAULT 0,
+    tasks_assigned INTEGER NOT NULL DEFAULT 0,
+    estimated_hours FLOAT NOT NULL DEFAULT 0,
+    actual_hours FLOAT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+
+CREATE INDEX idx_user_daily_utilization_day ON user_daily_utilization(day);
+
+-- Every value of work_items.assigned_to that identifies a user
+CREATE OR REPLACE VIEW user_assignee_keys AS
+SELECT id AS user_id, lower(email) AS assignee_key FROM users
+UNION
+SELECT user_id, lower(client_user_id) FROM user_client_id_map
+WHERE active AND client_user_id IS NOT NULL AND client_user_id <> '';
+
+CREATE OR REPLACE FUNCTION refresh_user_daily_utilization(p_user_ids INTEGER[], p_days DATE[])
+RETURNS void AS $$
+BEGIN
+    WITH keys AS (
+        SELECT DISTINCT k.user_id, k.day
+        FROM unnest(p_user_ids, p_days) AS k(user_id, day)
+        WHERE k.user_id IS NOT NULL AND k.day IS NOT NULL
+          -- Archived months keep the rollup rows they were archived with
+          AND NOT EXISTS (SELECT 1 FROM task_progress_archives a WHERE a.month = date_trunc('month', k.day))
+    ),
+    progress AS (
+        SELECT k.user_id, k.day,
+               COALESCE(SUM(tp.hours_worked), 0) AS hours_worked,
+               COALESCE(SUM(tp.progress_percentage), 0) AS progress_sum,
+               COUNT(tp.progress_percentage) AS progress_entries,
+               COUNT(DISTINCT tp.work_item_id) AS tasks_touched
+        FROM keys k
+        JOIN users u ON u.id = k.user_id
+        LEFT JOIN task_progress tp ON tp.user_email = u.email AND tp.date = k.day
+        GROUP BY k.user_id, k.day
+    ),
+    assigned AS (
+        SELECT k.user_id, k.day,
+               COUNT(wi.id) AS tasks_assigned,
+               COALESCE(SUM(wi.estimated_hours), 0) AS estimated_hours,
+               COALESCE(SUM(wi.actual_hours), 0) AS actual_hours
+        FROM keys k
+        LEFT JOIN user_assignee_keys a ON a.user_id = k.user_id
+        LEFT JOIN work_items wi ON wi.assignee_key = a.assignee_key
+            AND COALESCE(wi.start_date, wi.created_at::date) = k.day
+        GROUP BY k.user_id, k.day
+    ),
+    cells AS (
+        SELECT p.user_id, p.day, p.hours_worked, p.progress_sum, p.progress_entries, p.tasks_touched,
+               a.tasks_assigned, a.estimated_hours, a.actual_hours
+        FROM progress p
+        JOIN assigned a ON a.user_id = p.user_id AND a.day = p.day
+    ),
+    removed AS (
+        DELETE FROM user_daily_utilization r
+        USING cells c
+        WHERE r.user_id = c.user_id AND r.day = c.day
+          AND c.progress_entries = 0 AND c.tasks_touched = 0 AND c.tasks_assigned = 0
+    )
+    INSERT INTO user_daily_utilization AS r (user_id, day, hours_worked, progress_sum, progress_entries,
+                                             tasks_touched, tasks_assigned, estimated_hours, actual_hours)
+    SELECT user_id, day, hours_worked, progress_sum, progress_entries,
+           tasks_touched, tasks_assigned, estimated_hours, actual_hours
+    FROM cells
+    WHERE progress_entries > 0 OR tasks_touched > 0 OR tasks_assigned > 0
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        hours_worked = EXCLUDED.hours_worked,
+        progress_sum = EXCLUDED.progress_sum,
+        progress_entries = EXCLUDED.progress_entries,
+        tasks_touched = EXCLUDED.tasks_touched,
+        tasks_assigned = EXCLUDED.tasks_assigned,
+        estimated_hours = EXCLUDED.estimated_hours,
+        actual_hours = EXCLUDED.actual_hours;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Full rebuild, or of one user's rows (e.g. after their client mapping changed)
+CREATE OR REPLACE FUNCTION rebuild_user_daily_utilization(p_user_id INTEGER DEFAULT NULL)
+RETURNS void AS $$
+BEGIN
+    DELETE FROM user_daily_utilization r
+    WHERE (p_user_id IS NULL OR r.user_id = p_user_id)
+      AND NOT EXISTS (SELECT 1 FROM task_progress_archives a WHERE a.month = date_trunc('month', r.day));
+    PERFORM refresh_user_daily_utilization(array_agg(k.user_id), array_agg(k.day))
+    FROM (
+        SELECT u.id AS user_id, tp.date AS day
+        FROM task_progress tp JOIN users u ON u.email = tp.user_email
+        WHERE p_user_id IS NULL OR u.id = p_user_id
+        UNION
+        SELECT a.user_id, COALESCE(wi.start_date, wi.created_at::date)
+        FROM work_items wi JOIN user_assignee_keys a ON a.assignee_key = wi.assignee_key
+        WHERE p_user_id IS NULL OR a.user_id = p_user_id
+    ) k;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_progress_rollup_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_user_daily_utilization(array_agg(u.id), array_agg(c.date))
+        FROM (SELECT DISTINCT user_email, date FROM new_rows) c JOIN users u ON u.email = c.user_email;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_user_daily_utilization(array_agg(u.id), array_agg(c.date))
+        FROM (SELECT DISTINCT user_email, date FROM old_rows) c JOIN users u ON u.email = c.user_email;
+    ELSE
+        PERFORM refresh_user_daily_utilization(array_agg(u.id), array_agg(c.date))
+        FROM (SELECT user_email, date FROM new_rows UNION SELECT user_email, date FROM old_rows) c
+        JOIN users u ON u.email = c.user_email;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION work_items_rollup_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_user_daily_utilization(array_agg(a.user_id), array_agg(c.day))
+        FROM (SELECT DISTINCT assignee_key, COALESCE(start_date, created_at::date) AS day FROM new_rows) c
+        JOIN user_assignee_keys a ON a.assignee_key = c.assignee_key;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_user_daily_utilization(array_agg(a.user_id), array_agg(c.day))
+        FROM (SELECT DISTINCT assignee_key, COALESCE(start_date, created_at::date) AS day FROM old_rows) c
+        JOIN user_assignee_keys a ON a.assignee_key = c.assignee_key;
+    ELSE
+        -- Only rows whose rollup inputs changed: a status or title edit touches no cell
+        PERFORM refresh_user_daily_utilization(array_agg(a.user_id), array_agg(c.day))
+        FROM (
+            SELECT DISTINCT x.assignee_key, x.day
+            FROM old_rows o
+            JOIN new_rows n ON n.id = o.id
+                AND (n.assignee_key, n.start_date, n.created_at, n.estimated_hours, n.actual_hours)
+                    IS DISTINCT FROM (o.assignee_key, o.start_date, o.created_at, o.estimated_hours, o.actual_hours)
+            CROSS JOIN LATERAL (VALUES
+                (o.assignee_key, COALESCE(o.start_date, o.created_at::date)),
+                (n.assignee_key, COALESCE(n.start_date, n.created_at::date))
+            ) AS x(assignee_key, day)
+        ) c
+        JOIN user_assignee_keys a ON a.assignee_key = c.assignee_key;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER task_progress_rollup_insert AFTER INSERT ON task_progress
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_rollup_trigger();
+CREATE TRIGGER task_progress_rollup_update AFTER UPDATE ON task_progress
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_rollup_trigger();
+CREATE TRIGGER task_progress_rollup_delete AFTER DELETE ON task_progress
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_rollup_trigger();
+
+CREATE TRIGGER work_items_rollup_insert AFTER INSERT ON work_items
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION work_items_rollup_trigger();
+CREATE TRIGGER work_items_rollup_update AFTER UPDATE ON work_items
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION work_items_rollup_trigger();
+CREATE TRIGGER work_items_rollup_delete AFTER DELETE ON work_items
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION work_items_rollup_trigger();
+
+-- Per-project, per-day hours logged, behind the project view of
+-- /api/reports/utilization/timeseries: task_progress rows count on their date for
+-- the project of their work item. Triggers on task_progress, and on work_items when
+-- an item moves to another project, recompute only the (project, day) cells a
+-- statement touched; rebuild_project_daily_hours() recomputes everything.
+CREATE TABLE project_daily_hours (
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    hours_worked FLOAT NOT NULL DEFAULT 0,
+    progress_entries INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (project_id, day)
+);
+
+CREATE INDEX idx_project_daily_hours_day ON project_daily_hours(day);
+
+CREATE OR REPLACE FUNCTION refresh_project_daily_hours(p_project_ids INTEGER[], p_days DATE[])
+RETURNS void AS $$
+BEGIN
+    WITH keys AS (
+        SELECT DISTINCT k.project_id, k.day
+        FROM unnest(p_project_ids, p_days) AS k(project_id, day)
+        WHERE k.project_id IS NOT NULL AND k.day IS NOT NULL
+          -- Archived months keep the rollup rows they were archived with
+          AND NOT EXISTS (SELECT 1 FROM task_progress_archives a WHERE a.month = date_trunc('month', k.day))
+    ),
+    -- One pass over the days touched rather than a query per cell
+    logged AS (
+        SELECT wi.project_id, tp.date AS day,
+               COALESCE(SUM(tp.hours_worked), 0) AS hours_worked,
+               COUNT(*) AS progress_entries
+        FROM task_progress tp
+        JOIN work_items wi ON wi.id = tp.work_item_id
+        WHERE tp.date IN (SELECT day FROM keys) AND wi.project_id IN (SELECT project_id FROM keys)
+        GROUP BY wi.project_id, tp.date
+    ),
+    cells AS (
+        SELECT k.project_id, k.day,
+               COALESCE(l.hours_worked, 0) AS hours_worked,
+               COALESCE(l.progress_entries, 0) AS progress_entries
+        FROM keys k
+        LEFT JOIN logged l ON l.project_id = k.project_id AND l.day = k.day
+    ),
+    removed AS (
+        DELETE FROM project_daily_hours r
+        USING cells c
+        WHERE r.project_id = c.project_id AND r.day = c.day AND c.progress_entries = 0
+    )
+    INSERT INTO project_daily_hours AS r (project_id, day, hours_worked, progress_entries)
+    SELECT project_id, day, hours_worked, progress_entries
+    FROM cells
+    WHERE progress_entries > 0
+    ON CONFLICT (project_id, day) DO UPDATE SET
+        hours_worked = EXCLUDED.hours_worked,
+        progress_entries = EXCLUDED.progress_entries;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rebuild_project_daily_hours()
+RETURNS void AS $$
+BEGIN
+    DELETE FROM project_daily_hours r
+    WHERE NOT EXISTS (SELECT 1 FROM task_progress_archives a WHERE a.month = date_trunc('month', r.day));
+    INSERT INTO project_daily_hours (project_id, day, hours_worked, progress_entries)
+    SELECT wi.project_id, tp.date, COALESCE(SUM(tp.hours_worked), 0), COUNT(*)
+    FROM task_progress tp
+    JOIN work_items wi ON wi.id = tp.work_item_id
+    WHERE wi.project_id IS NOT NULL AND tp.date IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM task_progress_archives a WHERE a.month = date_trunc('month', tp.date))
+    GROUP BY wi.project_id, tp.date;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_progress_project_rollup_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_project_daily_hours(array_agg(wi.project_id), array_agg(c.date))
+        FROM (SELECT DISTINCT work_item_id, date FROM new_rows) c JOIN work_items wi ON wi.id = c.work_item_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        -- Rows deleted along with their work item no longer say which project they
+        -- counted for, so every project with hours on their days is recomputed
+        PERFORM refresh_project_daily_hours(array_agg(k.project_id), array_agg(k.day))
+        FROM (
+            SELECT wi.project_id, c.date AS day
+            FROM (SELECT DISTINCT work_item_id, date FROM old_rows) c JOIN work_items wi ON wi.id = c.work_item_id
+            UNION
+            SELECT r.project_id, r.day
+            FROM project_daily_hours r
+            WHERE r.day IN (
+                SELECT o.date FROM old_rows o
+                WHERE NOT EXISTS (SELECT 1 FROM work_items wi WHERE wi.id = o.work_item_id)
+            )
+        ) k;
+    ELSE
+        PERFORM refresh_project_daily_hours(array_agg(wi.project_id), array_agg(c.date))
+        FROM (SELECT work_item_id, date FROM new_rows UNION SELECT work_item_id, date FROM old_rows) c
+        JOIN work_items wi ON wi.id = c.work_item_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- A work item moved to another project takes its logged hours with it
+CREATE OR REPLACE FUNCTION work_items_project_rollup_trigger()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM refresh_project_daily_hours(array_agg(k.project_id), array_agg(k.day))
+    FROM (
+        SELECT DISTINCT p.project_id, tp.date AS day
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id AND n.project_id IS DISTINCT FROM o.project_id
+        CROSS JOIN LATERAL (VALUES (o.project_id), (n.project_id)) AS p(project_id)
+        JOIN task_progress tp ON tp.work_item_id = o.id
+    ) k;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER task_progress_project_rollup_insert AFTER INSERT ON task_progress
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_project_rollup_trigger();
+CREATE TRIGGER task_progress_project_rollup_update AFTER UPDATE ON task_progress
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_project_rollup_trigger();
+CREATE TRIGGER task_progress_project_rollup_delete AFTER DELETE ON task_progress
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_project_rollup_trigger();
+CREATE TRIGGER work_items_project_rollup_update AFTER UPDATE ON work_items
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION work_items_project_rollup_trigger();
+
+-- task_progress partitions
+--   task_progress_pYYYY_MM holds the rows dated in that month; task_progress_default
+--   any date no partition covers yet. ensure_task_progress_partitions() (run by the
+--   backend, see partitions.py) creates the coming months' partitions and moves
+--   rows out of the default partition into partitions of their own.
+-- Old months can be detached and archived to files (partitions.py). The rollups
+-- keep the hours of an archived month: task_progress_archives lists those months,
+-- and the refresh and rebuild functions leave their rollup rows alone until the
+-- month is restored.
+CREATE TABLE task_progress_archives (
+    month DATE PRIMARY KEY,
+    file VARCHAR(500) NOT NULL,
+    -- NULL while the month is being written out
+    row_count INTEGER,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION task_progress_partition_name(p_month DATE)
+RETURNS TEXT AS $$
+    SELECT 'task_progress_p' || to_char(p_month, 'YYYY_MM');
+$$ LANGUAGE sql IMMUTABLE;
+
+-- The partition for the month of p_month, if there is none yet
+CREATE OR REPLACE FUNCTION create_task_progress_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_month DATE := date_trunc('month', p_month);
+    v_next DATE := date_trunc('month', p_month) + interval '1 month';
+    v_name TEXT := task_progress_partition_name(v_month);
+BEGIN
+    -- One caller at a time (every API process runs the maintenance)
+    PERFORM pg_advisory_xact_lock(hashtext('task_progress_partitions'));
+    -- A table of that name that is not attached is a month being archived
+    IF to_regclass(v_name) IS NOT NULL THEN
+        RETURN v_name;
+    END IF;
+    IF EXISTS (SELECT 1 FROM task_progress_default WHERE date >= v_month AND date < v_next) THEN
+        -- A range can only be attached once no row of it is left in the default
+        -- partition, so the month's rows are moved to the new table first
+        LOCK TABLE task_progress_default IN EXCLUSIVE MODE;
+        EXECUTE format('CREATE TABLE %I (LIKE task_progress INCLUDING DEFAULTS)', v_name);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM task_progress_default WHERE date >= %L AND date < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            v_month, v_next, v_name
+        );
+        EXECUTE format('ALTER TABLE task_progress ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', v_name, v_month, v_next);
+    ELSE
+        EXECUTE format('CREATE TABLE %I PARTITION OF task_progress FOR VALUES FROM (%L) TO (%L)', v_name, v_month, v_next);
+    END IF;
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions for this month and the next p_months_ahead, and for every month
+-- with rows in the default partition
+CREATE OR REPLACE FUNCTION ensure_task_progress_partitions(p_months_ahead INTEGER DEFAULT 3)
+RETURNS void AS $$
+BEGIN
+    PERFORM create_task_progress_partition(CAST(m AS date))
+    FROM generate_series(
+        date_trunc('month', CURRENT_DATE),
+        date_trunc('month', CURRENT_DATE) + make_interval(months => p_months_ahead),
+        interval '1 month'
+    ) m;
+    PERFORM create_task_progress_partition(m)
+    FROM (SELECT DISTINCT CAST(date_trunc('month', date) AS date) AS m FROM task_progress_default) d;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backlog order
+--   backlogs.rank orders a project's backlog: base-62 digit strings compared
+--   bytewise (COLLATE "C") that never end in '0', so there is always a key
+--   between two others. Moving an item (POST /api/backlogs/{id}/move) rewrites
+--   only its own rank; new items, and items moved to another project, go to the
+--   end of the project. Keys grow by a digit every few moves into the same gap;
+--   rebalance_backlog_ranks() (run by the backend, see ranks.py) respaces a
+--   project's keys. Rank changes of a project take its advisory lock. Lists
+--   across projects read (project_id, rank, id), so every item has a project.
+
+-- A key sorting strictly between p_lower and p_upper (NULL: no bound)
+CREATE OR REPLACE FUNCTION backlog_rank_between(p_lower TEXT, p_upper TEXT)
+RETURNS TEXT AS $$
+DECLARE
+    digits CONSTANT TEXT := '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz';
+    lower_key TEXT := COALESCE(p_lower, '');
+    upper_key TEXT := p_upper;
+    prefix TEXT := '';
+    key TEXT;
+    i INTEGER;
+    low INTEGER;
+    high INTEGER;
+BEGIN
+    IF p_lower COLLATE "C" >= p_upper COLLATE "C" THEN
+        RAISE EXCEPTION 'backlog rank % is not below %', p_lower, p_upper;
+    END IF;
+    IF p_lower IS NULL AND p_upper IS NULL THEN
+        RETURN 'V';
+    END IF;
+    IF p_lower IS NOT NULL AND p_upper IS NULL THEN
+        -- After the last key: one more at its width, carrying (digits after a 'z'
+        -- wrap to '0'); past all 'z's the width doubles, so appends lengthen
+        -- keys logarithmically
+        key := p_lower;
+        LOOP
+            i := length(key);
+            WHILE i > 0 AND substr(key, i, 1) = 'z' LOOP
+                key := overlay(key PLACING '0' FROM i FOR 1);
+                i := i - 1;
+            END LOOP;
+            IF i = 0 THEN
+                RETURN p_lower || repeat('0', length(p_lower) - 1) || '1';
+            END IF;
+            key := overlay(key PLACING substr(digits, strpos(digits, substr(key, i, 1)) + 1, 1) FROM i FOR 1);
+            EXIT WHEN right(key, 1) <> '0';
+        END LOOP;
+        RETURN key;
+    END IF;
+    IF p_lower IS NULL AND p_upper IS NOT NULL THEN
+        -- Before the first key: one less at its width, borrowing; below all '0's
+        -- the width doubles
+        key := p_upper;
+        LOOP
+            i := length(key);
+            WHILE i > 0 AND substr(key, i, 1) = '0' LOOP
+                key := overlay(key PLACING 'z' FROM i FOR 1);
+                i := i - 1;
+            END LOOP;
+            IF i = 0 THEN
+                RETURN repeat('0', length(p_upper)) || repeat('z', length(p_upper));
+            END IF;
+            key := overlay(key PLACING substr(digits, strpos(digits, substr(key, i, 1)) - 1, 1) FROM i FOR 1);
+            EXIT WHEN right(key, 1) <> '0';
+        END LOOP;
+        RETURN key;
+    END IF;
+    -- Between: the common prefix (lower padded with '0'), then the middle digit of
+    -- the first that differ, or one more digit when they are adjacent
+    i := 1;
+    WHILE i <= length(upper_key) AND COALESCE(NULLIF(substr(lower_key, i, 1), ''), '0') = substr(upper_key, i, 1) LOOP
+        i := i + 1;
+    END LOOP;
+    prefix := substr(upper_key, 1, i - 1);
+    lower_key := substr(lower_key, i);
+    upper_key := substr(upper_key, i);
+    LOOP
+        low := CASE WHEN lower_key = '' THEN 0 ELSE strpos(digits, substr(lower_key, 1, 1)) - 1 END;
+        high := CASE WHEN upper_key IS NULL THEN 62 ELSE strpos(digits, substr(upper_key, 1, 1)) - 1 END;
+        IF high - low > 1 THEN
+            RETURN prefix || substr(digits, (low + high) / 2 + 1, 1);
+        END IF;
+        IF length(upper_key) > 1 THEN
+            RETURN prefix || substr(upper_key, 1, 1);
+        END IF;
+        prefix := prefix || substr(digits, low + 1, 1);
+        lower_key := substr(lower_key, 2);
+        upper_key := NULL;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- The key of the p_position-th (from 1) of p_total items spaced evenly over the
+-- middle half of the key space, at least 62 apart: short keys with room around
+-- every one, and above and below the list
+CREATE OR REPLACE FUNCTION backlog_rank_spread(p_position BIGINT, p_total BIGINT)
+RETURNS TEXT AS $$
+DECLARE
+    digits CONSTANT TEXT := '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz';
+    width INTEGER := 1;
+    span NUMERIC := 62;
+    value NUMERIC;
+    key TEXT := '';
+BEGIN
+    WHILE span < (p_total + 1) * 62 * 2 LOOP
+        width := width + 1;
+        span := span * 62;
+    END LOOP;
+    value := span / 4 + floor(p_position * (span / 2) / (p_total + 1));
+    FOR i IN 1..width LOOP
+        key := substr(digits, (value % 62)::INTEGER + 1, 1) || key;
+        value := floor(value / 62);
+    END LOOP;
+    RETURN rtrim(key, '0');
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION lock_backlog_ranks(p_project_id INTEGER)
+RETURNS void AS $$
+    SELECT pg_advisory_xact_lock(hashtext('backlog_ranks'), p_project_id);
+$$ LANGUAGE sql;
+
+-- Respaces a project's keys in their current order; returns the number of items
+CREATE OR REPLACE FUNCTION rebalance_backlog_ranks(p_project_id INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    moved INTEGER;
+BEGIN
+    PERFORM lock_backlog_ranks(p_project_id);
+    UPDATE backlogs b SET rank = backlog_rank_spread(r.position, r.total)
+    FROM (
+        SELECT id, row_number() OVER (ORDER BY rank, id) AS position, count(*) OVER () AS total
+        FROM backlogs
+        WHERE project_id = p_project_id
+    ) r
+    WHERE b.id = r.id;
+    GET DIAGNOSTICS moved = ROW_COUNT;
+    RETURN moved;
+END;
+$$ LANGUAGE plpgsql;
+
+-- New items, and items moved to another project, go to the end of the project
+CREATE OR REPLACE FUNCTION backlogs_rank_trigger()
+RETURNS trigger AS $$
+DECLARE
+    last_rank TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.rank IS NOT NULL THEN
+        RETURN NEW;
+    END IF;
+    IF TG_OP = 'UPDATE' AND (NEW.project_id = OLD.project_id OR NEW.rank IS DISTINCT FROM OLD.rank) THEN
+        RETURN NEW;
+    END IF;
+    PERFORM lock_backlog_ranks(NEW.project_id);
+    SELECT max(rank) INTO last_rank FROM backlogs WHERE project_id = NEW.project_id;
+    NEW.rank := backlog_rank_between(last_rank, NULL);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER backlogs_rank BEFORE INSERT OR UPDATE OF project_id ON backlogs
+    FOR EACH ROW EXECUTE FUNCTION backlogs_rank_trigger();
+
 -- Insert sample data
 -- Sample users
 INSERT INTO users (email, name, password_hash, role) VALUES
@@ -165,6 +787,9 @@ INSERT INTO task_progress (work_item_id, user_email, hours_worked, progress_perc
     (12, 'mike.johnson@example.com', 40, 40, 'Migrated user and auth endpoints', '2023-12-15'),
     (12, 'mike.johnson@example.com', 35, 62, 'Migrated product and order endpoints', '2024-01-30');
 
+-- Monthly partitions for the sample progress and the coming months
+SELECT ensure_task_progress_partitions(3);
+
 -- Create a view for easy reporting
 CREATE OR REPLACE VIEW utilization_summary AS
 SELECT 
@@ -182,7 +807,7 @@ SELECT
         ELSE 0 
     END as utilization_percentage
 FROM users u
-LEFT JOIN work_items wi ON wi.assigned_to = u.email
+LEFT JOIN work_items wi ON wi.assignee_key = lower(u.email)
 GROUP BY u.email, u.name, u.role;
 
 -- Create a view for project summary
@@ -0,0 +1,3 @@
+-- Unique index backing the Azure DevOps sync upsert (INSERT ... ON CONFLICT (ado_id))
+-- Manually created work items keep a NULL ado_id, which the unique index allows.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_work_items_ado_id ON work_items(ado_id);
@@ -0,0 +1,12 @@
+-- Incremental Azure DevOps sync: last synced revision per work item and a
+-- System.ChangedDate watermark per configuration and client user
+ALTER TABLE work_items ADD COLUMN IF NOT EXISTS ado_rev INTEGER;
+
+CREATE TABLE IF NOT EXISTS azure_sync_state (
+    id SERIAL PRIMARY KEY,
+    config_id INTEGER NOT NULL REFERENCES azure_config(id) ON DELETE CASCADE,
+    client_user_id VARCHAR(255) NOT NULL,
+    watermark TIMESTAMP,
+    last_synced_at TIMESTAMP,
+    UNIQUE (config_id, client_user_id)
+);
@@ -0,0 +1,24 @@
+-- Background Azure DevOps sync jobs
+CREATE TABLE IF NOT EXISTS sync_jobs (
+    id SERIAL PRIMARY KEY,
+    config_id INTEGER NOT NULL REFERENCES azure_config(id) ON DELETE CASCADE,
+    client_user_id VARCHAR(255) NOT NULL,
+    requested_by VARCHAR(255),
+    full_resync BOOLEAN DEFAULT FALSE,
+    status VARCHAR(20) DEFAULT 'queued',
+    phase VARCHAR(20),
+    items_total INTEGER DEFAULT 0,
+    items_processed INTEGER DEFAULT 0,
+    synced_count INTEGER,
+    skipped_count INTEGER,
+    throughput FLOAT,
+    timings TEXT,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- At most one queued/running sync per config and client user
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_jobs_active ON sync_jobs(config_id, client_user_id)
+    WHERE status IN ('queued', 'running');
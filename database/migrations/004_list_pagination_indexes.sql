@@ -0,0 +1,15 @@
+-- Keyset pagination and list filters
+-- Work item lists page by (updated_at, id); a NULL updated_at sorts first and
+-- makes a cursor whose key is NULL match no rows, ending pagination early.
+-- Rows without one take their created_at (or now), and the column becomes NOT NULL.
+UPDATE work_items SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL;
+ALTER TABLE work_items ALTER COLUMN updated_at SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE work_items ALTER COLUMN updated_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_work_items_updated ON work_items(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_work_items_project_updated ON work_items(project_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_work_items_status_updated ON work_items(status, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_work_items_type_updated ON work_items(type, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_backlogs_priority ON backlogs(priority, id);
+CREATE INDEX IF NOT EXISTS idx_backlogs_project_priority ON backlogs(project_id, priority, id);
+CREATE INDEX IF NOT EXISTS idx_task_progress_work_item_date ON task_progress(work_item_id, date, id);
@@ -0,0 +1,169 @@
+-- Per-user, per-day utilization rollup behind /api/reports/utilization
+--   task_progress rows count on their date for the user who logged them;
+--   work items count on their start date (created date when unset) for their assignee.
+-- Triggers on task_progress and work_items recompute only the (user, day) cells a
+-- statement touched; rebuild_user_daily_utilization() recomputes everything.
+CREATE TABLE IF NOT EXISTS user_daily_utilization (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    hours_worked FLOAT NOT NULL DEFAULT 0,
+    progress_sum FLOAT NOT NULL DEFAULT 0,
+    progress_entries INTEGER NOT NULL DEFAULT 0,
+    tasks_touched INTEGER NOT NULL DEFAULT 0,
+    tasks_assigned INTEGER NOT NULL DEFAULT 0,
+    estimated_hours FLOAT NOT NULL DEFAULT 0,
+    actual_hours FLOAT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_daily_utilization_day ON user_daily_utilization(day);
+CREATE INDEX IF NOT EXISTS idx_work_items_assigned_lower ON work_items(lower(assigned_to));
+
+-- Every value of work_items.assigned_to that identifies a user
+CREATE OR REPLACE VIEW user_assignee_keys AS
+SELECT id AS user_id, lower(email) AS assignee_key FROM users
+UNION
+SELECT user_id, lower(client_user_id) FROM user_client_id_map
+WHERE active AND client_user_id IS NOT NULL AND client_user_id <> '';
+
+CREATE OR REPLACE FUNCTION refresh_user_daily_utilization(p_user_ids INTEGER[], p_days DATE[])
+RETURNS void AS $$
+BEGIN
+    WITH keys AS (
+        SELECT DISTINCT k.user_id, k.day
+        FROM unnest(p_user_ids, p_days) AS k(user_id, day)
+        WHERE k.user_id IS NOT NULL AND k.day IS NOT NULL
+    ),
+    progress AS (
+        SELECT k.user_id, k.day,
+               COALESCE(SUM(tp.hours_worked), 0) AS hours_worked,
+               COALESCE(SUM(tp.progress_percentage), 0) AS progress_sum,
+               COUNT(tp.progress_percentage) AS progress_entries,
+               COUNT(DISTINCT tp.work_item_id) AS tasks_touched
+        FROM keys k
+        JOIN users u ON u.id = k.user_id
+        LEFT JOIN task_progress tp ON tp.user_email = u.email AND tp.date = k.day
+        GROUP BY k.user_id, k.day
+    ),
+    assigned AS (
+        SELECT k.user_id, k.day,
+               COUNT(wi.id) AS tasks_assigned,
+               COALESCE(SUM(wi.estimated_hours), 0) AS estimated_hours,
+               COALESCE(SUM(wi.actual_hours), 0) AS actual_hours
+        FROM keys k
+        LEFT JOIN user_assignee_keys a ON a.user_id = k.user_id
+        LEFT JOIN work_items wi ON lower(wi.assigned_to) = a.assignee_key
+            AND COALESCE(wi.start_date, wi.created_at::date) = k.day
+        GROUP BY k.user_id, k.day
+    ),
+    cells AS (
+        SELECT p.user_id, p.day, p.hours_worked, p.progress_sum, p.progress_entries, p.tasks_touched,
+               a.tasks_assigned, a.estimated_hours, a.actual_hours
+        FROM progress p
+        JOIN assigned a ON a.user_id = p.user_id AND a.day = p.day
+    ),
+    removed AS (
+        DELETE FROM user_daily_utilization r
+        USING cells c
+        WHERE r.user_id = c.user_id AND r.day = c.day
+          AND c.progress_entries = 0 AND c.tasks_touched = 0 AND c.tasks_assigned = 0
+    )
+    INSERT INTO user_daily_utilization AS r (user_id, day, hours_worked, progress_sum, progress_entries,
+                                             tasks_touched, tasks_assigned, estimated_hours, actual_hours)
+    SELECT user_id, day, hours_worked, progress_sum, progress_entries,
+           tasks_touched, tasks_assigned, estimated_hours, actual_hours
+    FROM cells
+    WHERE progress_entries > 0 OR tasks_touched > 0 OR tasks_assigned > 0
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        hours_worked = EXCLUDED.hours_worked,
+        progress_sum = EXCLUDED.progress_sum,
+        progress_entries = EXCLUDED.progress_entries,
+        tasks_touched = EXCLUDED.tasks_touched,
+        tasks_assigned = EXCLUDED.tasks_assigned,
+        estimated_hours = EXCLUDED.estimated_hours,
+        actual_hours = EXCLUDED.actual_hours;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Full rebuild, or of one user's rows (e.g. after their client mapping changed)
+CREATE OR REPLACE FUNCTION rebuild_user_daily_utilization(p_user_id INTEGER DEFAULT NULL)
+RETURNS void AS $$
+BEGIN
+    DELETE FROM user_daily_utilization WHERE p_user_id IS NULL OR user_id = p_user_id;
+    PERFORM refresh_user_daily_utilization(array_agg(k.user_id), array_agg(k.day))
+    FROM (
+        SELECT u.id AS user_id, tp.date AS day
+        FROM task_progress tp JOIN users u ON u.email = tp.user_email
+        WHERE p_user_id IS NULL OR u.id = p_user_id
+        UNION
+        SELECT a.user_id, COALESCE(wi.start_date, wi.created_at::date)
+        FROM work_items wi JOIN user_assignee_keys a ON a.assignee_key = lower(wi.assigned_to)
+        WHERE p_user_id IS NULL OR a.user_id = p_user_id
+    ) k;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_progress_rollup_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_user_daily_utilization(array_agg(u.id), array_agg(c.date))
+        FROM (SELECT DISTINCT user_email, date FROM new_rows) c JOIN users u ON u.email = c.user_email;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_user_daily_utilization(array_agg(u.id), array_agg(c.date))
+        FROM (SELECT DISTINCT user_email, date FROM old_rows) c JOIN users u ON u.email = c.user_email;
+    ELSE
+        PERFORM refresh_user_daily_utilization(array_agg(u.id), array_agg(c.date))
+        FROM (SELECT user_email, date FROM new_rows UNION SELECT user_email, date FROM old_rows) c
+        JOIN users u ON u.email = c.user_email;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION work_items_rollup_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_user_daily_utilization(array_agg(a.user_id), array_agg(c.day))
+        FROM (SELECT DISTINCT lower(assigned_to) AS assignee_key, COALESCE(start_date, created_at::date) AS day FROM new_rows) c
+        JOIN user_assignee_keys a ON a.assignee_key = c.assignee_key;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_user_daily_utilization(array_agg(a.user_id), array_agg(c.day))
+        FROM (SELECT DISTINCT lower(assigned_to) AS assignee_key, COALESCE(start_date, created_at::date) AS day FROM old_rows) c
+        JOIN user_assignee_keys a ON a.assignee_key = c.assignee_key;
+    ELSE
+        PERFORM refresh_user_daily_utilization(array_agg(a.user_id), array_agg(c.day))
+        FROM (
+            SELECT lower(assigned_to) AS assignee_key, COALESCE(start_date, created_at::date) AS day FROM new_rows
+            UNION
+            SELECT lower(assigned_to), COALESCE(start_date, created_at::date) FROM old_rows
+        ) c
+        JOIN user_assignee_keys a ON a.assignee_key = c.assignee_key;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS task_progress_rollup_insert ON task_progress;
+CREATE TRIGGER task_progress_rollup_insert AFTER INSERT ON task_progress
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_rollup_trigger();
+DROP TRIGGER IF EXISTS task_progress_rollup_update ON task_progress;
+CREATE TRIGGER task_progress_rollup_update AFTER UPDATE ON task_progress
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_rollup_trigger();
+DROP TRIGGER IF EXISTS task_progress_rollup_delete ON task_progress;
+CREATE TRIGGER task_progress_rollup_delete AFTER DELETE ON task_progress
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_rollup_trigger();
+
+DROP TRIGGER IF EXISTS work_items_rollup_insert ON work_items;
+CREATE TRIGGER work_items_rollup_insert AFTER INSERT ON work_items
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION work_items_rollup_trigger();
+DROP TRIGGER IF EXISTS work_items_rollup_update ON work_items;
+CREATE TRIGGER work_items_rollup_update AFTER UPDATE ON work_items
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION work_items_rollup_trigger();
+DROP TRIGGER IF EXISTS work_items_rollup_delete ON work_items;
+CREATE TRIGGER work_items_rollup_delete AFTER DELETE ON work_items
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION work_items_rollup_trigger();
+
+-- Populate from existing data
+SELECT rebuild_user_daily_utilization();
@@ -0,0 +1,130 @@
+-- Lower-cased assignee stored on every work item, so assignee filters are indexed
+-- equality lookups instead of ILIKE scans. Adding the stored generated column
+-- rewrites work_items once, which fills it for existing rows.
+ALTER TABLE work_items ADD COLUMN IF NOT EXISTS assignee_key VARCHAR(255)
+    GENERATED ALWAYS AS (lower(assigned_to)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_work_items_assignee ON work_items(assignee_key, updated_at, id);
+DROP INDEX IF EXISTS idx_work_items_assigned;
+DROP INDEX IF EXISTS idx_work_items_assigned_lower;
+
+-- The rollup functions and the reporting view join on assignee_key
+CREATE OR REPLACE FUNCTION refresh_user_daily_utilization(p_user_ids INTEGER[], p_days DATE[])
+RETURNS void AS $$
+BEGIN
+    WITH keys AS (
+        SELECT DISTINCT k.user_id, k.day
+        FROM unnest(p_user_ids, p_days) AS k(user_id, day)
+        WHERE k.user_id IS NOT NULL AND k.day IS NOT NULL
+    ),
+    progress AS (
+        SELECT k.user_id, k.day,
+               COALESCE(SUM(tp.hours_worked), 0) AS hours_worked,
+               COALESCE(SUM(tp.progress_percentage), 0) AS progress_sum,
+               COUNT(tp.progress_percentage) AS progress_entries,
+               COUNT(DISTINCT tp.work_item_id) AS tasks_touched
+        FROM keys k
+        JOIN users u ON u.id = k.user_id
+        LEFT JOIN task_progress tp ON tp.user_email = u.email AND tp.date = k.day
+        GROUP BY k.user_id, k.day
+    ),
+    assigned AS (
+        SELECT k.user_id, k.day,
+               COUNT(wi.id) AS tasks_assigned,
+               COALESCE(SUM(wi.estimated_hours), 0) AS estimated_hours,
+               COALESCE(SUM(wi.actual_hours), 0) AS actual_hours
+        FROM keys k
+        LEFT JOIN user_assignee_keys a ON a.user_id = k.user_id
+        LEFT JOIN work_items wi ON wi.assignee_key = a.assignee_key
+            AND COALESCE(wi.start_date, wi.created_at::date) = k.day
+        GROUP BY k.user_id, k.day
+    ),
+    cells AS (
+        SELECT p.user_id, p.day, p.hours_worked, p.progress_sum, p.progress_entries, p.tasks_touched,
+               a.tasks_assigned, a.estimated_hours, a.actual_hours
+        FROM progress p
+        JOIN assigned a ON a.user_id = p.user_id AND a.day = p.day
+    ),
+    removed AS (
+        DELETE FROM user_daily_utilization r
+        USING cells c
+        WHERE r.user_id = c.user_id AND r.day = c.day
+          AND c.progress_entries = 0 AND c.tasks_touched = 0 AND c.tasks_assigned = 0
+    )
+    INSERT INTO user_daily_utilization AS r (user_id, day, hours_worked, progress_sum, progress_entries,
+                                             tasks_touched, tasks_assigned, estimated_hours, actual_hours)
+    SELECT user_id, day, hours_worked, progress_sum, progress_entries,
+           tasks_touched, tasks_assigned, estimated_hours, actual_hours
+    FROM cells
+    WHERE progress_entries > 0 OR tasks_touched > 0 OR tasks_assigned > 0
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        hours_worked = EXCLUDED.hours_worked,
+        progress_sum = EXCLUDED.progress_sum,
+        progress_entries = EXCLUDED.progress_entries,
+        tasks_touched = EXCLUDED.tasks_touched,
+        tasks_assigned = EXCLUDED.tasks_assigned,
+        estimated_hours = EXCLUDED.estimated_hours,
+        actual_hours = EXCLUDED.actual_hours;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Full rebuild, or of one user's rows (e.g. after their client mapping changed)
+CREATE OR REPLACE FUNCTION rebuild_user_daily_utilization(p_user_id INTEGER DEFAULT NULL)
+RETURNS void AS $$
+BEGIN
+    DELETE FROM user_daily_utilization WHERE p_user_id IS NULL OR user_id = p_user_id;
+    PERFORM refresh_user_daily_utilization(array_agg(k.user_id), array_agg(k.day))
+    FROM (
+        SELECT u.id AS user_id, tp.date AS day
+        FROM task_progress tp JOIN users u ON u.email = tp.user_email
+        WHERE p_user_id IS NULL OR u.id = p_user_id
+        UNION
+        SELECT a.user_id, COALESCE(wi.start_date, wi.created_at::date)
+        FROM work_items wi JOIN user_assignee_keys a ON a.assignee_key = wi.assignee_key
+        WHERE p_user_id IS NULL OR a.user_id = p_user_id
+    ) k;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION work_items_rollup_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_user_daily_utilization(array_agg(a.user_id), array_agg(c.day))
+        FROM (SELECT DISTINCT assignee_key, COALESCE(start_date, created_at::date) AS day FROM new_rows) c
+        JOIN user_assignee_keys a ON a.assignee_key = c.assignee_key;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_user_daily_utilization(array_agg(a.user_id), array_agg(c.day))
+        FROM (SELECT DISTINCT assignee_key, COALESCE(start_date, created_at::date) AS day FROM old_rows) c
+        JOIN user_assignee_keys a ON a.assignee_key = c.assignee_key;
+    ELSE
+        PERFORM refresh_user_daily_utilization(array_agg(a.user_id), array_agg(c.day))
+        FROM (
+            SELECT assignee_key, COALESCE(start_date, created_at::date) AS day FROM new_rows
+            UNION
+            SELECT assignee_key, COALESCE(start_date, created_at::date) FROM old_rows
+        ) c
+        JOIN user_assignee_keys a ON a.assignee_key = c.assignee_key;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE VIEW utilization_summary AS
+SELECT 
+    u.email,
+    u.name,
+    u.role,
+    COUNT(DISTINCT wi.id) as total_tasks,
+    SUM(CASE WHEN wi.status = 'completed' THEN 1 ELSE 0 END) as completed_tasks,
+    SUM(CASE WHEN wi.status = 'in-progress' THEN 1 ELSE 0 END) as in_progress_tasks,
+    SUM(wi.estimated_hours) as total_estimated_hours,
+    SUM(wi.actual_hours) as total_actual_hours,
+    CASE 
+        WHEN SUM(wi.estimated_hours) > 0 
+        THEN ROUND((SUM(wi.actual_hours) / SUM(wi.estimated_hours) * 100)::numeric, 2)
+        ELSE 0 
+    END as utilization_percentage
+FROM users u
+LEFT JOIN work_items wi ON wi.assignee_key = lower(u.email)
+GROUP BY u.email, u.name, u.role;
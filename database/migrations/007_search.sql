@@ -0,0 +1,18 @@
+-- Full-text and trigram search over work item and backlog titles/descriptions.
+-- Adding the generated columns rewrites both tables once, filling existing rows.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE work_items ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'B')
+) STORED;
+
+ALTER TABLE backlogs ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_work_items_search ON work_items USING gin(search_vector);
+CREATE INDEX IF NOT EXISTS idx_work_items_title_trgm ON work_items USING gin(title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_backlogs_search ON backlogs USING gin(search_vector);
+CREATE INDEX IF NOT EXISTS idx_backlogs_title_trgm ON backlogs USING gin(title gin_trgm_ops);
@@ -0,0 +1,16 @@
+-- Change feed behind GET /api/changes (see backend/changes.py). Writes insert their
+-- events here and NOTIFY change_events in the same transaction; the id is the
+-- resume token clients send back on reconnect. Rows older than
+-- CHANGE_RETENTION_HOURS are pruned by the API.
+CREATE TABLE IF NOT EXISTS change_events (
+    id BIGSERIAL PRIMARY KEY,
+    resource VARCHAR(50) NOT NULL,
+    action VARCHAR(20) NOT NULL,
+    item_id INTEGER,
+    -- assignee keys of the users who may see the event; NULL for everyone
+    scope_keys TEXT[],
+    data TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_change_events_created ON change_events(created_at);
@@ -0,0 +1,129 @@
+-- Per-project, per-day hours logged, behind the project view of
+-- /api/reports/utilization/timeseries: task_progress rows count on their date for
+-- the project of their work item. Triggers on task_progress, and on work_items when
+-- an item moves to another project, recompute only the (project, day) cells a
+-- statement touched; rebuild_project_daily_hours() recomputes everything.
+CREATE TABLE IF NOT EXISTS project_daily_hours (
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    hours_worked FLOAT NOT NULL DEFAULT 0,
+    progress_entries INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (project_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_project_daily_hours_day ON project_daily_hours(day);
+
+CREATE OR REPLACE FUNCTION refresh_project_daily_hours(p_project_ids INTEGER[], p_days DATE[])
+RETURNS void AS $$
+BEGIN
+    WITH keys AS (
+        SELECT DISTINCT k.project_id, k.day
+        FROM unnest(p_project_ids, p_days) AS k(project_id, day)
+        WHERE k.project_id IS NOT NULL AND k.day IS NOT NULL
+    ),
+    -- One pass over the days touched rather than a query per cell
+    logged AS (
+        SELECT wi.project_id, tp.date AS day,
+               COALESCE(SUM(tp.hours_worked), 0) AS hours_worked,
+               COUNT(*) AS progress_entries
+        FROM task_progress tp
+        JOIN work_items wi ON wi.id = tp.work_item_id
+        WHERE tp.date IN (SELECT day FROM keys) AND wi.project_id IN (SELECT project_id FROM keys)
+        GROUP BY wi.project_id, tp.date
+    ),
+    cells AS (
+        SELECT k.project_id, k.day,
+               COALESCE(l.hours_worked, 0) AS hours_worked,
+               COALESCE(l.progress_entries, 0) AS progress_entries
+        FROM keys k
+        LEFT JOIN logged l ON l.project_id = k.project_id AND l.day = k.day
+    ),
+    removed AS (
+        DELETE FROM project_daily_hours r
+        USING cells c
+        WHERE r.project_id = c.project_id AND r.day = c.day AND c.progress_entries = 0
+    )
+    INSERT INTO project_daily_hours AS r (project_id, day, hours_worked, progress_entries)
+    SELECT project_id, day, hours_worked, progress_entries
+    FROM cells
+    WHERE progress_entries > 0
+    ON CONFLICT (project_id, day) DO UPDATE SET
+        hours_worked = EXCLUDED.hours_worked,
+        progress_entries = EXCLUDED.progress_entries;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rebuild_project_daily_hours()
+RETURNS void AS $$
+BEGIN
+    DELETE FROM project_daily_hours;
+    INSERT INTO project_daily_hours (project_id, day, hours_worked, progress_entries)
+    SELECT wi.project_id, tp.date, COALESCE(SUM(tp.hours_worked), 0), COUNT(*)
+    FROM task_progress tp
+    JOIN work_items wi ON wi.id = tp.work_item_id
+    WHERE wi.project_id IS NOT NULL AND tp.date IS NOT NULL
+    GROUP BY wi.project_id, tp.date;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_progress_project_rollup_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_project_daily_hours(array_agg(wi.project_id), array_agg(c.date))
+        FROM (SELECT DISTINCT work_item_id, date FROM new_rows) c JOIN work_items wi ON wi.id = c.work_item_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        -- Rows deleted along with their work item no longer say which project they
+        -- counted for, so every project with hours on their days is recomputed
+        PERFORM refresh_project_daily_hours(array_agg(k.project_id), array_agg(k.day))
+        FROM (
+            SELECT wi.project_id, c.date AS day
+            FROM (SELECT DISTINCT work_item_id, date FROM old_rows) c JOIN work_items wi ON wi.id = c.work_item_id
+            UNION
+            SELECT r.project_id, r.day
+            FROM project_daily_hours r
+            WHERE r.day IN (
+                SELECT o.date FROM old_rows o
+                WHERE NOT EXISTS (SELECT 1 FROM work_items wi WHERE wi.id = o.work_item_id)
+            )
+        ) k;
+    ELSE
+        PERFORM refresh_project_daily_hours(array_agg(wi.project_id), array_agg(c.date))
+        FROM (SELECT work_item_id, date FROM new_rows UNION SELECT work_item_id, date FROM old_rows) c
+        JOIN work_items wi ON wi.id = c.work_item_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- A work item moved to another project takes its logged hours with it
+CREATE OR REPLACE FUNCTION work_items_project_rollup_trigger()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM refresh_project_daily_hours(array_agg(k.project_id), array_agg(k.day))
+    FROM (
+        SELECT DISTINCT p.project_id, tp.date AS day
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id AND n.project_id IS DISTINCT FROM o.project_id
+        CROSS JOIN LATERAL (VALUES (o.project_id), (n.project_id)) AS p(project_id)
+        JOIN task_progress tp ON tp.work_item_id = o.id
+    ) k;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS task_progress_project_rollup_insert ON task_progress;
+CREATE TRIGGER task_progress_project_rollup_insert AFTER INSERT ON task_progress
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_project_rollup_trigger();
+DROP TRIGGER IF EXISTS task_progress_project_rollup_update ON task_progress;
+CREATE TRIGGER task_progress_project_rollup_update AFTER UPDATE ON task_progress
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_project_rollup_trigger();
+DROP TRIGGER IF EXISTS task_progress_project_rollup_delete ON task_progress;
+CREATE TRIGGER task_progress_project_rollup_delete AFTER DELETE ON task_progress
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_project_rollup_trigger();
+DROP TRIGGER IF EXISTS work_items_project_rollup_update ON work_items;
+CREATE TRIGGER work_items_project_rollup_update AFTER UPDATE ON work_items
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION work_items_project_rollup_trigger();
+
+-- Populate from existing data
+SELECT rebuild_project_daily_hours();
@@ -0,0 +1,278 @@
+-- task_progress partitioned by month on date
+--   task_progress_pYYYY_MM holds the rows dated in that month; task_progress_default
+--   any date no partition covers yet. ensure_task_progress_partitions() (run by the
+--   backend, see partitions.py) creates the coming months' partitions and moves
+--   rows out of the default partition into partitions of their own.
+--   A query that filters on date only reads the partitions of its date range.
+-- Old months can be detached and archived to files (partitions.py). The rollups
+-- keep the hours of an archived month: task_progress_archives lists those months,
+-- and the refresh and rebuild functions leave their rollup rows alone until the
+-- month is restored.
+
+CREATE TABLE IF NOT EXISTS task_progress_archives (
+    month DATE PRIMARY KEY,
+    file VARCHAR(500) NOT NULL,
+    -- NULL while the month is being written out
+    row_count INTEGER,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- The rollup functions, skipping archived months
+CREATE OR REPLACE FUNCTION refresh_user_daily_utilization(p_user_ids INTEGER[], p_days DATE[])
+RETURNS void AS $$
+BEGIN
+    WITH keys AS (
+        SELECT DISTINCT k.user_id, k.day
+        FROM unnest(p_user_ids, p_days) AS k(user_id, day)
+        WHERE k.user_id IS NOT NULL AND k.day IS NOT NULL
+          -- Archived months keep the rollup rows they were archived with
+          AND NOT EXISTS (SELECT 1 FROM task_progress_archives a WHERE a.month = date_trunc('month', k.day))
+    ),
+    progress AS (
+        SELECT k.user_id, k.day,
+               COALESCE(SUM(tp.hours_worked), 0) AS hours_worked,
+               COALESCE(SUM(tp.progress_percentage), 0) AS progress_sum,
+               COUNT(tp.progress_percentage) AS progress_entries,
+               COUNT(DISTINCT tp.work_item_id) AS tasks_touched
+        FROM keys k
+        JOIN users u ON u.id = k.user_id
+        LEFT JOIN task_progress tp ON tp.user_email = u.email AND tp.date = k.day
+        GROUP BY k.user_id, k.day
+    ),
+    assigned AS (
+        SELECT k.user_id, k.day,
+               COUNT(wi.id) AS tasks_assigned,
+               COALESCE(SUM(wi.estimated_hours), 0) AS estimated_hours,
+               COALESCE(SUM(wi.actual_hours), 0) AS actual_hours
+        FROM keys k
+        LEFT JOIN user_assignee_keys a ON a.user_id = k.user_id
+        LEFT JOIN work_items wi ON wi.assignee_key = a.assignee_key
+            AND COALESCE(wi.start_date, wi.created_at::date) = k.day
+        GROUP BY k.user_id, k.day
+    ),
+    cells AS (
+        SELECT p.user_id, p.day, p.hours_worked, p.progress_sum, p.progress_entries, p.tasks_touched,
+               a.tasks_assigned, a.estimated_hours, a.actual_hours
+        FROM progress p
+        JOIN assigned a ON a.user_id = p.user_id AND a.day = p.day
+    ),
+    removed AS (
+        DELETE FROM user_daily_utilization r
+        USING cells c
+        WHERE r.user_id = c.user_id AND r.day = c.day
+          AND c.progress_entries = 0 AND c.tasks_touched = 0 AND c.tasks_assigned = 0
+    )
+    INSERT INTO user_daily_utilization AS r (user_id, day, hours_worked, progress_sum, progress_entries,
+                                             tasks_touched, tasks_assigned, estimated_hours, actual_hours)
+    SELECT user_id, day, hours_worked, progress_sum, progress_entries,
+           tasks_touched, tasks_assigned, estimated_hours, actual_hours
+    FROM cells
+    WHERE progress_entries > 0 OR tasks_touched > 0 OR tasks_assigned > 0
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        hours_worked = EXCLUDED.hours_worked,
+        progress_sum = EXCLUDED.progress_sum,
+        progress_entries = EXCLUDED.progress_entries,
+        tasks_touched = EXCLUDED.tasks_touched,
+        tasks_assigned = EXCLUDED.tasks_assigned,
+        estimated_hours = EXCLUDED.estimated_hours,
+        actual_hours = EXCLUDED.actual_hours;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rebuild_user_daily_utilization(p_user_id INTEGER DEFAULT NULL)
+RETURNS void AS $$
+BEGIN
+    DELETE FROM user_daily_utilization r
+    WHERE (p_user_id IS NULL OR r.user_id = p_user_id)
+      AND NOT EXISTS (SELECT 1 FROM task_progress_archives a WHERE a.month = date_trunc('month', r.day));
+    PERFORM refresh_user_daily_utilization(array_agg(k.user_id), array_agg(k.day))
+    FROM (
+        SELECT u.id AS user_id, tp.date AS day
+        FROM task_progress tp JOIN users u ON u.email = tp.user_email
+        WHERE p_user_id IS NULL OR u.id = p_user_id
+        UNION
+        SELECT a.user_id, COALESCE(wi.start_date, wi.created_at::date)
+        FROM work_items wi JOIN user_assignee_keys a ON a.assignee_key = wi.assignee_key
+        WHERE p_user_id IS NULL OR a.user_id = p_user_id
+    ) k;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION refresh_project_daily_hours(p_project_ids INTEGER[], p_days DATE[])
+RETURNS void AS $$
+BEGIN
+    WITH keys AS (
+        SELECT DISTINCT k.project_id, k.day
+        FROM unnest(p_project_ids, p_days) AS k(project_id, day)
+        WHERE k.project_id IS NOT NULL AND k.day IS NOT NULL
+          -- Archived months keep the rollup rows they were archived with
+          AND NOT EXISTS (SELECT 1 FROM task_progress_archives a WHERE a.month = date_trunc('month', k.day))
+    ),
+    -- One pass over the days touched rather than a query per cell
+    logged AS (
+        SELECT wi.project_id, tp.date AS day,
+               COALESCE(SUM(tp.hours_worked), 0) AS hours_worked,
+               COUNT(*) AS progress_entries
+        FROM task_progress tp
+        JOIN work_items wi ON wi.id = tp.work_item_id
+        WHERE tp.date IN (SELECT day FROM keys) AND wi.project_id IN (SELECT project_id FROM keys)
+        GROUP BY wi.project_id, tp.date
+    ),
+    cells AS (
+        SELECT k.project_id, k.day,
+               COALESCE(l.hours_worked, 0) AS hours_worked,
+               COALESCE(l.progress_entries, 0) AS progress_entries
+        FROM keys k
+        LEFT JOIN logged l ON l.project_id = k.project_id AND l.day = k.day
+    ),
+    removed AS (
+        DELETE FROM project_daily_hours r
+        USING cells c
+        WHERE r.project_id = c.project_id AND r.day = c.day AND c.progress_entries = 0
+    )
+    INSERT INTO project_daily_hours AS r (project_id, day, hours_worked, progress_entries)
+    SELECT project_id, day, hours_worked, progress_entries
+    FROM cells
+    WHERE progress_entries > 0
+    ON CONFLICT (project_id, day) DO UPDATE SET
+        hours_worked = EXCLUDED.hours_worked,
+        progress_entries = EXCLUDED.progress_entries;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rebuild_project_daily_hours()
+RETURNS void AS $$
+BEGIN
+    DELETE FROM project_daily_hours r
+    WHERE NOT EXISTS (SELECT 1 FROM task_progress_archives a WHERE a.month = date_trunc('month', r.day));
+    INSERT INTO project_daily_hours (project_id, day, hours_worked, progress_entries)
+    SELECT wi.project_id, tp.date, COALESCE(SUM(tp.hours_worked), 0), COUNT(*)
+    FROM task_progress tp
+    JOIN work_items wi ON wi.id = tp.work_item_id
+    WHERE wi.project_id IS NOT NULL AND tp.date IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM task_progress_archives a WHERE a.month = date_trunc('month', tp.date))
+    GROUP BY wi.project_id, tp.date;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_progress_partition_name(p_month DATE)
+RETURNS TEXT AS $$
+    SELECT 'task_progress_p' || to_char(p_month, 'YYYY_MM');
+$$ LANGUAGE sql IMMUTABLE;
+
+-- The partition for the month of p_month, if there is none yet
+CREATE OR REPLACE FUNCTION create_task_progress_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_month DATE := date_trunc('month', p_month);
+    v_next DATE := date_trunc('month', p_month) + interval '1 month';
+    v_name TEXT := task_progress_partition_name(v_month);
+BEGIN
+    -- One caller at a time (every API process runs the maintenance)
+    PERFORM pg_advisory_xact_lock(hashtext('task_progress_partitions'));
+    -- A table of that name that is not attached is a month being archived
+    IF to_regclass(v_name) IS NOT NULL THEN
+        RETURN v_name;
+    END IF;
+    IF EXISTS (SELECT 1 FROM task_progress_default WHERE date >= v_month AND date < v_next) THEN
+        -- A range can only be attached once no row of it is left in the default
+        -- partition, so the month's rows are moved to the new table first
+        LOCK TABLE task_progress_default IN EXCLUSIVE MODE;
+        EXECUTE format('CREATE TABLE %I (LIKE task_progress INCLUDING DEFAULTS)', v_name);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM task_progress_default WHERE date >= %L AND date < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            v_month, v_next, v_name
+        );
+        EXECUTE format('ALTER TABLE task_progress ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', v_name, v_month, v_next);
+    ELSE
+        EXECUTE format('CREATE TABLE %I PARTITION OF task_progress FOR VALUES FROM (%L) TO (%L)', v_name, v_month, v_next);
+    END IF;
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions for this month and the next p_months_ahead, and for every month
+-- with rows in the default partition
+CREATE OR REPLACE FUNCTION ensure_task_progress_partitions(p_months_ahead INTEGER DEFAULT 3)
+RETURNS void AS $$
+BEGIN
+    PERFORM create_task_progress_partition(CAST(m AS date))
+    FROM generate_series(
+        date_trunc('month', CURRENT_DATE),
+        date_trunc('month', CURRENT_DATE) + make_interval(months => p_months_ahead),
+        interval '1 month'
+    ) m;
+    PERFORM create_task_progress_partition(m)
+    FROM (SELECT DISTINCT CAST(date_trunc('month', date) AS date) AS m FROM task_progress_default) d;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Convert the existing table: its rows are copied into the partitions before the
+-- rollup triggers exist on the new table, as the rollups already count them
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'task_progress'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    -- The partition key is part of the primary key, so it cannot be NULL;
+    -- the rollup triggers count these rows on their new date
+    UPDATE task_progress SET date = COALESCE(CAST(created_at AS date), CURRENT_DATE) WHERE date IS NULL;
+
+    ALTER TABLE task_progress RENAME TO task_progress_unpartitioned;
+    ALTER TABLE task_progress_unpartitioned RENAME CONSTRAINT task_progress_pkey TO task_progress_unpartitioned_pkey;
+    DROP INDEX IF EXISTS idx_task_progress_work_item;
+    DROP INDEX IF EXISTS idx_task_progress_user;
+    DROP INDEX IF EXISTS idx_task_progress_date;
+    DROP INDEX IF EXISTS idx_task_progress_work_item_date;
+
+    CREATE TABLE task_progress (
+        id INTEGER NOT NULL DEFAULT nextval('task_progress_id_seq'),
+        work_item_id INTEGER REFERENCES work_items(id) ON DELETE CASCADE,
+        user_email VARCHAR(255),
+        hours_worked FLOAT,
+        progress_percentage FLOAT,
+        notes TEXT,
+        date DATE NOT NULL DEFAULT CURRENT_DATE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, date)
+    ) PARTITION BY RANGE (date);
+    ALTER SEQUENCE task_progress_id_seq OWNED BY task_progress.id;
+    CREATE TABLE task_progress_default PARTITION OF task_progress DEFAULT;
+
+    PERFORM create_task_progress_partition(m)
+    FROM (SELECT DISTINCT CAST(date_trunc('month', date) AS date) AS m FROM task_progress_unpartitioned) d;
+    INSERT INTO task_progress (id, work_item_id, user_email, hours_worked, progress_percentage, notes, date, created_at)
+    SELECT id, work_item_id, user_email, hours_worked, progress_percentage, notes, date, created_at
+    FROM task_progress_unpartitioned;
+    DROP TABLE task_progress_unpartitioned;
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_task_progress_work_item ON task_progress(work_item_id);
+CREATE INDEX IF NOT EXISTS idx_task_progress_user ON task_progress(user_email);
+CREATE INDEX IF NOT EXISTS idx_task_progress_date ON task_progress(date);
+CREATE INDEX IF NOT EXISTS idx_task_progress_work_item_date ON task_progress(work_item_id, date, id);
+
+DROP TRIGGER IF EXISTS task_progress_rollup_insert ON task_progress;
+DROP TRIGGER IF EXISTS task_progress_rollup_update ON task_progress;
+DROP TRIGGER IF EXISTS task_progress_rollup_delete ON task_progress;
+CREATE TRIGGER task_progress_rollup_insert AFTER INSERT ON task_progress
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_rollup_trigger();
+CREATE TRIGGER task_progress_rollup_update AFTER UPDATE ON task_progress
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_rollup_trigger();
+CREATE TRIGGER task_progress_rollup_delete AFTER DELETE ON task_progress
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_rollup_trigger();
+
+DROP TRIGGER IF EXISTS task_progress_project_rollup_insert ON task_progress;
+DROP TRIGGER IF EXISTS task_progress_project_rollup_update ON task_progress;
+DROP TRIGGER IF EXISTS task_progress_project_rollup_delete ON task_progress;
+CREATE TRIGGER task_progress_project_rollup_insert AFTER INSERT ON task_progress
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_project_rollup_trigger();
+CREATE TRIGGER task_progress_project_rollup_update AFTER UPDATE ON task_progress
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_project_rollup_trigger();
+CREATE TRIGGER task_progress_project_rollup_delete AFTER DELETE ON task_progress
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION task_progress_project_rollup_trigger();
+
+SELECT ensure_task_progress_partitions(3);
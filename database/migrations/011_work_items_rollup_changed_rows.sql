@@ -0,0 +1,33 @@
+-- The work_items update trigger of user_daily_utilization recomputes only the cells
+-- of rows whose assignee, dates or hours changed, so bulk status edits (e.g. through
+-- POST /api/work-items:batch) do not recompute every assignee's day.
+CREATE OR REPLACE FUNCTION work_items_rollup_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_user_daily_utilization(array_agg(a.user_id), array_agg(c.day))
+        FROM (SELECT DISTINCT assignee_key, COALESCE(start_date, created_at::date) AS day FROM new_rows) c
+        JOIN user_assignee_keys a ON a.assignee_key = c.assignee_key;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_user_daily_utilization(array_agg(a.user_id), array_agg(c.day))
+        FROM (SELECT DISTINCT assignee_key, COALESCE(start_date, created_at::date) AS day FROM old_rows) c
+        JOIN user_assignee_keys a ON a.assignee_key = c.assignee_key;
+    ELSE
+        -- Only rows whose rollup inputs changed: a status or title edit touches no cell
+        PERFORM refresh_user_daily_utilization(array_agg(a.user_id), array_agg(c.day))
+        FROM (
+            SELECT DISTINCT x.assignee_key, x.day
+            FROM old_rows o
+            JOIN new_rows n ON n.id = o.id
+                AND (n.assignee_key, n.start_date, n.created_at, n.estimated_hours, n.actual_hours)
+                    IS DISTINCT FROM (o.assignee_key, o.start_date, o.created_at, o.estimated_hours, o.actual_hours)
+            CROSS JOIN LATERAL (VALUES
+                (o.assignee_key, COALESCE(o.start_date, o.created_at::date)),
+                (n.assignee_key, COALESCE(n.start_date, n.created_at::date))
+            ) AS x(assignee_key, day)
+        ) c
+        JOIN user_assignee_keys a ON a.assignee_key = c.assignee_key;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
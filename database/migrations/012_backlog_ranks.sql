@@ -0,0 +1,185 @@
+-- Rank-based backlog order (see "Backlog order" in init.sql): backlogs.rank
+-- replaces priority as the list order. Existing items keep their (priority, id)
+-- order within their project.
+ALTER TABLE backlogs ADD COLUMN IF NOT EXISTS rank TEXT COLLATE "C";
+-- The API always required a project; this fails on items created without one
+-- (give them a project or delete them first)
+ALTER TABLE backlogs ALTER COLUMN project_id SET NOT NULL;
+
+-- Backlog order
+--   backlogs.rank orders a project's backlog: base-62 digit strings compared
+--   bytewise (COLLATE "C") that never end in '0', so there is always a key
+--   between two others. Moving an item (POST /api/backlogs/{id}/move) rewrites
+--   only its own rank; new items, and items moved to another project, go to the
+--   end of the project. Keys grow by a digit every few moves into the same gap;
+--   rebalance_backlog_ranks() (run by the backend, see ranks.py) respaces a
+--   project's keys. Rank changes of a project take its advisory lock. Lists
+--   across projects read (project_id, rank, id), so every item has a project.
+
+-- A key sorting strictly between p_lower and p_upper (NULL: no bound)
+CREATE OR REPLACE FUNCTION backlog_rank_between(p_lower TEXT, p_upper TEXT)
+RETURNS TEXT AS $$
+DECLARE
+    digits CONSTANT TEXT := '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz';
+    lower_key TEXT := COALESCE(p_lower, '');
+    upper_key TEXT := p_upper;
+    prefix TEXT := '';
+    key TEXT;
+    i INTEGER;
+    low INTEGER;
+    high INTEGER;
+BEGIN
+    IF p_lower COLLATE "C" >= p_upper COLLATE "C" THEN
+        RAISE EXCEPTION 'backlog rank % is not below %', p_lower, p_upper;
+    END IF;
+    IF p_lower IS NULL AND p_upper IS NULL THEN
+        RETURN 'V';
+    END IF;
+    IF p_lower IS NOT NULL AND p_upper IS NULL THEN
+        -- After the last key: one more at its width, carrying (digits after a 'z'
+        -- wrap to '0'); past all 'z's the width doubles, so appends lengthen
+        -- keys logarithmically
+        key := p_lower;
+        LOOP
+            i := length(key);
+            WHILE i > 0 AND substr(key, i, 1) = 'z' LOOP
+                key := overlay(key PLACING '0' FROM i FOR 1);
+                i := i - 1;
+            END LOOP;
+            IF i = 0 THEN
+                RETURN p_lower || repeat('0', length(p_lower) - 1) || '1';
+            END IF;
+            key := overlay(key PLACING substr(digits, strpos(digits, substr(key, i, 1)) + 1, 1) FROM i FOR 1);
+            EXIT WHEN right(key, 1) <> '0';
+        END LOOP;
+        RETURN key;
+    END IF;
+    IF p_lower IS NULL AND p_upper IS NOT NULL THEN
+        -- Before the first key: one less at its width, borrowing; below all '0's
+        -- the width doubles
+        key := p_upper;
+        LOOP
+            i := length(key);
+            WHILE i > 0 AND substr(key, i, 1) = '0' LOOP
+                key := overlay(key PLACING 'z' FROM i FOR 1);
+                i := i - 1;
+            END LOOP;
+            IF i = 0 THEN
+                RETURN repeat('0', length(p_upper)) || repeat('z', length(p_upper));
+            END IF;
+            key := overlay(key PLACING substr(digits, strpos(digits, substr(key, i, 1)) - 1, 1) FROM i FOR 1);
+            EXIT WHEN right(key, 1) <> '0';
+        END LOOP;
+        RETURN key;
+    END IF;
+    -- Between: the common prefix (lower padded with '0'), then the middle digit of
+    -- the first that differ, or one more digit when they are adjacent
+    i := 1;
+    WHILE i <= length(upper_key) AND COALESCE(NULLIF(substr(lower_key, i, 1), ''), '0') = substr(upper_key, i, 1) LOOP
+        i := i + 1;
+    END LOOP;
+    prefix := substr(upper_key, 1, i - 1);
+    lower_key := substr(lower_key, i);
+    upper_key := substr(upper_key, i);
+    LOOP
+        low := CASE WHEN lower_key = '' THEN 0 ELSE strpos(digits, substr(lower_key, 1, 1)) - 1 END;
+        high := CASE WHEN upper_key IS NULL THEN 62 ELSE strpos(digits, substr(upper_key, 1, 1)) - 1 END;
+        IF high - low > 1 THEN
+            RETURN prefix || substr(digits, (low + high) / 2 + 1, 1);
+        END IF;
+        IF length(upper_key) > 1 THEN
+            RETURN prefix || substr(upper_key, 1, 1);
+        END IF;
+        prefix := prefix || substr(digits, low + 1, 1);
+        lower_key := substr(lower_key, 2);
+        upper_key := NULL;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- The key of the p_position-th (from 1) of p_total items spaced evenly over the
+-- middle half of the key space, at least 62 apart: short keys with room around
+-- every one, and above and below the list
+CREATE OR REPLACE FUNCTION backlog_rank_spread(p_position BIGINT, p_total BIGINT)
+RETURNS TEXT AS $$
+DECLARE
+    digits CONSTANT TEXT := '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz';
+    width INTEGER := 1;
+    span NUMERIC := 62;
+    value NUMERIC;
+    key TEXT := '';
+BEGIN
+    WHILE span < (p_total + 1) * 62 * 2 LOOP
+        width := width + 1;
+        span := span * 62;
+    END LOOP;
+    value := span / 4 + floor(p_position * (span / 2) / (p_total + 1));
+    FOR i IN 1..width LOOP
+        key := substr(digits, (value % 62)::INTEGER + 1, 1) || key;
+        value := floor(value / 62);
+    END LOOP;
+    RETURN rtrim(key, '0');
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION lock_backlog_ranks(p_project_id INTEGER)
+RETURNS void AS $$
+    SELECT pg_advisory_xact_lock(hashtext('backlog_ranks'), p_project_id);
+$$ LANGUAGE sql;
+
+-- Respaces a project's keys in their current order; returns the number of items
+CREATE OR REPLACE FUNCTION rebalance_backlog_ranks(p_project_id INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    moved INTEGER;
+BEGIN
+    PERFORM lock_backlog_ranks(p_project_id);
+    UPDATE backlogs b SET rank = backlog_rank_spread(r.position, r.total)
+    FROM (
+        SELECT id, row_number() OVER (ORDER BY rank, id) AS position, count(*) OVER () AS total
+        FROM backlogs
+        WHERE project_id = p_project_id
+    ) r
+    WHERE b.id = r.id;
+    GET DIAGNOSTICS moved = ROW_COUNT;
+    RETURN moved;
+END;
+$$ LANGUAGE plpgsql;
+
+-- New items, and items moved to another project, go to the end of the project
+CREATE OR REPLACE FUNCTION backlogs_rank_trigger()
+RETURNS trigger AS $$
+DECLARE
+    last_rank TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.rank IS NOT NULL THEN
+        RETURN NEW;
+    END IF;
+    IF TG_OP = 'UPDATE' AND (NEW.project_id = OLD.project_id OR NEW.rank IS DISTINCT FROM OLD.rank) THEN
+        RETURN NEW;
+    END IF;
+    PERFORM lock_backlog_ranks(NEW.project_id);
+    SELECT max(rank) INTO last_rank FROM backlogs WHERE project_id = NEW.project_id;
+    NEW.rank := backlog_rank_between(last_rank, NULL);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+UPDATE backlogs b SET rank = backlog_rank_spread(r.position, r.total)
+FROM (
+    SELECT id,
+           row_number() OVER (PARTITION BY project_id ORDER BY priority, id) AS position,
+           count(*) OVER (PARTITION BY project_id) AS total
+    FROM backlogs
+) r
+WHERE b.id = r.id AND NOT EXISTS (SELECT 1 FROM backlogs WHERE rank IS NOT NULL);
+
+ALTER TABLE backlogs ALTER COLUMN rank SET NOT NULL;
+
+DROP TRIGGER IF EXISTS backlogs_rank ON backlogs;
+CREATE TRIGGER backlogs_rank BEFORE INSERT OR UPDATE OF project_id ON backlogs
+    FOR EACH ROW EXECUTE FUNCTION backlogs_rank_trigger();
+
+CREATE INDEX IF NOT EXISTS idx_backlogs_project_rank ON backlogs(project_id, rank, id);
+DROP INDEX IF EXISTS idx_backlogs_priority;
+DROP INDEX IF EXISTS idx_backlogs_project_priority;
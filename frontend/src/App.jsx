@@ -1,8 +1,8 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { 
   BarChart3, Users, FolderKanban, ListTodo, TrendingUp, 
   Calendar, Clock, Settings, LogOut, Plus, Edit, Trash2,
-  Download, RefreshCw, Search, Filter, X, Save, ChevronDown
+  Download, RefreshCw, Search, Filter, X, Save, ChevronDown, GripVertical
 } from 'lucide-react';
 import { 
   BarChart, Bar, LineChart, Line, PieChart, Pie, Cell,
@@ -15,15 +15,110 @@ import './App.css';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
+// List endpoints return { items, next_cursor }; pass next_cursor back to get the next page
+const fetchPage = async (path, cursor = null, params = {}) => {
+  const res = await axios.get(`${API_BASE_URL}${path}`, { params: { ...params, cursor } });
+  return res.data;
+};
+
+const fetchAllPages = async (path, params = {}) => {
+  let items = [];
+  let cursor = null;
+  do {
+    const page = await fetchPage(path, cursor, { ...params, limit: 500 });
+    items = items.concat(page.items);
+    cursor = page.next_cursor;
+  } while (cursor);
+  return items;
+};
+
+// Live changes from GET /api/changes (Server-Sent Events). EventSource cannot send
+// the Authorization header, so each connection is opened with a short-lived ticket;
+// once EventSource gives up (e.g. its ticket expired) we reconnect with a new one,
+// passing the last event id seen so the missed events are replayed.
+const subscribeToChanges = ({ onReady, onReset, onChange, onStatus }) => {
+  let source = null;
+  let lastEventId = null;
+  let retryDelay = 1000;
+  let timer = null;
+  let closed = false;
+
+  const retry = () => {
+    onStatus(false);
+    if (!closed) timer = setTimeout(connect, retryDelay);
+    retryDelay = Math.min(retryDelay * 2, 60000);
+  };
+
+  const connect = async () => {
+    let ticket;
+    try {
+      ticket = (await axios.post(`${API_BASE_URL}/api/changes/ticket`)).data.ticket;
+    } catch (error) {
+      retry();
+      return;
+    }
+    if (closed) return;
+    const params = new URLSearchParams({ ticket });
+    if (lastEventId !== null) params.set('after', lastEventId);
+    source = new EventSource(`${API_BASE_URL}/api/changes?${params}`);
+    const listen = (type, handler) => source.addEventListener(type, (e) => {
+      lastEventId = e.lastEventId;
+      handler(JSON.parse(e.data));
+    });
+    listen('ready', onReady);
+    listen('reset', onReset);
+    listen('change', onChange);
+    source.onopen = () => {
+      retryDelay = 1000;
+      onStatus(true);
+    };
+    source.onerror = () => {
+      // A dropped connection is retried by EventSource itself
+      if (source.readyState === EventSource.CLOSED) retry();
+      else onStatus(false);
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(timer);
+    if (source) source.close();
+  };
+};
+
+// Puts row where it belongs in a list sorted by compare, replacing the old copy;
+// a row sorting after the last one loaded is left for "load more" unless complete
+const mergeRow = (items, row, compare, complete) => {
+  const rest = items.filter((item) => item.id !== row.id);
+  const index = rest.findIndex((item) => compare(row, item) < 0);
+  if (index === -1) return complete ? [...rest, row] : rest;
+  return [...rest.slice(0, index), row, ...rest.slice(index)];
+};
+
+// The orders the list endpoints return
+const byId = (a, b) => a.id - b.id;
+const byUpdatedDesc = (a, b) => (b.updated_at || '').localeCompare(a.updated_at || '') || b.id - a.id;
+// By project, then rank; ranks compare bytewise in the database (COLLATE "C"),
+// as < does for them here
+const byRank = (a, b) =>
+  a.project_id - b.project_id || (a.rank < b.rank ? -1 : a.rank > b.rank ? 1 : a.id - b.id);
+
 const App = () => {
   const [currentUser, setCurrentUser] = useState(null);
   const [currentView, setCurrentView] = useState('dashboard');
   const [projects, setProjects] = useState([]);
   const [workItems, setWorkItems] = useState([]);
   const [backlogs, setBacklogs] = useState([]);
+  const [workItemsCursor, setWorkItemsCursor] = useState(null);
+  const [backlogsCursor, setBacklogsCursor] = useState(null);
   const [utilizationData, setUtilizationData] = useState([]);
   const [projectStatusData, setProjectStatusData] = useState([]);
   const [loading, setLoading] = useState(false);
+  const [live, setLive] = useState(false);
+  // Whether the lists hold every row, for changes arriving between renders
+  const complete = useRef({});
+  complete.current = { workItems: !workItemsCursor, backlogs: !backlogsCursor };
 
   useEffect(() => {
     const token = localStorage.getItem('token');
@@ -37,23 +132,64 @@ const App = () => {
 
   const loadData = async () => {
     try {
-      const [projectsRes, workItemsRes, backlogsRes, utilizationRes, projectStatusRes] = await Promise.all([
-        axios.get(`${API_BASE_URL}/api/projects`),
-        axios.get(`${API_BASE_URL}/api/work-items`),
-        axios.get(`${API_BASE_URL}/api/backlogs`),
-        axios.get(`${API_BASE_URL}/api/reports/utilization`),
-        axios.get(`${API_BASE_URL}/api/reports/project-status`)
-      ]);
-      setProjects(projectsRes.data);
-      setWorkItems(workItemsRes.data);
-      setBacklogs(backlogsRes.data);
-      setUtilizationData(utilizationRes.data);
-      setProjectStatusData(projectStatusRes.data);
+      const res = await axios.get(`${API_BASE_URL}/api/dashboard`);
+      const { projects: projectsPage, work_items: workItemsPage, backlogs: backlogsPage } = res.data;
+      let allProjects = projectsPage.items;
+      let cursor = projectsPage.next_cursor;
+      while (cursor) {
+        const page = await fetchPage('/api/projects', cursor, { limit: 500 });
+        allProjects = allProjects.concat(page.items);
+        cursor = page.next_cursor;
+      }
+      setProjects(allProjects);
+      setWorkItems(workItemsPage.items);
+      setWorkItemsCursor(workItemsPage.next_cursor);
+      setBacklogs(backlogsPage.items);
+      setBacklogsCursor(backlogsPage.next_cursor);
+      setUtilizationData(res.data.utilization);
+      setProjectStatusData(res.data.project_status);
     } catch (error) {
       console.error('Error loading data:', error);
     }
   };
 
+  const reloadResource = async (resource) => {
+    try {
+      if (resource === 'projects') {
+        setProjects(await fetchAllPages('/api/projects'));
+      } else if (resource === 'work_items') {
+        const page = await fetchPage('/api/work-items');
+        setWorkItems(page.items);
+        setWorkItemsCursor(page.next_cursor);
+      } else if (resource === 'backlogs') {
+        const page = await fetchPage('/api/backlogs');
+        setBacklogs(page.items);
+        setBacklogsCursor(page.next_cursor);
+      }
+    } catch (error) {
+      console.error(`Error reloading ${resource}:`, error);
+    }
+  };
+
+  const applyChange = ({ resource, action, id, data }) => {
+    if (action === 'reload') {
+      reloadResource(resource);
+      return;
+    }
+    const apply = (compare, complete) => (items) =>
+      action === 'delete' ? items.filter((item) => item.id !== id) : mergeRow(items, data, compare, complete);
+    if (resource === 'projects') setProjects(apply(byId, true));
+    if (resource === 'work_items') setWorkItems(apply(byUpdatedDesc, complete.current.workItems));
+    if (resource === 'backlogs') setBacklogs(apply(byRank, complete.current.backlogs));
+  };
+
+  useEffect(() => {
+    if (!currentUser) return undefined;
+    // ready: changes are streamed from here on, so load what came before (cheap
+    // when nothing did: the responses revalidate by ETag); reset: we missed some
+    return subscribeToChanges({ onReady: loadData, onReset: loadData, onChange: applyChange, onStatus: setLive });
+  }, [currentUser]);
+
   const handleLogin = async (email, password) => {
     try {
       const response = await axios.post(`${API_BASE_URL}/api/auth/login`, { email, password });
@@ -91,9 +227,9 @@ const App = () => {
       />
       <main className="main-content">
         {currentView === 'dashboard' && <Dashboard data={{ utilizationData, projectStatusData, workItems, projects }} />}
-        {currentView === 'projects' && <Projects projects={projects} setProjects={setProjects} />}
-        {currentView === 'work-items' && <WorkItems workItems={workItems} setWorkItems={setWorkItems} projects={projects} />}
-        {currentView === 'backlogs' && <Backlogs backlogs={backlogs} setBacklogs={setBacklogs} projects={projects} />}
+        {currentView === 'projects' && <Projects projects={projects} setProjects={setProjects} live={live} />}
+        {currentView === 'work-items' && <WorkItems workItems={workItems} setWorkItems={setWorkItems} nextCursor={workItemsCursor} setNextCursor={setWorkItemsCursor} projects={projects} live={live} />}
+        {currentView === 'backlogs' && <Backlogs backlogs={backlogs} setBacklogs={setBacklogs} nextCursor={backlogsCursor} setNextCursor={setBacklogsCursor} projects={projects} live={live} />}
         {currentView === 'my-tasks' && <MyTasks workItems={workItems} user={currentUser} />}
         {currentView === 'reports' && <Reports utilizationData={utilizationData} projectStatusData={projectStatusData} />}
         {currentView === 'settings' && <SettingsView onDataRefresh={loadData} />}
@@ -320,7 +456,7 @@ const Dashboard = ({ data }) => {
   );
 };
 
-const Projects = ({ projects, setProjects }) => {
+const Projects = ({ projects, setProjects, live }) => {
   const [showModal, setShowModal] = useState(false);
   const [editingProject, setEditingProject] = useState(null);
   const [formData, setFormData] = useState({
@@ -339,13 +475,13 @@ const Projects = ({ projects, setProjects }) => {
         toast.success('Project updated successfully');
       } else {
         const response = await axios.post(`${API_BASE_URL}/api/projects`, formData);
-        setProjects([...projects, response.data]);
+        setProjects((items) => mergeRow(items, response.data, byId, true));
         toast.success('Project created successfully');
       }
       setShowModal(false);
       resetForm();
-      const res = await axios.get(`${API_BASE_URL}/api/projects`);
-      setProjects(res.data);
+      // The change feed brings the saved row; refetch only while it is disconnected
+      if (!live) setProjects(await fetchAllPages('/api/projects'));
     } catch (error) {
       toast.error('Failed to save project');
     }
@@ -475,9 +611,13 @@ const Projects = ({ projects, setProjects }) => {
   );
 };
 
-const WorkItems = ({ workItems, setWorkItems, projects }) => {
+const WorkItems = ({ workItems, setWorkItems, nextCursor, setNextCursor, projects, live }) => {
   const [showModal, setShowModal] = useState(false);
   const [editingItem, setEditingItem] = useState(null);
+  const [searchText, setSearchText] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
+  const [searchCursor, setSearchCursor] = useState(null);
+  const [selected, setSelected] = useState([]);
   const [formData, setFormData] = useState({
     project_id: '',
     title: '',
@@ -510,13 +650,57 @@ const WorkItems = ({ workItems, setWorkItems, projects }) => {
       }
       setShowModal(false);
       resetForm();
-      const res = await axios.get(`${API_BASE_URL}/api/work-items`);
-      setWorkItems(res.data);
+      // The change feed brings the saved row; refetch only while it is disconnected
+      if (!live) {
+        const page = await fetchPage('/api/work-items');
+        setWorkItems(page.items);
+        setNextCursor(page.next_cursor);
+      }
     } catch (error) {
       toast.error('Failed to save work item');
     }
   };
 
+  const handleLoadMore = async () => {
+    try {
+      if (searchResults) {
+        const page = await fetchPage('/api/search', searchCursor, { q: searchText.trim(), kind: 'work_item' });
+        setSearchResults([...searchResults, ...page.items]);
+        setSearchCursor(page.next_cursor);
+        return;
+      }
+      const page = await fetchPage('/api/work-items', nextCursor);
+      setWorkItems([...workItems, ...page.items]);
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      toast.error('Failed to load work items');
+    }
+  };
+
+  const handleSearch = async (e) => {
+    e.preventDefault();
+    if (!searchText.trim()) {
+      clearSearch();
+      return;
+    }
+    try {
+      const page = await fetchPage('/api/search', null, { q: searchText.trim(), kind: 'work_item' });
+      setSearchResults(page.items);
+      setSearchCursor(page.next_cursor);
+    } catch (error) {
+      toast.error('Search failed');
+    }
+  };
+
+  const clearSearch = () => {
+    setSearchText('');
+    setSearchResults(null);
+    setSearchCursor(null);
+  };
+
+  const rows = searchResults || workItems;
+  const moreCursor = searchResults ? searchCursor : nextCursor;
+
   const resetForm = () => {
     setFormData({
       project_id: '',
@@ -534,7 +718,15 @@ const WorkItems = ({ workItems, setWorkItems, projects }) => {
     setEditingItem(null);
   };
 
-  const handleEdit = (item) => {
+  const handleEdit = async (listItem) => {
+    // List rows leave out the description; edit the full item
+    let item;
+    try {
+      item = (await axios.get(`${API_BASE_URL}/api/work-items/${listItem.id}`)).data;
+    } catch (error) {
+      toast.error('Failed to load work item');
+      return;
+    }
     setEditingItem(item);
     setFormData({
       project_id: item.project_id,
@@ -552,11 +744,49 @@ const WorkItems = ({ workItems, setWorkItems, projects }) => {
     setShowModal(true);
   };
 
+  const toggleSelected = (id) => {
+    setSelected((ids) => ids.includes(id) ? ids.filter(x => x !== id) : [...ids, id]);
+  };
+
+  // Bulk edits go through one batch request; the results carry the saved rows
+  const runBatch = async (operations) => {
+    const res = await axios.post(`${API_BASE_URL}/api/work-items:batch`, { operations });
+    if (res.data.failed) {
+      toast.error(`${res.data.failed} of ${operations.length} work items could not be changed`);
+    }
+    setSelected([]);
+    return res.data.results.filter(result => result.status === 'ok');
+  };
+
+  const handleBulkStatus = async (status) => {
+    try {
+      const done = await runBatch(selected.map(id => ({ op: 'update', id, data: { status } })));
+      const saved = Object.fromEntries(done.map(result => [result.id, result.item]));
+      setWorkItems((items) => items.map(item => saved[item.id] ? { ...item, ...saved[item.id] } : item));
+      toast.success(`${done.length} work items updated`);
+    } catch (error) {
+      toast.error('Failed to update work items');
+    }
+  };
+
+  const handleBulkDelete = async () => {
+    if (window.confirm(`Are you sure you want to delete ${selected.length} work items?`)) {
+      try {
+        const done = await runBatch(selected.map(id => ({ op: 'delete', id })));
+        const deleted = new Set(done.map(result => result.id));
+        setWorkItems((items) => items.filter(item => !deleted.has(item.id)));
+        toast.success(`${done.length} work items deleted`);
+      } catch (error) {
+        toast.error('Failed to delete work items');
+      }
+    }
+  };
+
   const handleDelete = async (id) => {
     if (window.confirm('Are you sure you want to delete this work item?')) {
       try {
         await axios.delete(`${API_BASE_URL}/api/work-items/${id}`);
-        setWorkItems(workItems.filter(item => item.id !== id));
+        setWorkItems((items) => items.filter(item => item.id !== id));
         toast.success('Work item deleted');
       } catch (error) {
         toast.error('Failed to delete work item');
@@ -577,10 +807,52 @@ const WorkItems = ({ workItems, setWorkItems, projects }) => {
         </button>
       </div>
 
+      <form className="search-bar" onSubmit={handleSearch}>
+        <Search size={18} />
+        <input
+          type="text"
+          placeholder="Search work items by title or description"
+          value={searchText}
+          onChange={(e) => setSearchText(e.target.value)}
+        />
+        {searchResults && (
+          <button type="button" className="btn-icon" onClick={clearSearch}>
+            <X size={16} />
+          </button>
+        )}
+      </form>
+
+      {selected.length > 0 && (
+        <div className="bulk-actions">
+          <span>{selected.length} selected</span>
+          <select value="" onChange={(e) => e.target.value && handleBulkStatus(e.target.value)}>
+            <option value="">Set status...</option>
+            <option value="new">New</option>
+            <option value="in-progress">In Progress</option>
+            <option value="testing">Testing</option>
+            <option value="completed">Completed</option>
+            <option value="blocked">Blocked</option>
+          </select>
+          <button className="btn-icon danger" onClick={handleBulkDelete}>
+            <Trash2 size={16} />
+          </button>
+          <button className="btn-icon" onClick={() => setSelected([])}>
+            <X size={16} />
+          </button>
+        </div>
+      )}
+
       <div className="table-container">
         <table className="data-table">
           <thead>
             <tr>
+              <th>
+                <input
+                  type="checkbox"
+                  checked={rows.length > 0 && rows.every(item => selected.includes(item.id))}
+                  onChange={(e) => setSelected(e.target.checked ? rows.map(item => item.id) : [])}
+                />
+              </th>
               <th>Title</th>
               <th>Project</th>
               <th>Type</th>
@@ -593,8 +865,11 @@ const WorkItems = ({ workItems, setWorkItems, projects }) => {
             </tr>
           </thead>
           <tbody>
-            {workItems.map(item => (
+            {rows.map(item => (
               <tr key={item.id}>
+                <td>
+                  <input type="checkbox" checked={selected.includes(item.id)} onChange={() => toggleSelected(item.id)} />
+                </td>
                 <td>{item.title}</td>
                 <td>{projects.find(p => p.id === item.project_id)?.name || 'N/A'}</td>
                 <td><span className="type-badge">{item.type}</span></td>
@@ -619,6 +894,12 @@ const WorkItems = ({ workItems, setWorkItems, projects }) => {
         </table>
       </div>
 
+      {moreCursor && (
+        <div className="load-more">
+          <button className="btn-secondary" onClick={handleLoadMore}>Load more</button>
+        </div>
+      )}
+
       {showModal && (
         <Modal onClose={() => { setShowModal(false); resetForm(); }}>
           <h2>{editingItem ? 'Edit Work Item' : 'New Work Item'}</h2>
@@ -759,7 +1040,7 @@ const WorkItems = ({ workItems, setWorkItems, projects }) => {
   );
 };
 
-const Backlogs = ({ backlogs, setBacklogs, projects }) => {
+const Backlogs = ({ backlogs, setBacklogs, nextCursor, setNextCursor, projects, live }) => {
   const [showModal, setShowModal] = useState(false);
   const [editingBacklog, setEditingBacklog] = useState(null);
   const [formData, setFormData] = useState({
@@ -769,6 +1050,7 @@ const Backlogs = ({ backlogs, setBacklogs, projects }) => {
     priority: 0,
     status: 'new'
   });
+  const [dragging, setDragging] = useState(null);
 
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -788,13 +1070,27 @@ const Backlogs = ({ backlogs, setBacklogs, projects }) => {
       }
       setShowModal(false);
       resetForm();
-      const res = await axios.get(`${API_BASE_URL}/api/backlogs`);
-      setBacklogs(res.data);
+      // The change feed brings the saved row; refetch only while it is disconnected
+      if (!live) {
+        const page = await fetchPage('/api/backlogs');
+        setBacklogs(page.items);
+        setNextCursor(page.next_cursor);
+      }
     } catch (error) {
       toast.error('Failed to save backlog');
     }
   };
 
+  const handleLoadMore = async () => {
+    try {
+      const page = await fetchPage('/api/backlogs', nextCursor);
+      setBacklogs([...backlogs, ...page.items]);
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      toast.error('Failed to load backlog items');
+    }
+  };
+
   const resetForm = () => {
     setFormData({
       project_id: '',
@@ -806,7 +1102,15 @@ const Backlogs = ({ backlogs, setBacklogs, projects }) => {
     setEditingBacklog(null);
   };
 
-  const handleEdit = (backlog) => {
+  const handleEdit = async (listBacklog) => {
+    // List rows leave out the description; edit the full backlog item
+    let backlog;
+    try {
+      backlog = (await axios.get(`${API_BASE_URL}/api/backlogs/${listBacklog.id}`)).data;
+    } catch (error) {
+      toast.error('Failed to load backlog item');
+      return;
+    }
     setEditingBacklog(backlog);
     setFormData({
       project_id: backlog.project_id,
@@ -818,11 +1122,26 @@ const Backlogs = ({ backlogs, setBacklogs, projects }) => {
     setShowModal(true);
   };
 
+  // Drag and drop within a project: dropped above the target when dragged up,
+  // below it when dragged down; only the dropped item's rank changes
+  const handleDrop = async (target) => {
+    const dragged = dragging;
+    setDragging(null);
+    if (!dragged || dragged.id === target.id || dragged.project_id !== target.project_id) return;
+    const anchor = byRank(dragged, target) > 0 ? { before: target.id } : { after: target.id };
+    try {
+      const moved = (await axios.post(`${API_BASE_URL}/api/backlogs/${dragged.id}/move`, anchor)).data;
+      setBacklogs((items) => mergeRow(items, moved, byRank, !nextCursor));
+    } catch (error) {
+      toast.error('Failed to move backlog item');
+    }
+  };
+
   const handleDelete = async (id) => {
     if (window.confirm('Are you sure you want to delete this backlog item?')) {
       try {
         await axios.delete(`${API_BASE_URL}/api/backlogs/${id}`);
-        setBacklogs(backlogs.filter(b => b.id !== id));
+        setBacklogs((items) => items.filter(b => b.id !== id));
         toast.success('Backlog deleted');
       } catch (error) {
         toast.error('Failed to delete backlog');
@@ -844,10 +1163,19 @@ const Backlogs = ({ backlogs, setBacklogs, projects }) => {
       </div>
 
       <div className="backlogs-list">
-        {backlogs.sort((a, b) => a.priority - b.priority).map(backlog => (
-          <div key={backlog.id} className="backlog-card">
+        {backlogs.map(backlog => (
+          <div
+            key={backlog.id}
+            className={`backlog-card${dragging?.id === backlog.id ? ' dragging' : ''}`}
+            draggable
+            onDragStart={() => setDragging(backlog)}
+            onDragEnd={() => setDragging(null)}
+            onDragOver={(e) => { if (dragging?.project_id === backlog.project_id) e.preventDefault(); }}
+            onDrop={(e) => { e.preventDefault(); handleDrop(backlog); }}
+          >
             <div className="backlog-header">
               <div>
+                <GripVertical size={16} className="drag-handle" />
                 <span className="priority-number">#{backlog.priority}</span>
                 <h3>{backlog.title}</h3>
               </div>
@@ -871,6 +1199,12 @@ const Backlogs = ({ backlogs, setBacklogs, projects }) => {
         ))}
       </div>
 
+      {nextCursor && (
+        <div className="load-more">
+          <button className="btn-secondary" onClick={handleLoadMore}>Load more</button>
+        </div>
+      )}
+
       {showModal && (
         <Modal onClose={() => { setShowModal(false); resetForm(); }}>
           <h2>{editingBacklog ? 'Edit Backlog Item' : 'New Backlog Item'}</h2>
@@ -1000,7 +1334,7 @@ const MyTasks = ({ workItems, user }) => {
               <h3>{task.title}</h3>
               <span className={`status-badge ${task.status}`}>{task.status}</span>
             </div>
-            <p className="task-description">{task.description}</p>
+            {task.description && <p className="task-description">{task.description}</p>}
             <div className="task-metrics">
               <div className="metric">
                 <span className="label">Estimated</span>
@@ -1090,22 +1424,52 @@ const MyTasks = ({ workItems, user }) => {
   );
 };
 
+// Sums the per-user rows of /api/reports/utilization/timeseries into one point per bucket
+const teamTrend = (rows) => {
+  const points = new Map();
+  rows.forEach((row) => {
+    const point = points.get(row.bucket) || { bucket: row.bucket, hours_worked: 0, capacity_hours: 0 };
+    point.hours_worked += row.hours_worked || 0;
+    point.capacity_hours += row.capacity_hours || 0;
+    points.set(row.bucket, point);
+  });
+  return Array.from(points.values());
+};
+
+const formatForecastDate = (value) => (value ? format(new Date(value), 'MMM dd, yyyy') : '—');
+
 const Reports = ({ utilizationData, projectStatusData }) => {
-  const exportToCSV = (data, filename) => {
-    const csv = convertToCSV(data);
-    const blob = new Blob([csv], { type: 'text/csv' });
-    const url = window.URL.createObjectURL(blob);
-    const a = document.createElement('a');
-    a.href = url;
-    a.download = `${filename}.csv`;
-    a.click();
-  };
+  const [trend, setTrend] = useState([]);
+  const [forecasts, setForecasts] = useState([]);
+
+  useEffect(() => {
+    axios.get(`${API_BASE_URL}/api/reports/utilization/timeseries`, { params: { bucket: 'week' } })
+      .then((res) => setTrend(teamTrend(res.data)))
+      .catch(() => toast.error('Failed to load utilization trend'));
+  }, [utilizationData]);
 
-  const convertToCSV = (data) => {
-    if (!data || data.length === 0) return '';
-    const headers = Object.keys(data[0]).join(',');
-    const rows = data.map(row => Object.values(row).join(',')).join('\n');
-    return `${headers}\n${rows}`;
+  useEffect(() => {
+    axios.get(`${API_BASE_URL}/api/reports/forecast`)
+      .then((res) => setForecasts(res.data))
+      .catch(() => toast.error('Failed to load forecasts'));
+  }, [projectStatusData]);
+
+  // Exports are generated and streamed by the backend
+  const downloadExport = async (path, filename, format = 'csv') => {
+    try {
+      const response = await axios.get(`${API_BASE_URL}/api/export/${path}`, {
+        params: { format },
+        responseType: 'blob'
+      });
+      const url = window.URL.createObjectURL(response.data);
+      const a = document.createElement('a');
+      a.href = url;
+      a.download = `${filename}.${format}`;
+      a.click();
+      window.URL.revokeObjectURL(url);
+    } catch (error) {
+      toast.error('Export failed');
+    }
   };
 
   return (
@@ -1116,17 +1480,40 @@ const Reports = ({ utilizationData, projectStatusData }) => {
           <p>Export and analyze utilization data</p>
         </div>
         <div className="button-group">
-          <button className="btn-primary" onClick={() => exportToCSV(utilizationData, 'utilization-report')}>
+          <button className="btn-primary" onClick={() => downloadExport('reports/utilization', 'utilization-report')}>
             <Download size={18} />
             Export Utilization (CSV)
           </button>
-          <button className="btn-primary" onClick={() => exportToCSV(projectStatusData, 'project-status-report')}>
+          <button className="btn-primary" onClick={() => downloadExport('reports/utilization', 'utilization-report', 'xlsx')}>
+            <Download size={18} />
+            Export Utilization (XLSX)
+          </button>
+          <button className="btn-primary" onClick={() => downloadExport('reports/project-status', 'project-status-report')}>
             <Download size={18} />
             Export Projects (CSV)
           </button>
+          <button className="btn-primary" onClick={() => downloadExport('reports/project-status', 'project-status-report', 'xlsx')}>
+            <Download size={18} />
+            Export Projects (XLSX)
+          </button>
         </div>
       </div>
 
+      <div className="report-section">
+        <h2>Weekly Hours vs. Capacity</h2>
+        <ResponsiveContainer width="100%" height={300}>
+          <LineChart data={trend}>
+            <CartesianGrid strokeDasharray="3 3" />
+            <XAxis dataKey="bucket" tickFormatter={(value) => format(new Date(value), 'MMM d')} />
+            <YAxis />
+            <Tooltip />
+            <Legend />
+            <Line type="monotone" dataKey="hours_worked" stroke="#10b981" name="Hours Worked" />
+            <Line type="monotone" dataKey="capacity_hours" stroke="#3b82f6" name="Capacity" strokeDasharray="5 5" />
+          </LineChart>
+        </ResponsiveContainer>
+      </div>
+
       <div className="report-section">
         <h2>Team Utilization Report</h2>
         <div className="table-container">
@@ -1194,6 +1581,39 @@ const Reports = ({ utilizationData, projectStatusData }) => {
           </table>
         </div>
       </div>
+
+      <div className="report-section">
+        <h2>Completion Forecast</h2>
+        <div className="table-container">
+          <table className="data-table">
+            <thead>
+              <tr>
+                <th>Project Name</th>
+                <th>Remaining Hours</th>
+                <th>Hours / Week</th>
+                <th>Forecast</th>
+                <th>Range (80%)</th>
+                <th>End Date</th>
+              </tr>
+            </thead>
+            <tbody>
+              {forecasts.map((forecast) => (
+                <tr key={forecast.project_id}>
+                  <td>{forecast.name}</td>
+                  <td>{forecast.remaining_hours}</td>
+                  <td>{forecast.burn_rate}</td>
+                  <td>
+                    {formatForecastDate(forecast.forecast_date)}
+                    {forecast.on_track === false && <span className="status-badge on-hold">late</span>}
+                  </td>
+                  <td>{formatForecastDate(forecast.forecast_date_early)} – {formatForecastDate(forecast.forecast_date_late)}</td>
+                  <td>{formatForecastDate(forecast.end_date)}</td>
+                </tr>
+              ))}
+            </tbody>
+          </table>
+        </div>
+      </div>
     </div>
   );
 };
@@ -1234,9 +1654,19 @@ const SettingsView = ({ onDataRefresh }) => {
   const handleSync = async () => {
     setSyncing(true);
     try {
+      // The sync runs as a background job; poll it until it finishes
       const res = await axios.post(`${API_BASE_URL}/api/sync-azure-boards`);
-      toast.success(`Synced ${res.data.synced_count} work items from Azure DevOps`);
-      onDataRefresh();
+      let job = { status: res.data.status };
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = (await axios.get(`${API_BASE_URL}/api/sync-jobs/${res.data.job_id}`)).data;
+      }
+      if (job.status === 'completed') {
+        toast.success(`Synced ${job.synced_count} work items from Azure DevOps`);
+        onDataRefresh();
+      } else {
+        toast.error(`Azure DevOps sync failed: ${job.error}`);
+      }
     } catch (error) {
       toast.error('Failed to sync with Azure DevOps');
     } finally {
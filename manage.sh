@@ -121,6 +121,23 @@ restore() {
     echo -e "${GREEN}✓ Database restored${NC}"
 }
 
+# Function to rebuild reporting rollups from the source tables
+rebuild_rollups() {
+    echo -e "${YELLOW}Rebuilding utilization rollups...${NC}"
+    docker-compose exec -T db psql -U devuser devutilization -c "SELECT rebuild_user_daily_utilization();"
+    docker-compose exec -T db psql -U devuser devutilization -c "SELECT rebuild_project_daily_hours();"
+    echo -e "${GREEN}✓ Rollups rebuilt${NC}"
+}
+
+# Function to manage task_progress partitions and archives
+partitions() {
+    if [ -z "$1" ]; then
+        echo -e "${RED}Error: Please specify list, maintain, archive <YYYY-MM> or restore <YYYY-MM>${NC}"
+        exit 1
+    fi
+    docker-compose exec -T backend python partitions.py "$@"
+}
+
 # Function to clean up
 clean() {
     echo -e "${YELLOW}Cleaning up DevTrack (this will remove all data)...${NC}"
@@ -155,6 +172,8 @@ show_help() {
     echo "  logs      - View application logs (optional: specify service)"
     echo "  backup    - Create database backup"
     echo "  restore   - Restore database from backup file"
+    echo "  rebuild-rollups - Recompute utilization report rollups"
+    echo "  partitions - Task progress partitions: list, maintain, archive <YYYY-MM>, restore <YYYY-MM>"
     echo "  update    - Update to latest version"
     echo "  clean     - Remove all containers and data"
     echo "  help      - Show this help message"
@@ -163,6 +182,7 @@ show_help() {
     echo "  ./manage.sh install"
     echo "  ./manage.sh logs backend"
     echo "  ./manage.sh restore backup_20240101_120000.sql"
+    echo "  ./manage.sh partitions restore 2024-01"
 }
 
 # Main script logic
@@ -191,6 +211,12 @@ case "$1" in
     restore)
         restore "$2"
         ;;
+    rebuild-rollups)
+        rebuild_rollups
+        ;;
+    partitions)
+        partitions "${@:2}"
+        ;;
     update)
         update
         ;;